@@ -0,0 +1,72 @@
+"""
+Sizing for the nightly batch (handlers/batch_precompute.py).
+
+Stores synthetic sales history for --merchants merchants in a temporary
+HISTORY_DIR, runs the batch over them once per --concurrency level (forced,
+so every merchant is recomputed) and prints merchants per minute, per-merchant
+latency and what that rate means for a fleet of --fleet merchants: the
+wall-clock time and the number of Lambda parts of BATCH_TIME_MARGIN_SEC-less
+15 minutes it would take.
+
+    python bench/batch_benchmark.py --merchants 20 --products 30 --days 90 --concurrency 1,2,4,8 --fleet 5000
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+
+# Handlers read their configuration at import time
+os.environ.setdefault("BEDROCK_STUB", "inprocess")
+os.environ.setdefault("BEDROCK_STUB_LATENCY", "fixed:50")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("PROFILE_SAMPLE_RATE", "0")
+os.environ.setdefault("INSTRUMENTATION_ENABLED", "false")
+os.environ.setdefault("HISTORY_DIR", tempfile.mkdtemp(prefix="batch-bench-"))
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from synthetic_sales import generate  # noqa: E402
+from common.config import BATCH_TIME_MARGIN_SEC  # noqa: E402
+from common.data_quality import parse_frame  # noqa: E402
+from common.history_store import append  # noqa: E402
+from handlers import batch_precompute  # noqa: E402
+
+LAMBDA_TIMEOUT_SEC = 900
+
+
+def seed_history(merchants: int, products: int, days: int) -> list:
+    ids = [f"bench-{i:04d}" for i in range(merchants)]
+    for i, merchant in enumerate(ids):
+        df = parse_frame(generate(products, days, 1, seed=i, dirty_rate=0))
+        append(merchant, df.dropna(subset=["date", "product_name"]))
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--merchants", type=int, default=12)
+    parser.add_argument("--products", type=int, default=30)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--concurrency", default="1,2,4")
+    parser.add_argument("--fleet", type=int, default=1000, help="merchants to project the run time for")
+    args = parser.parse_args()
+
+    ids = seed_history(args.merchants, args.products, args.days)
+    print(f"{args.merchants} merchants x {args.products} products x {args.days} days of history; "
+          f"projection for {args.fleet} merchants\n")
+    print(f"{'conc':>4} {'merch/min':>10} {'p50 s':>7} {'p95 s':>7} {'failed':>6} {'fleet min':>10} {'parts':>6}")
+    per_part = LAMBDA_TIMEOUT_SEC - BATCH_TIME_MARGIN_SEC
+    for level in (int(c) for c in args.concurrency.split(",")):
+        report = batch_precompute.run(merchant_ids=ids, concurrency=level, force=True)
+        rate = report["throughput"]["merchants_per_min"]
+        fleet_sec = args.fleet / rate * 60 if rate else float("inf")
+        print(f"{level:4d} {rate:10.1f} {report['merchant_seconds']['p50']:7.2f} {report['merchant_seconds']['p95']:7.2f} "
+              f"{report['statuses'].get('failed', 0):6d} {fleet_sec / 60:10.1f} {math.ceil(fleet_sec / per_part):6d}")
+
+
+if __name__ == "__main__":
+    main()
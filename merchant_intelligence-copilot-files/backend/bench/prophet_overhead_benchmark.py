@@ -0,0 +1,83 @@
+"""
+Per-fit Prophet cost, split into setup, Prophet's own preprocessing and the
+Stan optimizer.
+
+Fits the same synthetic daily series twice: with a fresh Prophet() per fit
+(what forecasting.py did before common/prophet_backend.py) and with
+new_prophet(), which reuses one compiled Stan model. Prints per-fit
+milliseconds for each stage and the share of a fit that isn't optimization.
+
+    python bench/prophet_overhead_benchmark.py --series 50 --days 90
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault("PROPHET_PRELOAD", "false")  # so the first shared fit shows the one-off load
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from common.prophet_backend import new_prophet, fit_stats  # noqa: E402
+
+MODEL_ARGS = dict(daily_seasonality=False, weekly_seasonality=True, yearly_seasonality=False,
+                  interval_width=0.8, changepoint_prior_scale=0.05, mcmc_samples=0, uncertainty_samples=100)
+
+
+def series(n: int, days: int, seed: int = 7) -> list:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2026-01-01", periods=days, freq="D")
+    weekly = 1 + 0.3 * np.sin(2 * np.pi * dates.dayofweek.to_numpy() / 7)
+    return [pd.DataFrame({"ds": dates, "y": rng.poisson(rng.uniform(2, 40) * weekly)}) for _ in range(n)]
+
+
+def run(make_model, data: list, horizon: int) -> dict:
+    totals = {"setup": 0.0, "fit": 0.0, "predict": 0.0}
+    for df in data:
+        t0 = time.perf_counter()
+        model = make_model(**MODEL_ARGS)
+        t1 = time.perf_counter()
+        model.fit(df, algorithm="Newton")
+        t2 = time.perf_counter()
+        model.predict(model.make_future_dataframe(periods=horizon, freq="D", include_history=False))
+        t3 = time.perf_counter()
+        totals["setup"] += t1 - t0
+        totals["fit"] += t2 - t1
+        totals["predict"] += t3 - t2
+    return {k: round(v * 1000 / len(data), 2) for k, v in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=30)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--horizon", type=int, default=30)
+    args = parser.parse_args()
+
+    logging.getLogger("cmdstanpy").setLevel(logging.ERROR)
+    from prophet import Prophet
+
+    data = series(args.series, args.days)
+    fresh = run(Prophet, data, args.horizon)
+    shared = run(new_prophet, data, args.horizon)
+    stats = fit_stats()
+    per_fit = stats["per_fit"]
+
+    print(f"{args.series} series x {args.days} days, {args.horizon}-day horizon (ms per fit)")
+    print(f"{'':8} {'setup':>8} {'fit':>8} {'predict':>8}")
+    for name, row in (("fresh", fresh), ("shared", shared)):
+        print(f"{name:8} {row['setup']:8.2f} {row['fit']:8.2f} {row['predict']:8.2f}")
+    print(f"\nshared fit: optimizer {per_fit['optimize_ms']:.2f} ms (Stan process), "
+          f"overhead {per_fit['overhead_ms']:.2f} ms = "
+          f"{per_fit['overhead_ms'] / max(per_fit['setup_ms'] + per_fit['fit_ms'], 1e-9) * 100:.0f}% of setup + fit")
+    print(f"model load (once per process): {stats['load_model_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
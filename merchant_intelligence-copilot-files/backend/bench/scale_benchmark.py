@@ -0,0 +1,272 @@
+"""
+Scale benchmark: drives every handler over a grid of products x days x
+rows-per-day built with synthetic_sales.py and records latency, memory and
+throughput at each point.
+
+Bedrock is replaced by the in-process stub and storage by the in-memory
+store, so the numbers measure this code rather than the network. Results go
+to a JSON file; scaling exponents (log-log slope of latency against each grid
+dimension) are checked against bench/thresholds.json, and against a previous
+results file when --baseline is given. The exit status is 1 if any check fails.
+
+    python bench/scale_benchmark.py --grid quick
+    python bench/scale_benchmark.py --products 100,1000,10000 --days 365 --rows-per-day 1 --no-memory
+    python bench/scale_benchmark.py --grid default --baseline bench-results.json
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from itertools import product as grid_product
+
+# Handlers read their configuration at import time
+os.environ.setdefault("BEDROCK_STUB", "inprocess")
+os.environ.setdefault("BEDROCK_STUB_LATENCY", "fixed:50")
+os.environ.setdefault("BEDROCK_STUB_TOKENS_PER_SEC", "0")  # constant model time, so scaling reflects our code
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("WEEKLY_REPORT_PRECOMPUTE", "off")
+os.environ.setdefault("PROFILE_SAMPLE_RATE", "0")
+os.environ.setdefault("TIMINGS_DEBUG_ENABLED", "true")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from synthetic_sales import generate, to_csv_text  # noqa: E402
+from handlers import generate_insights, chat, weekly_report, health  # noqa: E402
+
+GRIDS = {
+    "quick": {"products": [5, 20], "days": [30, 90], "rows_per_day": [1]},
+    "default": {"products": [10, 50, 200], "days": [30, 90, 365], "rows_per_day": [1, 4]},
+    "large": {"products": [1000, 10000], "days": [365], "rows_per_day": [1]},
+}
+DIMENSIONS = ("products", "days", "rows_per_day")
+
+CHAT_MESSAGE = "Which products should I reorder this week?"
+
+
+def _event(body: dict, merchant: str) -> dict:
+    return {"headers": {"X-Merchant-Id": merchant}, "body": json.dumps(body)}
+
+
+def timed(handler, event):
+    start = time.perf_counter()
+    response = handler(event, None)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if response.get("statusCode", 200) != 200:
+        raise RuntimeError(f"{handler.__module__} returned {response.get('statusCode')}: {response.get('body', '')[:200]}")
+    return response, elapsed_ms
+
+
+def traced_peak_mb(handler, event) -> float:
+    """Peak Python heap during one call (separate run: tracemalloc slows the code it traces)."""
+    tracemalloc.start()
+    try:
+        handler(event, None)
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def run_point(products: int, days: int, rows_per_day: int, args) -> dict:
+    """All handlers at one grid point."""
+    df = generate(products, days, rows_per_day, seed=args.seed, dirty_rate=args.dirty_rate)
+    csv_text = to_csv_text(df)
+    merchant = f"bench-{products}-{days}-{rows_per_day}"
+    point = {"products": products, "days": days, "rows_per_day": rows_per_day,
+             "rows": len(df), "csv_kb": round(len(csv_text) / 1024, 1)}
+
+    gi_event = _event({"csv_text": csv_text}, merchant)
+    response, ms = timed(generate_insights.lambda_handler, gi_event)
+    insights = json.loads(response["body"])
+    point["generate_insights"] = {
+        "ms": round(ms, 1),
+        "rows_per_sec": round(len(df) / (ms / 1000), 1),
+        "products_per_sec": round(products / (ms / 1000), 2),
+        "response_kb": round(len(response["body"]) / 1024, 1),
+        "products_out": len(insights["insights"]["products"])
+    }
+    if args.memory:
+        point["generate_insights"]["peak_mb"] = round(traced_peak_mb(generate_insights.lambda_handler, gi_event), 1)
+
+    chat_event = _event({"message": CHAT_MESSAGE, "insights": insights}, merchant)
+    latencies = [timed(chat.lambda_handler, chat_event)[1] for _ in range(args.chat_requests)]
+    point["chat"] = _latency_stats(latencies)
+    if args.memory:
+        point["chat"]["peak_mb"] = round(traced_peak_mb(chat.lambda_handler, chat_event), 2)
+
+    # generate_insights already stored the pending rule-based report; time the
+    # background precompute, then page loads served from the stored report
+    digest = insights["report_digest"]
+    _, precompute_ms = timed(weekly_report.lambda_handler,
+                             {"action": "precompute", "merchant_id": merchant, "digest": digest})
+    cached_event = _event({"digest": digest}, merchant)
+    cached = [timed(weekly_report.lambda_handler, cached_event)[1] for _ in range(args.chat_requests)]
+    point["weekly_report"] = {"precompute_ms": round(precompute_ms, 1), **_latency_stats(cached)}
+
+    point["health"] = _latency_stats([timed(health.lambda_handler, {})[1] for _ in range(10)])
+    return point
+
+
+def _latency_stats(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+    return {
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p95_ms": round(p95, 2),
+        "req_per_sec": round(len(ordered) / (sum(ordered) / 1000), 2) if sum(ordered) else None
+    }
+
+
+# ---- scaling curves and checks -------------------------------------------------
+
+METRICS = {
+    "generate_insights": "ms",
+    "chat": "p50_ms",
+    "weekly_report": "precompute_ms",
+}
+
+
+def scaling_exponents(points: list) -> dict:
+    """
+    Mean log-log slope of each handler's latency against each dimension,
+    between neighbouring grid values with the other dimensions held fixed.
+    1.0 is linear; 2.0 means doubling the input quadruples the time.
+    """
+    out = {}
+    for handler, metric in METRICS.items():
+        out[handler] = {}
+        for dim in DIMENSIONS:
+            others = [d for d in DIMENSIONS if d != dim]
+            groups = {}
+            for p in points:
+                groups.setdefault(tuple(p[d] for d in others), []).append(p)
+            slopes = []
+            for group in groups.values():
+                group.sort(key=lambda p: p[dim])
+                for a, b in zip(group, group[1:]):
+                    ya, yb = a[handler][metric], b[handler][metric]
+                    if a[dim] > 0 and b[dim] > a[dim] and ya > 0 and yb > 0:
+                        slopes.append(math.log(yb / ya) / math.log(b[dim] / a[dim]))
+            if slopes:
+                out[handler][dim] = round(statistics.mean(slopes), 3)
+    return out
+
+
+def check_thresholds(points: list, exponents: dict, thresholds: dict) -> list:
+    failures = []
+    for handler, limits in thresholds.get("max_scaling_exponent", {}).items():
+        for dim, limit in limits.items():
+            value = exponents.get(handler, {}).get(dim)
+            if value is not None and value > limit:
+                failures.append(f"{handler}: latency scales as {dim}^{value} (limit {limit})")
+
+    per_point = thresholds.get("per_point", {})
+    for p in points:
+        label = f"{p['products']}x{p['days']}x{p['rows_per_day']}"
+        gi = p["generate_insights"]
+        limit = per_point.get("generate_insights_ms_per_product")
+        if limit and gi["ms"] / p["products"] > limit:
+            failures.append(f"{label}: generate_insights {gi['ms'] / p['products']:.0f} ms/product (limit {limit})")
+        per_100k = per_point.get("generate_insights_peak_mb_per_100k_rows")
+        if per_100k and "peak_mb" in gi:
+            # Fixed overhead plus a per-row allowance, so small grid points aren't judged by overhead alone
+            limit = per_point.get("generate_insights_peak_mb_base", 0) + per_100k * p["rows"] / 1e5
+            if gi["peak_mb"] > limit:
+                failures.append(f"{label}: generate_insights peak {gi['peak_mb']} MB for {p['rows']} rows (limit {limit:.1f} MB)")
+        for handler in ("chat", "weekly_report", "health"):
+            limit = per_point.get(f"{handler}_p95_ms")
+            if limit and p[handler]["p95_ms"] > limit:
+                failures.append(f"{label}: {handler} p95 {p[handler]['p95_ms']} ms (limit {limit})")
+    return failures
+
+
+def compare_baseline(points: list, baseline: dict, tolerance: float, slack_ms: float) -> list:
+    """Points slower than the same grid point in a previous run by more than tolerance + slack."""
+    failures = []
+    previous = {(p["products"], p["days"], p["rows_per_day"]): p for p in baseline.get("points", [])}
+    for p in points:
+        old = previous.get((p["products"], p["days"], p["rows_per_day"]))
+        if not old:
+            continue
+        for handler, metric in METRICS.items():
+            before, now = old[handler][metric], p[handler][metric]
+            if now > before * (1 + tolerance) + slack_ms:
+                failures.append(f"{p['products']}x{p['days']}x{p['rows_per_day']}: {handler} {metric} "
+                                f"{before} -> {now} (+{(now / before - 1) * 100:.0f}%)")
+    return failures
+
+
+def print_table(points: list):
+    header = f"{'products':>8} {'days':>5} {'rpd':>4} {'rows':>9} | {'insights ms':>11} {'rows/s':>9} {'peak MB':>8} | {'chat p50':>8} | {'precompute':>10} {'cached p50':>10}"
+    print(header)
+    print("-" * len(header))
+    for p in points:
+        gi = p["generate_insights"]
+        print(f"{p['products']:>8} {p['days']:>5} {p['rows_per_day']:>4} {p['rows']:>9} | "
+              f"{gi['ms']:>11.0f} {gi['rows_per_sec']:>9.0f} {gi.get('peak_mb', float('nan')):>8.1f} | "
+              f"{p['chat']['p50_ms']:>8.1f} | {p['weekly_report']['precompute_ms']:>10.1f} {p['weekly_report']['p50_ms']:>10.2f}")
+
+
+def _int_list(text):
+    return [int(v) for v in text.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scale benchmark for the Lambda handlers")
+    parser.add_argument("--grid", choices=sorted(GRIDS), default="quick")
+    parser.add_argument("--products", type=_int_list, help="comma-separated, overrides the grid")
+    parser.add_argument("--days", type=_int_list)
+    parser.add_argument("--rows-per-day", type=_int_list)
+    parser.add_argument("--chat-requests", type=int, default=5, help="calls per point for chat / cached report")
+    parser.add_argument("--dirty-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc runs")
+    parser.add_argument("--thresholds", default=os.path.join(BENCH_DIR, "thresholds.json"))
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--output", default="bench-results.json")
+    args = parser.parse_args(argv)
+
+    grid = dict(GRIDS[args.grid])
+    for dim in DIMENSIONS:
+        if getattr(args, dim):
+            grid[dim] = getattr(args, dim)
+
+    points = []
+    for products, days, rows_per_day in grid_product(grid["products"], grid["days"], grid["rows_per_day"]):
+        print(f"-> {products} products x {days} days x {rows_per_day} rows/day", file=sys.stderr)
+        points.append(run_point(products, days, rows_per_day, args))
+
+    exponents = scaling_exponents(points)
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    failures = check_thresholds(points, exponents, thresholds)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures += compare_baseline(points, baseline, thresholds.get("baseline_tolerance", 0.25),
+                                     thresholds.get("baseline_slack_ms", 50))
+
+    results = {"grid": grid, "points": points, "scaling_exponents": exponents, "failures": failures,
+               "stub_latency": os.environ["BEDROCK_STUB_LATENCY"], "timestamp": time.time()}
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print_table(points)
+    print(f"\nScaling exponents: {json.dumps(exponents)}")
+    print(f"Results written to {args.output}")
+    if failures:
+        print("\nREGRESSIONS:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
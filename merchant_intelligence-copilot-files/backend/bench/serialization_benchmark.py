@@ -0,0 +1,99 @@
+"""
+Serialize time and bytes on the wire for generate_insights-sized payloads.
+
+Builds responses with the same shape as generate_insights (7- and 30-day
+forecast dicts, reasoning strings, NumPy scalars where the pipeline leaves
+them) for several catalog sizes, then times every available serializer and
+content encoding, for both forecast formats (rows and columnar).
+
+    python bench/serialization_benchmark.py --products 100,1000,10000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from common.serialization import SERIALIZERS, ENCODERS  # noqa: E402
+from common.insights_index import build_insights_index  # noqa: E402
+from common.forecast_format import FORMATS, format_product  # noqa: E402
+
+
+def forecast_rows(rng, start: date, days: int) -> list:
+    yhat = rng.gamma(4.0, 5.0, days)
+    return [
+        {"ds": (start + timedelta(days=i)).isoformat(), "yhat": np.float64(round(y, 2)),
+         "yhat_lower": round(max(0.0, y * 0.7), 2), "yhat_upper": round(y * 1.3, 2)}
+        for i, y in enumerate(yhat)
+    ]
+
+
+def insights_payload(n_products: int, seed: int = 7, forecast_format: str = "rows") -> dict:
+    rng = np.random.default_rng(seed)
+    start = date(2026, 2, 1)
+    products = []
+    for i in range(n_products):
+        forecast30 = forecast_rows(rng, start, 30)
+        forecast7 = forecast30[:7]
+        qty = round(sum(f["yhat"] for f in forecast7) * 1.2, 2)
+        conf = np.float64(round(rng.uniform(30, 95), 2))
+        products.append({
+            "product_name": f"Product {i:05d}",
+            "forecast": forecast7,
+            "forecast_30d": forecast30,
+            "confidence_score": conf,
+            "anomalies": [{"type": "spike", "change_percent": 42.5, "severity": "medium",
+                           "description": "Demand increased 42.5% week-over-week"}] if i % 7 == 0 else [],
+            "reorder": {"quantity": qty, "urgency": ["low", "medium", "high"][i % 3]},
+            "price_hint": {"action": "hold", "suggested_delta": 0, "reason": "Demand stable. Current pricing is optimal.",
+                           "expected_impact": "Maintain current revenue"},
+            "demand_reasoning": "Demand is stable. Weekly seasonality detected. Forecast predicts stable demand.",
+            "llm_explanation": None,
+            "reorder_logic": f"Recommended quantity: {qty} units. Based on 7-day forecast plus 20% safety stock.",
+            "confidence_explanation": f"Confidence score of {conf}% based on forecast accuracy, data quality (90 days of history), and prediction interval width."
+        })
+    products = [format_product(p, forecast_format) for p in products]
+    results = {"products": products, "disclaimer": "AI-assisted insights to support smarter business decisions."}
+    results["index"] = build_insights_index(products)
+    return {"report_digest": "0" * 64, "insights": results, "summary": "Analysis complete.",
+            "quality_report": {"total_products": n_products, "total_records": np.int64(n_products * 90)}}
+
+
+def best_of(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark response serialization and compression")
+    parser.add_argument("--products", default="100,1000,5000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"serializers: {', '.join(SERIALIZERS)}; encodings: identity, {', '.join(ENCODERS)}")
+    print(f"{'products':>8} {'forecast':>8} {'serializer':>10} {'encoding':>8} | {'dump ms':>8} {'encode ms':>9} {'bytes':>11} {'ratio':>6}")
+    for n in [int(v) for v in args.products.split(",")]:
+        for fmt in FORMATS:
+            payload = insights_payload(n, forecast_format=fmt)
+            for name, dumps in SERIALIZERS.items():
+                dump_ms, data = best_of(lambda: dumps(payload), args.repeat)
+                print(f"{n:>8} {fmt:>8} {name:>10} {'identity':>8} | {dump_ms:>8.1f} {0:>9.1f} {len(data):>11,} {1:>6.2f}")
+                for coding, encode in ENCODERS.items():
+                    encode_ms, compressed = best_of(lambda: encode(data), args.repeat)
+                    print(f"{n:>8} {fmt:>8} {name:>10} {coding:>8} | {dump_ms:>8.1f} {encode_ms:>9.1f} "
+                          f"{len(compressed):>11,} {len(data) / len(compressed):>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Synthetic sales CSVs in the same shape as sample-data/, at any scale.
+
+Each product gets a base demand level, a linear trend, a weekly pattern,
+occasional spikes and (for a share of the catalog) intermittent demand with
+many zero days. A small fraction of rows is made dirty the way real exports
+are: blank product names, unparseable dates, non-numeric quantities and
+inconsistent casing/whitespace in product names. Headers use one of the
+casings seen in the sample files.
+
+    python bench/synthetic_sales.py --products 1000 --days 365 --rows-per-day 2 -o /tmp/sales.csv
+"""
+
+import argparse
+import io
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["date", "product_name", "quantity_sold", "price", "revenue"]
+
+HEADER_STYLES = {
+    "lower": lambda c: c,
+    "upper": lambda c: c.upper(),
+    "title": lambda c: "_".join(part.capitalize() for part in c.split("_")),
+}
+
+ITEMS = [
+    ("Atta", 45), ("Basmati Rice", 120), ("Toor Dal", 140), ("Sugar", 48), ("Sunflower Oil", 150),
+    ("Tea Powder", 260), ("Milk", 60), ("Bread", 40), ("Biscuit", 25), ("Soap", 35),
+    ("Shampoo", 180), ("Toothpaste", 95), ("Detergent", 110), ("Paracetamol", 12), ("Mobile Charger", 250),
+    ("T-Shirt", 350), ("Jeans", 1200), ("Notebook", 60), ("Pen", 10), ("Namkeen", 30)
+]
+SIZES = ["100g", "250g", "500g", "1kg", "2kg", "5kg", "Small", "Large", "Pack Of 2", "Pack Of 6"]
+
+
+def product_catalog(n_products: int, rng) -> pd.DataFrame:
+    """Unique product names with a base price each."""
+    picks = rng.integers(0, len(ITEMS), n_products)
+    sizes = rng.integers(0, len(SIZES), n_products)
+    names = [f"{ITEMS[i][0]} {SIZES[s]} {k:05d}" for k, (i, s) in enumerate(zip(picks, sizes))]
+    base_price = np.array([ITEMS[i][1] for i in picks], dtype=float) * rng.uniform(0.6, 1.8, n_products)
+    return pd.DataFrame({"product_name": names, "base_price": np.round(base_price, 0)})
+
+
+def demand_rates(n_products: int, days: int, rng, intermittent_share: float = 0.3,
+                 spike_rate: float = 0.01) -> np.ndarray:
+    """Expected units per product per day, shape (n_products, days)."""
+    t = np.arange(days, dtype=float)
+    base = rng.lognormal(mean=2.5, sigma=1.0, size=n_products)[:, None]            # ~12 units/day median
+    trend = rng.normal(0.0, 0.002, n_products)[:, None] * t[None, :]                 # +-0.2% per day
+    weekly_amp = rng.uniform(0.0, 0.4, n_products)[:, None]
+    weekday = (np.arange(days) + rng.integers(0, 7)) % 7
+    weekly = 1.0 + weekly_amp * np.where(weekday >= 5, 1.0, -0.4)[None, :]           # weekend uplift
+    rates = base * np.clip(1.0 + trend, 0.2, None) * weekly
+
+    spikes = rng.random((n_products, days)) < spike_rate
+    rates = np.where(spikes, rates * rng.uniform(2.5, 6.0, (n_products, days)), rates)
+
+    # Intermittent items sell on a minority of days, in larger lumps
+    intermittent = rng.random(n_products) < intermittent_share
+    if intermittent.any():
+        sell_prob = rng.uniform(0.1, 0.5, intermittent.sum())[:, None]
+        sells = rng.random((intermittent.sum(), days)) < sell_prob
+        rates[intermittent] = np.where(sells, rates[intermittent] / sell_prob, 0.0)
+    return rates
+
+
+def generate(n_products: int = 50, days: int = 90, rows_per_day: int = 1, seed: int = 7,
+             dirty_rate: float = 0.01, header_style: str = "lower",
+             end_date: date = date(2026, 1, 31)) -> pd.DataFrame:
+    """
+    Sales rows for n_products over the `days` days ending at end_date. Each
+    product-day is split into rows_per_day transactions (Poisson splitting,
+    so daily totals keep the same distribution).
+    """
+    rng = np.random.default_rng(seed)
+    catalog = product_catalog(n_products, rng)
+    rates = demand_rates(n_products, days, rng)
+
+    prod_idx = np.repeat(np.arange(n_products), days * rows_per_day)
+    day_idx = np.tile(np.repeat(np.arange(days), rows_per_day), n_products)
+    qty = rng.poisson(rates[prod_idx, day_idx] / rows_per_day)
+
+    # Prices drift a little and occasionally move for a promotion
+    price = np.round(catalog["base_price"].to_numpy()[prod_idx] * rng.choice([1.0, 1.0, 1.0, 0.9, 1.05], prod_idx.size))
+    dates = pd.to_datetime(date.fromordinal(end_date.toordinal() - days + 1)) + pd.to_timedelta(day_idx, unit="D")
+
+    df = pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d"),
+        "product_name": catalog["product_name"].to_numpy()[prod_idx],
+        "quantity_sold": qty.astype(object),
+        "price": price.astype(int),
+        "revenue": (qty * price).astype(int)
+    })
+    if dirty_rate > 0:
+        df = make_dirty(df, rng, dirty_rate)
+
+    df.columns = [HEADER_STYLES[header_style](c) for c in COLUMNS]
+    return df
+
+
+def make_dirty(df: pd.DataFrame, rng, rate: float) -> pd.DataFrame:
+    """Corrupt roughly `rate` of the rows in the ways real exports tend to be wrong."""
+    n = len(df)
+    kind = rng.integers(0, 5, n)
+    dirty = rng.random(n) < rate
+    names = df["product_name"].to_numpy(dtype=object, copy=True)
+    dates = df["date"].to_numpy(dtype=object, copy=True)
+    qty = df["quantity_sold"].to_numpy(dtype=object, copy=True)
+
+    rows = np.flatnonzero(dirty & (kind == 0))
+    names[rows] = ""                                                   # missing product
+    rows = np.flatnonzero(dirty & (kind == 1))
+    dates[rows] = "not-a-date"                                         # unparseable date
+    rows = np.flatnonzero(dirty & (kind == 2))
+    qty[rows] = rng.choice(["", "N/A", "-"], rows.size)                # non-numeric quantity
+    rows = np.flatnonzero(dirty & (kind == 3))
+    names[rows] = [f"  {s.lower()} " for s in names[rows]]             # casing/whitespace variants
+    rows = np.flatnonzero(dirty & (kind == 4))
+    names[rows] = [s.upper() for s in names[rows]]
+
+    df["product_name"], df["date"], df["quantity_sold"] = names, dates, qty
+    return df
+
+
+def to_csv_text(df: pd.DataFrame) -> str:
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    return buf.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic sales CSV")
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--rows-per-day", type=int, default=1)
+    parser.add_argument("--dirty-rate", type=float, default=0.01)
+    parser.add_argument("--header-style", choices=sorted(HEADER_STYLES), default="lower")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("-o", "--output", help="output path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    df = generate(args.products, args.days, args.rows_per_day, args.seed, args.dirty_rate, args.header_style)
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Wrote {len(df)} rows to {args.output}", file=sys.stderr)
+    else:
+        df.to_csv(sys.stdout, index=False)
+
+
+if __name__ == "__main__":
+    main()
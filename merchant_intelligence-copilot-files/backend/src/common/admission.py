@@ -0,0 +1,269 @@
+"""
+Per-tenant admission control for the LLM-backed endpoints.
+
+Two layers, both keyed by merchant (X-Merchant-Id):
+- A token-bucket rate limiter checked at the start of a request. Tenants over
+  budget get an immediate 429 with Retry-After instead of queuing.
+- A fair-share scheduler around every Bedrock call. Calls wait for one of
+  LLM_MAX_CONCURRENCY slots and free slots are handed out round-robin across
+  tenants, so one busy merchant cannot starve everyone else.
+
+Bucket state and usage counters live in a pluggable backend: in-memory
+(per process, for tests and local runs) or DynamoDB (shared across Lambdas).
+"""
+
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+
+from .config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_BURST, RATE_LIMIT_PER_MINUTE, ADMISSION_BACKEND,
+    ADMISSION_TABLE_NAME, LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT_SEC
+)
+from .request_context import merchant_id, json_body, header
+from .responses import too_many
+
+logger = logging.getLogger()
+
+_tenant = contextvars.ContextVar("tenant", default="anonymous")
+
+
+def current_tenant() -> str:
+    return _tenant.get()
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a Bedrock call waited too long for a fair-share slot."""
+
+
+# ---- state backends ----------------------------------------------------------
+
+class InMemoryBackend:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._usage = defaultdict(lambda: defaultdict(float))
+
+    def take(self, tenant, cost, capacity, refill_per_sec, now=None):
+        """Try to take `cost` tokens. Returns (allowed, retry_after_seconds)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, ts = self._buckets.get(tenant, (capacity, now))
+            tokens, allowed, retry_after = _refill_and_take(tokens, ts, now, cost, capacity, refill_per_sec)
+            self._buckets[tenant] = (tokens, now)
+        return allowed, retry_after
+
+    def add_usage(self, tenant, counters: dict):
+        with self._lock:
+            for k, v in counters.items():
+                self._usage[tenant][k] += v
+
+    def usage(self, tenant) -> dict:
+        with self._lock:
+            return dict(self._usage.get(tenant, {}))
+
+
+class DynamoDBBackend:
+    """
+    Shared state in DynamoDB (partition key "pk"). Buckets use optimistic
+    concurrency on a version attribute; usage counters use atomic ADD.
+    """
+
+    def __init__(self, table_name, retries=3):
+        import boto3
+        self.table = boto3.resource("dynamodb").Table(table_name)
+        self.retries = retries
+
+    def take(self, tenant, cost, capacity, refill_per_sec, now=None):
+        from botocore.exceptions import ClientError
+        key = {"pk": f"ratelimit#{tenant}"}
+        for _ in range(self.retries):
+            now = time.time() if now is None else now
+            item = self.table.get_item(Key=key, ConsistentRead=True).get("Item")
+            tokens = float(item["tokens"]) if item else capacity
+            ts = float(item["ts"]) if item else now
+            version = int(item["ver"]) if item else 0
+            tokens, allowed, retry_after = _refill_and_take(tokens, ts, now, cost, capacity, refill_per_sec)
+            try:
+                self.table.put_item(
+                    Item={"pk": key["pk"], "tokens": str(tokens), "ts": str(now), "ver": version + 1},
+                    ConditionExpression="attribute_not_exists(pk) OR ver = :v",
+                    ExpressionAttributeValues={":v": version}
+                )
+                return allowed, retry_after
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                now = None  # lost the race, re-read and retry
+        # Heavy contention on one tenant's bucket: treat as over budget
+        return False, 1.0
+
+    def add_usage(self, tenant, counters: dict):
+        names = {f"#c{i}": k for i, k in enumerate(counters)}
+        values = {f":v{i}": int(round(v)) for i, v in enumerate(counters.values())}
+        self.table.update_item(
+            Key={"pk": f"usage#{tenant}"},
+            UpdateExpression="ADD " + ", ".join(f"#c{i} :v{i}" for i in range(len(counters))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+    def usage(self, tenant) -> dict:
+        item = self.table.get_item(Key={"pk": f"usage#{tenant}"}).get("Item") or {}
+        return {k: float(v) for k, v in item.items() if k != "pk"}
+
+
+def _refill_and_take(tokens, ts, now, cost, capacity, refill_per_sec):
+    tokens = min(capacity, tokens + max(0.0, now - ts) * refill_per_sec)
+    if tokens >= cost:
+        return tokens - cost, True, 0.0
+    retry_after = (cost - tokens) / refill_per_sec if refill_per_sec > 0 else 60.0
+    return tokens, False, retry_after
+
+
+# ---- fair-share scheduler ----------------------------------------------------
+
+class FairScheduler:
+    """Round-robin hand-out of a fixed number of concurrent slots across tenants."""
+
+    def __init__(self, slots: int):
+        self.free = slots
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()   # tenant -> deque of waiting tickets
+        self._granted = set()
+
+    def _dispatch(self):
+        while self.free > 0 and self._queues:
+            tenant, queue = next(iter(self._queues.items()))
+            self._granted.add(queue.popleft())
+            self.free -= 1
+            if queue:
+                self._queues.move_to_end(tenant)  # next turn goes to another tenant
+            else:
+                del self._queues[tenant]
+        self._cond.notify_all()
+
+    def _withdraw(self, tenant, ticket):
+        queue = self._queues.get(tenant)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[tenant]
+
+    @contextmanager
+    def slot(self, tenant: str, timeout: float = None):
+        ticket = object()
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self._queues.setdefault(tenant, deque()).append(ticket)
+            self._dispatch()
+            while ticket not in self._granted:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    self._withdraw(tenant, ticket)
+                    raise AdmissionTimeout(f"No LLM slot for tenant {tenant} within {timeout}s")
+                self._cond.wait(remaining)
+            self._granted.discard(ticket)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.free += 1
+                self._dispatch()
+
+
+# ---- process-wide wiring -----------------------------------------------------
+
+_backend = None
+scheduler = FairScheduler(LLM_MAX_CONCURRENCY)
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if ADMISSION_BACKEND == "dynamodb" and ADMISSION_TABLE_NAME:
+            _backend = DynamoDBBackend(ADMISSION_TABLE_NAME)
+        else:
+            _backend = InMemoryBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the state backend (tests, benchmarks)."""
+    global _backend
+    _backend = backend
+
+
+def record_usage(counters: dict, tenant: str = None):
+    """Best-effort per-tenant usage accounting; never fails the request."""
+    try:
+        get_backend().add_usage(tenant or current_tenant(), counters)
+    except Exception as e:
+        logger.warning(f"Usage accounting failed: {str(e)}")
+
+
+@contextmanager
+def llm_slot():
+    """Fair-share slot for one Bedrock call on behalf of the current tenant."""
+    with scheduler.slot(current_tenant(), LLM_QUEUE_TIMEOUT_SEC):
+        yield
+
+
+def take_budget(cost: float, tenant: str = None) -> tuple:
+    """
+    (allowed, retry_after) for spending `cost` of the tenant's rate-limit
+    budget (default: the current tenant). Always allowed when rate limiting
+    is off or the backend fails, so a broken backend never takes the API down.
+    """
+    if not RATE_LIMIT_ENABLED or cost <= 0:
+        return True, 0.0
+    tenant = tenant or current_tenant()
+    try:
+        allowed, retry_after = get_backend().take(tenant, cost, RATE_LIMIT_BURST, RATE_LIMIT_PER_MINUTE / 60.0)
+    except Exception as e:
+        logger.warning(f"Rate limit check failed, admitting tenant {tenant}: {str(e)}")
+        return True, 0.0
+    if not allowed:
+        record_usage({"rejected": 1}, tenant)
+        logger.info(f"Rate limited tenant {tenant}, retry after {retry_after:.1f}s")
+    return allowed, retry_after
+
+
+@contextmanager
+def as_tenant(tenant: str):
+    """Tag work done outside a request (e.g. the nightly batch) with its tenant."""
+    token = _tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def admit(cost: float = 1):
+    """
+    Decorator for Lambda handlers: tags the invocation with its tenant and,
+    when rate limiting is enabled and cost > 0, rejects over-budget tenants
+    with 429 + Retry-After before any work is done. Handlers whose cost
+    depends on the request charge it themselves with take_budget.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            # Same tenant the handler sees: the header, else the body's merchant_id (large
+            # bodies such as csv_text uploads are only parsed here when there is no header)
+            tenant = merchant_id(event, None if header(event, "X-Merchant-Id") else json_body(event))
+            token = _tenant.set(tenant)
+            try:
+                allowed, retry_after = take_budget(cost, tenant)
+                if not allowed:
+                    return too_many("Too many requests for this merchant. Please retry shortly.", retry_after)
+                record_usage({"requests": 1}, tenant)
+                return handler(event, context)
+            finally:
+                _tenant.reset(token)
+        return wrapper
+    return decorator
@@ -1,18 +1,92 @@
 import json, boto3, os
-from .config import AWS_REGION, TEMPERATURE, TOP_P, MAX_TOKENS
+from contextlib import ExitStack
+from .config import AWS_REGION, TEMPERATURE, TOP_P, MAX_TOKENS, BEDROCK_STUB, BEDROCK_ENDPOINT_URL, CHAT_TOOL_ROUNDS
+from .admission import llm_slot, record_usage
+from .instrumentation import span
+
+def make_client():
+    """
+    Build the Bedrock runtime client.
+    BEDROCK_STUB=inprocess returns the offline fake; BEDROCK_ENDPOINT_URL points
+    boto3 at the HTTP stub (dummy credentials are fine there).
+    """
+    if BEDROCK_STUB == "inprocess":
+        from .bedrock_stub import InProcessClient
+        return InProcessClient.from_config()
+
+    stub_creds = "stub" if BEDROCK_ENDPOINT_URL else None
+    return boto3.client(
+        "bedrock-runtime",
+        region_name=AWS_REGION,
+        endpoint_url=BEDROCK_ENDPOINT_URL,
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID") or stub_creds,
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY") or stub_creds
+    )
 
 # Initialize Bedrock client with credentials from environment
-br = boto3.client(
-    "bedrock-runtime",
-    region_name=AWS_REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-)
-
-def nova_converse(model_id: str, system: str, user: str):
+br = make_client()
+
+def _converse(model_id: str, system: str, messages: list, max_tokens: int = None, tools: list = None):
+    """One Converse call, inside a fair-share LLM slot, with its token usage recorded."""
+    import logging
+    logger = logging.getLogger()
+    
+    request = {
+        "modelId": model_id,
+        "messages": messages,
+        "system": [{"text": system}],
+        "inferenceConfig": {
+            "temperature": TEMPERATURE,
+            "topP": TOP_P,
+            "maxTokens": max_tokens or MAX_TOKENS
+        }
+    }
+    if tools:
+        request["toolConfig"] = {"tools": [{"toolSpec": t} for t in tools]}
+    
+    # Fair-share slot across tenants so one merchant can't hog the Bedrock quota
+    with ExitStack() as stack:
+        with span("llm.queue"):
+            stack.enter_context(llm_slot())
+        with span("bedrock", model=model_id):
+            response = br.converse(**request)
+    
+    logger.info(f"Bedrock response received: {response.get('ResponseMetadata', {}).get('HTTPStatusCode')}")
+    usage = response.get("usage", {})
+    record_usage({
+        "llm_calls": 1,
+        "input_tokens": usage.get("inputTokens", 0),
+        "output_tokens": usage.get("outputTokens", 0)
+    })
+    return response
+
+
+def _run_tools(content: list, tool_handler) -> dict:
+    """The user message answering every toolUse block in an assistant message."""
+    results = []
+    for part in content:
+        if "toolUse" not in part:
+            continue
+        use = part["toolUse"]
+        with span("tool", tool=use.get("name")):
+            try:
+                output, status = tool_handler(use.get("name"), use.get("input") or {}), "success"
+            except Exception as e:
+                output, status = {"error": str(e)}, "error"
+        results.append({"toolResult": {"toolUseId": use["toolUseId"], "content": [{"json": output}], "status": status}})
+    return {"role": "user", "content": results}
+
+
+def nova_converse(model_id: str, system: str, user: str, max_tokens: int = None, history: list = None,
+                  tools: list = None, tool_handler=None):
     """
     Call AWS Bedrock Converse API for Nova models.
     Returns the text response from the model.
+    max_tokens overrides the configured MAX_TOKENS for larger (e.g. batched) replies.
+    history is an optional list of prior {"role", "content"} turns, oldest first.
+    tools is a list of Converse toolSpecs; when the model asks for one,
+    tool_handler(name, input) -> JSON-able dict is called and its result sent
+    back, for up to CHAT_TOOL_ROUNDS rounds before the final answer.
     """
     import logging
     logger = logging.getLogger()
@@ -21,23 +95,20 @@ def nova_converse(model_id: str, system: str, user: str):
         logger.info(f"Calling Bedrock with model: {model_id}")
         logger.info(f"System prompt length: {len(system)}, User prompt length: {len(user)}")
         
-        response = br.converse(
-            modelId=model_id,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [{"text": user}]
-                }
-            ],
-            system=[{"text": system}],
-            inferenceConfig={
-                "temperature": TEMPERATURE,
-                "topP": TOP_P,
-                "maxTokens": MAX_TOKENS
-            }
-        )
+        messages = [{"role": t["role"], "content": [{"text": t["content"]}]} for t in (history or [])]
+        messages.append({
+            "role": "user",
+            "content": [{"text": user}]
+        })
         
-        logger.info(f"Bedrock response received: {response.get('ResponseMetadata', {}).get('HTTPStatusCode')}")
+        response = _converse(model_id, system, messages, max_tokens, tools)
+        # Converse needs the toolConfig on every call once tool blocks are in the conversation
+        rounds = 0
+        while tools and tool_handler and response.get("stopReason") == "tool_use" and rounds < CHAT_TOOL_ROUNDS:
+            assistant = response.get("output", {}).get("message", {})
+            messages += [assistant, _run_tools(assistant.get("content", []), tool_handler)]
+            response = _converse(model_id, system, messages, max_tokens, tools)
+            rounds += 1
         
         # Extract text from response
         output = response.get("output", {})
@@ -0,0 +1,345 @@
+"""
+Offline stand-in for the Bedrock Runtime Converse / ConverseStream APIs.
+Lets chat, weekly_report and any other LLM path run end to end without AWS
+credentials, with configurable latency, token throughput and failure rates.
+
+Two modes:
+- In-process: set BEDROCK_STUB=inprocess and bedrock_nova.br becomes a
+  FakeBedrockRuntime instead of a boto3 client.
+- HTTP: run `python -m common.bedrock_stub --port 8787` from backend/src and
+  point the real boto3 client at it with BEDROCK_ENDPOINT_URL=http://localhost:8787
+"""
+
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .config import (
+    BEDROCK_STUB_LATENCY, BEDROCK_STUB_TOKENS_PER_SEC, BEDROCK_STUB_ERROR_RATE,
+    BEDROCK_STUB_THROTTLE_RATE, BEDROCK_STUB_RESPONSE, BEDROCK_STUB_CANNED_TEXT,
+    BEDROCK_STUB_SEED
+)
+
+DEFAULT_CANNED_TEXT = (
+    "📦 Reorder your high urgency products first, keep an eye on items with demand alerts, "
+    "and review pricing for products with falling demand."
+)
+
+# Bedrock error codes and the HTTP status the real service uses for them
+_ERRORS = {
+    "ThrottlingException": (429, "Too many requests, please wait before trying again."),
+    "InternalServerException": (500, "Internal server error (stub)."),
+}
+
+
+class StubError(Exception):
+    """Raised by the stub when it decides to simulate a service failure."""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.status, self.message = _ERRORS[code]
+        super().__init__(f"{code}: {self.message}")
+
+
+def parse_latency(spec: str):
+    """
+    Parse a latency spec into a sampler returning milliseconds.
+    Supported: fixed:MS, uniform:LO:HI, normal:MEAN:SD, lognormal:MEDIAN:SIGMA, exp:MEAN
+    """
+    parts = (spec or "fixed:0").split(":")
+    kind, args = parts[0].lower(), [float(a) for a in parts[1:]]
+    if kind == "fixed":
+        return lambda rng: args[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(max(args[0], 1e-6)), args[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for load shaping."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class FakeBedrockRuntime:
+    """
+    Drop-in replacement for the boto3 bedrock-runtime client.
+    Only converse() and converse_stream() are implemented.
+    """
+
+    def __init__(self, latency="fixed:0", tokens_per_sec=0.0, error_rate=0.0, throttle_rate=0.0,
+                 response="echo", canned_text=None, seed=None, sleep=time.sleep):
+        self._latency = parse_latency(latency)
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.response = response
+        if canned_text and canned_text.startswith("@"):
+            with open(canned_text[1:], encoding="utf-8") as f:
+                canned_text = f.read()
+        self.canned_text = canned_text or DEFAULT_CANNED_TEXT
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sleep = sleep
+        self.calls = 0
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            latency=BEDROCK_STUB_LATENCY,
+            tokens_per_sec=BEDROCK_STUB_TOKENS_PER_SEC,
+            error_rate=BEDROCK_STUB_ERROR_RATE,
+            throttle_rate=BEDROCK_STUB_THROTTLE_RATE,
+            response=BEDROCK_STUB_RESPONSE,
+            canned_text=BEDROCK_STUB_CANNED_TEXT,
+            seed=BEDROCK_STUB_SEED
+        )
+
+    # ---- Bedrock API surface -------------------------------------------------
+
+    def converse(self, modelId=None, messages=None, system=None, inferenceConfig=None, **kwargs):
+        start = time.time()
+        text, input_tokens, output_tokens, first_token_ms = self._plan(messages, system, inferenceConfig)
+        self._sleep((first_token_ms + self._generation_ms(output_tokens)) / 1000.0)
+        return self._converse_body(text, input_tokens, output_tokens, (time.time() - start) * 1000)
+
+    def converse_stream(self, modelId=None, messages=None, system=None, inferenceConfig=None, **kwargs):
+        plan = self._plan(messages, system, inferenceConfig)
+        return {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "stream": ({name: payload} for name, payload in self.stream_events(plan))
+        }
+
+    # ---- shared by the in-process client and the HTTP server -----------------
+
+    def _plan(self, messages, system, inference_config):
+        """Decide the outcome of one call; raises StubError for simulated failures."""
+        with self._lock:
+            self.calls += 1
+            first_token_ms = self._latency(self._rng)
+            roll = self._rng.random()
+        if roll < self.throttle_rate:
+            raise StubError("ThrottlingException")
+        if roll < self.throttle_rate + self.error_rate:
+            raise StubError("InternalServerException")
+
+        user_text = _last_user_text(messages)
+        system_text = " ".join(s.get("text", "") for s in (system or []))
+        text = self._response_text(user_text)
+
+        max_tokens = (inference_config or {}).get("maxTokens")
+        output_tokens = estimate_tokens(text)
+        if max_tokens and output_tokens > max_tokens:
+            text = text[:max_tokens * 4]
+            output_tokens = max_tokens
+        input_tokens = estimate_tokens(system_text) + sum(
+            estimate_tokens(c.get("text", "")) for m in (messages or []) for c in m.get("content", [])
+        )
+        return text, input_tokens, output_tokens, first_token_ms
+
+    def _response_text(self, user_text: str) -> str:
+        if self.response == "canned":
+            return self.canned_text
+        return f"[stub] {user_text[-400:]}" if user_text else "[stub]"
+
+    def _generation_ms(self, output_tokens: int) -> float:
+        return output_tokens / self.tokens_per_sec * 1000 if self.tokens_per_sec > 0 else 0.0
+
+    def _converse_body(self, text, input_tokens, output_tokens, latency_ms):
+        return {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+            "stopReason": "end_turn",
+            "usage": {
+                "inputTokens": input_tokens,
+                "outputTokens": output_tokens,
+                "totalTokens": input_tokens + output_tokens
+            },
+            "metrics": {"latencyMs": int(latency_ms)}
+        }
+
+    def stream_events(self, plan, chunk_tokens=8):
+        """Yield (event_name, payload) pairs, sleeping to honour latency and throughput."""
+        text, input_tokens, output_tokens, first_token_ms = plan
+        start = time.time()
+        self._sleep(first_token_ms / 1000.0)
+        yield "messageStart", {"role": "assistant"}
+        chunk_chars = chunk_tokens * 4
+        for i in range(0, len(text), chunk_chars):
+            chunk = text[i:i + chunk_chars]
+            self._sleep(self._generation_ms(estimate_tokens(chunk)) / 1000.0)
+            yield "contentBlockDelta", {"contentBlockIndex": 0, "delta": {"text": chunk}}
+        yield "contentBlockStop", {"contentBlockIndex": 0}
+        yield "messageStop", {"stopReason": "end_turn"}
+        yield "metadata", {
+            "usage": {
+                "inputTokens": input_tokens,
+                "outputTokens": output_tokens,
+                "totalTokens": input_tokens + output_tokens
+            },
+            "metrics": {"latencyMs": int((time.time() - start) * 1000)}
+        }
+
+
+def as_client_error(err: StubError, operation: str):
+    """Convert a StubError into the botocore ClientError the real client would raise."""
+    from botocore.exceptions import ClientError
+    return ClientError(
+        {"Error": {"Code": err.code, "Message": err.message},
+         "ResponseMetadata": {"HTTPStatusCode": err.status}},
+        operation
+    )
+
+
+class InProcessClient(FakeBedrockRuntime):
+    """FakeBedrockRuntime that surfaces failures as botocore ClientErrors, like boto3 does."""
+
+    def converse(self, **kwargs):
+        try:
+            return super().converse(**kwargs)
+        except StubError as e:
+            raise as_client_error(e, "Converse")
+
+    def converse_stream(self, **kwargs):
+        try:
+            return super().converse_stream(**kwargs)
+        except StubError as e:
+            raise as_client_error(e, "ConverseStream")
+
+
+def _last_user_text(messages) -> str:
+    for m in reversed(messages or []):
+        if m.get("role") == "user":
+            return " ".join(c.get("text", "") for c in m.get("content", []) if "text" in c)
+    return ""
+
+
+# ---- HTTP mode ---------------------------------------------------------------
+
+_ROUTE = re.compile(r"^/model/(?P<model>[^/]+)/(?P<op>converse|converse-stream)$")
+
+
+def encode_event(event_type: str, payload: dict) -> bytes:
+    """Encode one message in the AWS event stream framing used by ConverseStream."""
+    headers = b"".join(
+        _event_header(name, value) for name, value in (
+            (":event-type", event_type),
+            (":content-type", "application/json"),
+            (":message-type", "event")
+        )
+    )
+    body = json.dumps(payload).encode("utf-8")
+    prelude = struct.pack(">II", 16 + len(headers) + len(body), len(headers))
+    message = prelude + struct.pack(">I", zlib.crc32(prelude)) + headers + body
+    return message + struct.pack(">I", zlib.crc32(message))
+
+
+def _event_header(name: str, value: str) -> bytes:
+    n, v = name.encode("utf-8"), value.encode("utf-8")
+    # header value type 7 = string
+    return struct.pack(">B", len(n)) + n + b"\x07" + struct.pack(">H", len(v)) + v
+
+
+def make_handler(stub: FakeBedrockRuntime):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_POST(self):
+            match = _ROUTE.match(self.path.split("?")[0])
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b"{}"
+            if not match:
+                return self._json(404, {"message": f"Unknown path {self.path}"}, "ResourceNotFoundException")
+
+            try:
+                request = json.loads(raw or b"{}")
+                plan = stub._plan(request.get("messages"), request.get("system"), request.get("inferenceConfig"))
+            except StubError as e:
+                return self._json(e.status, {"message": e.message}, e.code)
+            except ValueError:
+                return self._json(400, {"message": "Malformed request body"}, "ValidationException")
+
+            if match.group("op") == "converse":
+                start = time.time()
+                text, input_tokens, output_tokens, first_token_ms = plan
+                stub._sleep((first_token_ms + stub._generation_ms(output_tokens)) / 1000.0)
+                body = stub._converse_body(text, input_tokens, output_tokens, (time.time() - start) * 1000)
+                body.pop("ResponseMetadata")
+                return self._json(200, body)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("x-amzn-RequestId", f"stub-{stub.calls}")
+            self.end_headers()
+            for name, payload in stub.stream_events(plan):
+                frame = encode_event(name, payload)
+                self.wfile.write(f"{len(frame):x}\r\n".encode() + frame + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _json(self, status, body, error_type=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("x-amzn-RequestId", f"stub-{stub.calls}")
+            if error_type:
+                self.send_header("x-amzn-ErrorType", error_type)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return StubHandler
+
+
+def serve(host="127.0.0.1", port=8787, stub=None):
+    stub = stub or FakeBedrockRuntime.from_config()
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    print(f"Bedrock stub listening on http://{host}:{port} (set BEDROCK_ENDPOINT_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline Bedrock Converse/ConverseStream stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", default=BEDROCK_STUB_LATENCY, help="e.g. lognormal:400:0.5")
+    parser.add_argument("--tokens-per-sec", type=float, default=BEDROCK_STUB_TOKENS_PER_SEC)
+    parser.add_argument("--error-rate", type=float, default=BEDROCK_STUB_ERROR_RATE)
+    parser.add_argument("--throttle-rate", type=float, default=BEDROCK_STUB_THROTTLE_RATE)
+    parser.add_argument("--response", choices=["echo", "canned"], default=BEDROCK_STUB_RESPONSE)
+    parser.add_argument("--canned-text", default=BEDROCK_STUB_CANNED_TEXT)
+    parser.add_argument("--seed", type=int, default=BEDROCK_STUB_SEED)
+    args = parser.parse_args()
+
+    serve(args.host, args.port, FakeBedrockRuntime(
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        response=args.response,
+        canned_text=args.canned_text,
+        seed=args.seed
+    ))
@@ -16,5 +16,120 @@ TOP_P = float(env("TOP_P","0.9"))
 S3_BUCKET_NAME = env("S3_BUCKET_NAME")
 DYNAMODB_TABLE_NAME = env("DYNAMODB_TABLE_NAME")
 
+# Server-side state (sessions, stored insights): local | s3 | memory
+STORAGE_BACKEND = env("STORAGE_BACKEND","local").lower()
+LOCAL_STORAGE_DIR = env("LOCAL_STORAGE_DIR","/tmp/merchant-copilot")
+STORAGE_PREFIX = env("STORAGE_PREFIX","copilot")
+
+# Server-side sales history, memory-mapped from local disk (see common/history_store.py)
+HISTORY_DIR = env("HISTORY_DIR","/tmp/merchant-copilot-history")
+HISTORY_MAX_SEGMENTS = int(env("HISTORY_MAX_SEGMENTS","8"))  # appended segments before compaction
+HISTORY_SYNC = env("HISTORY_SYNC","true" if STORAGE_BACKEND == "s3" else "false").lower() == "true"  # copy to the blob store
+
+# Offline Bedrock stand-in (see common/bedrock_stub.py)
+# BEDROCK_STUB=inprocess swaps the boto3 client for a fake; BEDROCK_ENDPOINT_URL points boto3 at the HTTP stub
+BEDROCK_STUB = env("BEDROCK_STUB","").lower()
+BEDROCK_ENDPOINT_URL = env("BEDROCK_ENDPOINT_URL")
+BEDROCK_STUB_LATENCY = env("BEDROCK_STUB_LATENCY","lognormal:400:0.4")  # fixed|uniform|normal|lognormal|exp, in ms
+BEDROCK_STUB_TOKENS_PER_SEC = float(env("BEDROCK_STUB_TOKENS_PER_SEC","80"))
+BEDROCK_STUB_ERROR_RATE = float(env("BEDROCK_STUB_ERROR_RATE","0"))
+BEDROCK_STUB_THROTTLE_RATE = float(env("BEDROCK_STUB_THROTTLE_RATE","0"))
+BEDROCK_STUB_RESPONSE = env("BEDROCK_STUB_RESPONSE","echo")  # echo | canned
+BEDROCK_STUB_CANNED_TEXT = env("BEDROCK_STUB_CANNED_TEXT")  # literal text or @path/to/file
+BEDROCK_STUB_SEED = int(env("BEDROCK_STUB_SEED")) if env("BEDROCK_STUB_SEED") else None
+
+# Batched per-product LLM explanations in generate_insights (opt-in per request with "explain": true)
+EXPLANATIONS_ENABLED = env("EXPLANATIONS_ENABLED","false").lower() == "true"
+EXPLAIN_BATCH_SIZE = int(env("EXPLAIN_BATCH_SIZE","8"))
+EXPLAIN_MAX_CONCURRENCY = int(env("EXPLAIN_MAX_CONCURRENCY","4"))
+EXPLAIN_TIME_MARGIN_MS = int(env("EXPLAIN_TIME_MARGIN_MS","3000"))  # left for serialization before the Lambda timeout
+EXPLAIN_MAX_SECONDS = float(env("EXPLAIN_MAX_SECONDS","20"))
+
+# Server-side chat sessions: token budget for verbatim history before older turns are summarized
+CHAT_HISTORY_MAX_TOKENS = int(env("CHAT_HISTORY_MAX_TOKENS","1500"))
+CHAT_SUMMARY_MAX_TOKENS = int(env("CHAT_SUMMARY_MAX_TOKENS","300"))
+
+# Per-merchant admission control for LLM-backed endpoints (see common/admission.py)
+RATE_LIMIT_ENABLED = env("RATE_LIMIT_ENABLED","true").lower() == "true"
+RATE_LIMIT_BURST = float(env("RATE_LIMIT_BURST","20"))
+RATE_LIMIT_PER_MINUTE = float(env("RATE_LIMIT_PER_MINUTE","30"))
+ADMISSION_BACKEND = env("ADMISSION_BACKEND","memory").lower()  # memory | dynamodb
+ADMISSION_TABLE_NAME = env("ADMISSION_TABLE_NAME", DYNAMODB_TABLE_NAME)
+LLM_MAX_CONCURRENCY = int(env("LLM_MAX_CONCURRENCY","8"))  # concurrent Bedrock calls per process
+LLM_QUEUE_TIMEOUT_SEC = float(env("LLM_QUEUE_TIMEOUT_SEC","10"))
+
+# Weekly report precompute: off | async (Lambda Event invoke) | thread (local servers)
+WEEKLY_REPORT_PRECOMPUTE = env("WEEKLY_REPORT_PRECOMPUTE","thread").lower()
+WEEKLY_REPORT_FUNCTION_NAME = env("WEEKLY_REPORT_FUNCTION_NAME")
+WEEKLY_REPORT_PENDING_TIMEOUT_SEC = float(env("WEEKLY_REPORT_PENDING_TIMEOUT_SEC","120"))
+WEEKLY_REPORT_TIME_MARGIN_SEC = float(env("WEEKLY_REPORT_TIME_MARGIN_SEC","15"))  # scheduled runs start no report this close to the Lambda timeout
+
+# Per-stage timing instrumentation (see common/instrumentation.py)
+INSTRUMENTATION_ENABLED = env("INSTRUMENTATION_ENABLED","false").lower() == "true"
+INSTRUMENT_MEMORY = env("INSTRUMENT_MEMORY","false").lower() == "true"  # tracemalloc peaks; adds overhead
+TIMINGS_DEBUG_ENABLED = env("TIMINGS_DEBUG_ENABLED","false").lower() == "true"  # allow "debug": true to return timings; local/bench only
+METRICS_NAMESPACE = env("METRICS_NAMESPACE","MerchantCopilot")
+
+# On-demand profiling (see common/profiling.py): fraction of invocations run under cProfile/tracemalloc
+PROFILE_SAMPLE_RATE = float(env("PROFILE_SAMPLE_RATE","0"))
+PROFILE_MODE = env("PROFILE_MODE","cprofile,tracemalloc").lower()  # any of: cprofile, tracemalloc
+PROFILE_OUTPUT = env("PROFILE_OUTPUT","tmp").lower()  # tmp (PROFILE_DIR) | s3 (S3_BUCKET_NAME)
+PROFILE_DIR = env("PROFILE_DIR","/tmp/profiles")
+PROFILE_HEADER_ENABLED = env("PROFILE_HEADER_ENABLED","false").lower() == "true"  # honour X-Profile: 1
+PROFILE_TOP_N = int(env("PROFILE_TOP_N","40"))
+
+# Response serialization (see common/serialization.py)
+JSON_SERIALIZER = env("JSON_SERIALIZER","auto").lower()  # auto | orjson | stdlib
+RESPONSE_COMPRESSION = env("RESPONSE_COMPRESSION","true").lower() == "true"  # gzip/br per Accept-Encoding
+COMPRESS_MIN_BYTES = int(env("COMPRESS_MIN_BYTES","1024"))
+GZIP_LEVEL = int(env("GZIP_LEVEL","6"))
+BROTLI_QUALITY = int(env("BROTLI_QUALITY","5"))
+
+# Per-product outlier filter in generate_insights (see common/data_quality.py)
+OUTLIER_MAD_THRESHOLD = float(env("OUTLIER_MAD_THRESHOLD","5"))  # robust z-score; 0 disables the filter
+OUTLIER_MIN_DEVIATION = float(env("OUTLIER_MIN_DEVIATION","0.5"))  # and at least this far from the median, relative
+OUTLIER_MIN_ROWS = int(env("OUTLIER_MIN_ROWS","8"))  # products with fewer rows are never filtered
+
+# Stock-aware reorder simulation (see common/inventory.py)
+INVENTORY_PATHS = int(env("INVENTORY_PATHS","2000"))  # Monte Carlo demand paths per product
+INVENTORY_SERVICE_LEVEL = float(env("INVENTORY_SERVICE_LEVEL","0.95"))
+INVENTORY_LEAD_TIME_DAYS = int(env("INVENTORY_LEAD_TIME_DAYS","3"))  # when a product has none
+INVENTORY_REVIEW_DAYS = int(env("INVENTORY_REVIEW_DAYS","7"))  # days until the next ordering decision
+INVENTORY_SEED = int(env("INVENTORY_SEED","42"))  # fixed so repeated requests agree
+INVENTORY_CHUNK_MB = int(env("INVENTORY_CHUNK_MB","64"))  # simulation memory per chunk of products
+
+# Chat answers from stored sales history (see common/sales_query.py)
+SALES_QUERY_MAX_ROWS = int(env("SALES_QUERY_MAX_ROWS","20"))  # grouped rows per answer
+SALES_QUERY_CACHE_SIZE = int(env("SALES_QUERY_CACHE_SIZE","16"))  # merchants' query engines kept per container
+CHAT_SALES_TOOL = env("CHAT_SALES_TOOL","true").lower() == "true"  # offer the sales_query tool to the LLM
+CHAT_TOOL_ROUNDS = int(env("CHAT_TOOL_ROUNDS","3"))  # tool calls per chat message before the answer
+
+# Hierarchical forecasting (see common/hierarchy.py)
+FORECAST_MODE = env("FORECAST_MODE","per_product").lower()  # per_product | hierarchical
+HIERARCHY_HEAD_PRODUCTS = int(env("HIERARCHY_HEAD_PRODUCTS","20"))  # best sellers that keep their own model
+HIERARCHY_MIN_HEAD_DAYS = int(env("HIERARCHY_MIN_HEAD_DAYS","14"))  # days of history needed for an own model
+HIERARCHY_MAX_GROUPS = int(env("HIERARCHY_MAX_GROUPS","8"))  # category models; smaller categories share one
+HIERARCHY_SHARE_DAYS = int(env("HIERARCHY_SHARE_DAYS","28"))  # window for each product's share of its group
+
+# Prophet model reuse (see common/prophet_backend.py)
+PROPHET_STAN_MODEL = env("PROPHET_STAN_MODEL")  # compiled model shipped with the deployment; default: the prophet package's
+PROPHET_PRELOAD = env("PROPHET_PRELOAD","true").lower() == "true"  # load at import (Lambda init) instead of on the first fit
+
+# Forecast horizons (see common/forecasting.py and common/forecast_inputs.py)
+FORECAST_HORIZON = int(env("FORECAST_HORIZON","7"))  # days forecast eagerly per product; over 7 adds forecast_30d
+FORECAST_HORIZON_MAX = int(env("FORECAST_HORIZON_MAX","90"))  # longest horizon a request may ask for
+
+# Nightly batch precompute (see handlers/batch_precompute.py)
+BATCH_CONCURRENCY = int(env("BATCH_CONCURRENCY","4"))  # merchants recomputed at once
+BATCH_LANGUAGES = [l.strip() for l in env("BATCH_LANGUAGES","en").split(",") if l.strip()]  # weekly reports per merchant
+BATCH_TIME_MARGIN_SEC = float(env("BATCH_TIME_MARGIN_SEC","120"))  # stop starting merchants this close to the Lambda timeout
+BATCH_FUNCTION_NAME = env("BATCH_FUNCTION_NAME")  # re-invoked with a cursor to continue a run past one timeout
+
+# Insights response shape (see common/insights_view.py and common/forecast_format.py)
+FORECAST_FORMAT = env("FORECAST_FORMAT","rows").lower()  # rows | columnar (see common/forecast_format.py)
+PAGE_SIZE_DEFAULT = int(env("PAGE_SIZE_DEFAULT","50"))
+PAGE_SIZE_MAX = int(env("PAGE_SIZE_MAX","500"))
+PAGE_CACHE_SIZE = int(env("PAGE_CACHE_SIZE","16"))  # stored results kept in memory per container
+
 APP_ENV = env("APP_ENV","development")
 LOG_LEVEL = env("LOG_LEVEL","INFO")
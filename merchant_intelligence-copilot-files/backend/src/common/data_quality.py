@@ -0,0 +1,155 @@
+"""
+Row-level data-quality checks for uploaded sales CSVs.
+
+generate_insights drops rows without a usable date or product and treats
+unparseable numbers as 0. validate_rows reports what that cleaning hides,
+using whole-column operations so the cost stays a small constant factor over
+parsing. It reports:
+
+- unparseable dates and missing product names (rows that get dropped)
+- non-numeric quantity/price/revenue values (read as 0)
+- negative quantities
+- revenue that doesn't match price x quantity
+- duplicate (date, product) rows
+- days with no rows inside each product's date range
+
+robust_outliers is the per-product outlier filter applied after cleaning.
+Each issue has a count and up to SAMPLE_ROWS sample rows. Row numbers are
+0-based data rows, so a row's line in the CSV file is row + 2 (the header is
+line 1).
+"""
+
+import numpy as np
+import pandas as pd
+
+from .config import OUTLIER_MAD_THRESHOLD, OUTLIER_MIN_DEVIATION, OUTLIER_MIN_ROWS
+
+NUMERIC_COLUMNS = ("quantity_sold", "price", "revenue")
+SAMPLE_ROWS = 5
+REVENUE_TOLERANCE = 0.01  # relative to price x quantity
+REVENUE_TOLERANCE_ABS = 1.0  # currency units, for rounding on cheap items
+OUTLIER_COLUMNS = ("quantity_sold", "price")
+
+
+def parse_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Typed copy of a raw upload: dates and numbers parsed (failures become
+    NaN/NaT) and product names normalized; nothing is dropped or filled yet.
+    """
+    names = df["product_name"]
+    return df.assign(
+        date=pd.to_datetime(df["date"], errors="coerce"),
+        product_name=names.astype(str).str.strip().str.title().where(names.notna()),
+        **{c: pd.to_numeric(df[c], errors="coerce") for c in NUMERIC_COLUMNS}
+    )
+
+
+def validate_rows(raw: pd.DataFrame, parsed: pd.DataFrame) -> dict:
+    """Data-quality section of quality_report for a raw upload and its parse_frame()."""
+    masks = {}
+    date_ok = parsed["date"].notna().to_numpy()
+    name_ok = parsed["product_name"].notna().to_numpy()
+    masks["unparseable_date"] = ~date_ok & raw["date"].notna().to_numpy()
+    masks["missing_date"] = raw["date"].isna().to_numpy()
+    masks["missing_product_name"] = ~name_ok
+
+    numeric_ok = {}
+    for c in NUMERIC_COLUMNS:
+        present = raw[c].notna().to_numpy()
+        numeric_ok[c] = parsed[c].notna().to_numpy()
+        masks[f"non_numeric_{c}"] = ~numeric_ok[c] & present
+        masks[f"missing_{c}"] = ~present
+
+    qty = parsed["quantity_sold"].to_numpy(dtype=float)
+    price = parsed["price"].to_numpy(dtype=float)
+    revenue = parsed["revenue"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        masks["negative_quantity"] = numeric_ok["quantity_sold"] & (qty < 0)
+        expected = price * qty
+        tolerance = np.maximum(REVENUE_TOLERANCE_ABS, np.abs(expected) * REVENUE_TOLERANCE)
+        all_numeric = numeric_ok["quantity_sold"] & numeric_ok["price"] & numeric_ok["revenue"]
+        masks["revenue_mismatch"] = all_numeric & (np.abs(revenue - expected) > tolerance)
+
+    # Duplicates and gaps only make sense for rows that survive cleaning. Products
+    # are factorized once and (product, day) pairs packed into one integer key.
+    usable = date_ok & name_ok
+    codes, names = pd.factorize(parsed["product_name"].to_numpy()[usable])
+    days = parsed["date"].to_numpy()[usable].astype("datetime64[D]").astype(np.int64)
+    days = days - days.min() if len(days) else days
+    pair = codes.astype(np.int64) * (int(days.max()) + 1 if len(days) else 1) + days
+    duplicate = pd.Series(pair).duplicated(keep="first").to_numpy()
+    masks["duplicate_date_product"] = np.zeros(len(parsed), dtype=bool)
+    masks["duplicate_date_product"][np.flatnonzero(usable)[duplicate]] = True
+
+    issues = {}
+    any_issue = np.zeros(len(parsed), dtype=bool)
+    for name, mask in masks.items():
+        count = int(mask.sum())
+        if count:
+            issues[name] = {"count": count, "rows": np.flatnonzero(mask)[:SAMPLE_ROWS].tolist()}
+            any_issue |= mask
+
+    return {
+        "rows_checked": len(raw),
+        "rows_dropped": int((~usable).sum()),
+        "rows_with_issues": int(any_issue.sum()),
+        "issues": issues,
+        "gaps": _gaps(codes[~duplicate], days[~duplicate], names)
+    }
+
+
+def _gaps(codes: np.ndarray, days: np.ndarray, names) -> dict:
+    """Days without a row between each product's first and last date, from unique (product, day) pairs."""
+    if len(codes) == 0:
+        return {"products_with_gaps": 0, "missing_days": 0, "worst": []}
+    first = np.full(len(names), np.iinfo(np.int64).max)
+    last = np.full(len(names), np.iinfo(np.int64).min)
+    np.minimum.at(first, codes, days)
+    np.maximum.at(last, codes, days)
+    missing = last - first + 1 - np.bincount(codes, minlength=len(names))
+    gapped = np.flatnonzero(missing > 0)
+    worst = gapped[np.argsort(-missing[gapped], kind="stable")[:SAMPLE_ROWS]]
+    return {
+        "products_with_gaps": int(len(gapped)),
+        "missing_days": int(missing[gapped].sum()),
+        "worst": [{"product_name": names[i], "missing_days": int(missing[i])} for i in worst]
+    }
+
+
+def robust_outliers(df: pd.DataFrame, columns=OUTLIER_COLUMNS, threshold: float = OUTLIER_MAD_THRESHOLD,
+                    min_deviation: float = OUTLIER_MIN_DEVIATION, min_rows: int = OUTLIER_MIN_ROWS) -> tuple:
+    """
+    (rows to keep, report) for a cleaned frame. A row is an outlier when, for
+    its own product, a column's robust z-score (distance from the median over
+    the scaled MAD) exceeds threshold and the value is also more than
+    min_deviation x median away, so a saree is judged against sarees and
+    small promotions or busy days survive. When most of a product's values
+    are equal (MAD = 0) the mean absolute deviation is used instead.
+    """
+    keep = np.ones(len(df), dtype=bool)
+    report = {"count": 0, "threshold": threshold, "by_product": {}, "rows": []}
+    if threshold <= 0 or df.empty:
+        return keep, report
+
+    codes, names = pd.factorize(df["product_name"].to_numpy())
+    eligible = np.bincount(codes)[codes] >= min_rows
+    outlier = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        x = df[col].to_numpy(dtype=float)
+        median = pd.Series(x).groupby(codes).transform("median").to_numpy()
+        deviation = np.abs(x - median)
+        grouped = pd.Series(deviation).groupby(codes)
+        mad = grouped.transform("median").to_numpy()
+        scale = np.where(mad > 0, mad / 0.6745, grouped.transform("mean").to_numpy() * 1.2533)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            far = (deviation > threshold * scale) & (scale > 0)
+        outlier |= eligible & far & (deviation > min_deviation * np.abs(median))
+
+    keep = ~outlier
+    removed = np.bincount(codes[outlier], minlength=len(names))
+    report.update({
+        "count": int(outlier.sum()),
+        "by_product": {names[i]: int(removed[i]) for i in np.flatnonzero(removed)},
+        "rows": df.index[outlier][:SAMPLE_ROWS].tolist()
+    })
+    return keep, report
@@ -0,0 +1,148 @@
+"""
+Batched LLM explanations for per-product insights.
+
+Products are packed several to a prompt and the model answers with one JSON
+object per batch, so a catalog of N products costs ceil(N / batch_size) calls
+instead of N. Batches run concurrently, limited by a process-wide semaphore,
+and anything that has not come back before the Lambda deadline is marked
+instead of holding up the response.
+"""
+
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .config import (
+    BEDROCK_MODEL_FAST, EXPLAIN_BATCH_SIZE, EXPLAIN_MAX_CONCURRENCY,
+    EXPLAIN_TIME_MARGIN_MS, EXPLAIN_MAX_SECONDS
+)
+from .bedrock_nova import nova_converse
+from .forecast_format import yhat_values
+
+logger = logging.getLogger()
+
+# Shared by every request in the process so concurrent invocations
+# (e.g. a multi-threaded local server) cannot multiply the Bedrock load
+_llm_slots = threading.BoundedSemaphore(EXPLAIN_MAX_CONCURRENCY)
+
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"      # batch did not finish before the deadline
+STATUS_FAILED = "failed"        # Bedrock call or JSON parsing failed
+STATUS_MISSING = "missing"      # model answered but left this product out
+STATUSES = (STATUS_OK, STATUS_TIMEOUT, STATUS_FAILED, STATUS_MISSING)
+
+LANG_INSTRUCTION = {
+    "en": "Write in English",
+    "hi": "Write in Hindi (हिंदी)",
+    "mr": "Write in Marathi (मराठी)"
+}
+
+
+def remaining_seconds(context, default=EXPLAIN_MAX_SECONDS):
+    """Time left for the explanation stage, honouring the Lambda deadline if there is one."""
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining is None:
+        return default
+    return max(0.0, min(default, (get_remaining() - EXPLAIN_TIME_MARGIN_MS) / 1000.0))
+
+
+def product_brief(i: int, product: dict) -> dict:
+    """Compact, prompt-friendly summary of one product's insights."""
+    price_hint = product.get("price_hint") or {}
+    return {
+        "id": i,
+        "name": product["product_name"],
+        "forecast_7d_units": round(sum(yhat_values(product.get("forecast"))), 1),
+        "confidence": product.get("confidence_score"),
+        "reorder_qty": product["reorder"]["quantity"],
+        "urgency": product["reorder"]["urgency"],
+        "anomalies": [a["type"] for a in product.get("anomalies", [])],
+        "price_action": price_hint.get("action"),
+        "trend": product.get("demand_reasoning")
+    }
+
+
+def _parse_batch_reply(text: str) -> dict:
+    """Pull {id: explanation} out of the model reply, tolerating code fences and chatter."""
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        raise ValueError("No JSON object in model reply")
+    data = json.loads(match.group(0))
+    return {
+        int(item["id"]): str(item["explanation"]).strip()
+        for item in data.get("explanations", [])
+        if "id" in item and item.get("explanation")
+    }
+
+
+def _explain_batch(batch, language, deadline):
+    """Run one batched prompt. Returns {id: explanation}."""
+    system = f"""You explain inventory insights to Indian MSME merchants.
+{LANG_INSTRUCTION.get(language, LANG_INSTRUCTION['en'])}. For each product write 1-2 short, plain sentences on why demand looks the way it does and what to do.
+Reply with JSON only: {{"explanations": [{{"id": <id>, "explanation": "<text>"}}]}}"""
+    user = "Products:\n" + json.dumps(batch, ensure_ascii=False)
+
+    with _llm_slots:
+        if time.time() >= deadline:
+            raise TimeoutError("Deadline passed while waiting for a Bedrock slot")
+        reply = nova_converse(BEDROCK_MODEL_FAST, system, user, max_tokens=90 * len(batch))
+    return _parse_batch_reply(reply)
+
+
+def explain_products(products: list, language: str = "en", time_budget: float = EXPLAIN_MAX_SECONDS,
+                     batch_size: int = EXPLAIN_BATCH_SIZE) -> dict:
+    """
+    Fill llm_explanation / llm_explanation_status on each product in place.
+    Returns a small summary of the stage for the response, with the number
+    of products per llm_explanation_status (all of them final).
+    """
+    if not products:
+        return {"batches": 0, "statuses": dict.fromkeys(STATUSES, 0)}
+
+    start = time.time()
+    deadline = start + time_budget
+    briefs = [product_brief(i, p) for i, p in enumerate(products)]
+    batches = [briefs[i:i + batch_size] for i in range(0, len(briefs), batch_size)]
+
+    for p in products:
+        p["llm_explanation"] = None
+        p["llm_explanation_status"] = STATUS_TIMEOUT
+
+    pool = ThreadPoolExecutor(max_workers=min(len(batches), EXPLAIN_MAX_CONCURRENCY))
+    # copy_context keeps the caller's tenant for fair-share scheduling inside worker threads
+    futures = {
+        pool.submit(contextvars.copy_context().run, _explain_batch, batch, language, deadline): batch
+        for batch in batches
+    }
+    done, not_done = wait(futures, timeout=time_budget)
+    # Don't block the response on stragglers; queued batches are dropped
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    for future in done:
+        batch = futures[future]
+        try:
+            explanations = future.result()
+        except Exception as e:
+            logger.warning(f"Explanation batch failed: {str(e)}")
+            status = STATUS_TIMEOUT if isinstance(e, TimeoutError) else STATUS_FAILED
+            for b in batch:
+                products[b["id"]]["llm_explanation_status"] = status
+            continue
+        for b in batch:
+            text = explanations.get(b["id"])
+            products[b["id"]]["llm_explanation"] = text
+            products[b["id"]]["llm_explanation_status"] = STATUS_OK if text else STATUS_MISSING
+
+    counts = Counter(p["llm_explanation_status"] for p in products)
+    logger.info(f"Explained {counts[STATUS_OK]}/{len(products)} products in {len(batches)} batches "
+                f"({time.time() - start:.2f}s, {len(not_done)} batches unfinished)")
+    return {
+        "batches": len(batches),
+        "statuses": {s: counts[s] for s in STATUSES},
+        "seconds": round(time.time() - start, 3)
+    }
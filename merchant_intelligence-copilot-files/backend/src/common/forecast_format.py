@@ -0,0 +1,78 @@
+"""
+The two wire shapes of a product forecast.
+
+rows (the original contract, still the default):
+    [{"ds": "2026-02-01", "yhat": 12.5, "yhat_lower": 8.1, "yhat_upper": 16.9}, ...]
+
+columnar (opt-in with "forecast_format": "columnar"):
+    {"start": "2026-02-01", "yhat": [12.5, ...], "yhat_lower": [8.1, ...], "yhat_upper": [16.9, ...]}
+
+Columnar forecasts are consecutive days from start. forecasting.py builds
+the columnar shape straight from NumPy arrays; rows are derived from it only
+when a client asks for them. Code that only needs the predicted values
+should use yhat_values(), which accepts either shape.
+"""
+
+from datetime import date, timedelta
+
+FORMATS = ("rows", "columnar")
+COLUMNS = ("yhat", "yhat_lower", "yhat_upper")
+
+
+def is_columnar(forecast) -> bool:
+    return isinstance(forecast, dict)
+
+
+def columns(start: str, yhat: list, yhat_lower: list, yhat_upper: list) -> dict:
+    return {"start": start, "yhat": yhat, "yhat_lower": yhat_lower, "yhat_upper": yhat_upper}
+
+
+def head(forecast, n: int):
+    """First n days of a forecast, in the same shape."""
+    if is_columnar(forecast):
+        return {"start": forecast["start"], **{c: forecast[c][:n] for c in COLUMNS}}
+    return forecast[:n]
+
+
+def yhat_values(forecast) -> list:
+    if not forecast:
+        return []
+    if is_columnar(forecast):
+        return forecast["yhat"]
+    return [f.get("yhat", 0) for f in forecast]
+
+
+def to_rows(forecast) -> list:
+    if not is_columnar(forecast):
+        return forecast or []
+    start = date.fromisoformat(forecast["start"])
+    return [
+        {"ds": (start + timedelta(days=i)).isoformat(), "yhat": y, "yhat_lower": lo, "yhat_upper": hi}
+        for i, (y, lo, hi) in enumerate(zip(forecast["yhat"], forecast["yhat_lower"], forecast["yhat_upper"]))
+    ]
+
+
+def to_columns(forecast) -> dict:
+    if is_columnar(forecast):
+        return forecast
+    if not forecast:
+        return None
+    return columns(forecast[0]["ds"], *([f.get(c) for f in forecast] for c in COLUMNS))
+
+
+def convert(forecast, fmt: str):
+    return to_columns(forecast) if fmt == "columnar" else to_rows(forecast)
+
+
+def format_product(product: dict, fmt: str) -> dict:
+    """Copy of product with its forecasts in fmt (the product itself is returned when nothing changes)."""
+    keys = [k for k in ("forecast", "forecast_30d") if k in product and is_columnar(product[k]) != (fmt == "columnar")]
+    if not keys:
+        return product
+    return {**product, **{k: convert(product[k], fmt) for k in keys}}
+
+
+def check_format(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise ValueError(f"forecast_format must be one of: {', '.join(FORMATS)}")
+    return fmt
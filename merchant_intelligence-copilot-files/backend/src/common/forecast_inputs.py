@@ -0,0 +1,79 @@
+"""
+What a stored insights result's forecasts were fitted from.
+
+generate_insights forecasts FORECAST_HORIZON days (or a request's
+"horizon") eagerly, 7 by default. Longer forecasts for a single product,
+e.g. when the Dashboard expands one to 30 days, come from
+GET /insights/forecast, which may run in another function than the one that
+fitted the models. So next to each stored result go the daily series every
+model was fitted on (per product, or per group with each tail product's
+share in hierarchical mode) and the uncertainty_samples used; the endpoint
+fits that product's model again from them and predicts the longer horizon.
+Like the result itself they are keyed by merchant and digest and written
+once per distinct result.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .forecasting import fit_forecaster, FittedForecast
+from .hierarchy import TopDownForecast
+from .storage import get_store
+
+
+def _key(merchant_id: str, digest: str) -> str:
+    return f"insights/{merchant_id}/{digest}.forecast-inputs.json"
+
+
+def _series(history: pd.DataFrame) -> dict:
+    """A model's daily history as day offsets from its first date."""
+    dates = pd.to_datetime(history["date"])
+    start = dates.min()
+    return {
+        "start": start.date().isoformat(),
+        "day": (dates - start).dt.days.astype(int).tolist(),
+        "quantity_sold": np.asarray(history["quantity_sold"], dtype=float).tolist()
+    }
+
+
+def _frame(series: dict) -> pd.DataFrame:
+    return pd.DataFrame({
+        "date": pd.Timestamp(series["start"]) + pd.to_timedelta(series["day"], unit="D"),
+        "quantity_sold": np.asarray(series["quantity_sold"], dtype=float)
+    })
+
+
+def save_inputs(merchant_id: str, digest: str, models: dict, uncertainty_samples: int = None):
+    """Store the series behind models ({product: FittedForecast | TopDownForecast}) for a stored result."""
+    store = get_store()
+    if not digest or not models or store.exists(_key(merchant_id, digest)):
+        return
+    products, top_down, groups = {}, {}, {}
+    for name, model in models.items():
+        if isinstance(model, TopDownForecast):
+            top_down[name] = {"group": model.group, "share": model.share}
+            if model.group not in groups:
+                groups[model.group] = _series(model.group_model.history)
+        elif isinstance(model, FittedForecast):
+            products[name] = _series(model.history)
+    store.put_json(_key(merchant_id, digest), {
+        "uncertainty_samples": uncertainty_samples,
+        "products": products,
+        "top_down": top_down,
+        "groups": groups
+    })
+
+
+def load_model(merchant_id: str, digest: str, product: str):
+    """The product's model fitted again from the stored inputs, or None without any for it."""
+    inputs = get_store().get_json(_key(merchant_id, digest))
+    if not inputs:
+        return None
+    samples = inputs.get("uncertainty_samples")
+    if product in inputs["products"]:
+        return fit_forecaster(_frame(inputs["products"][product]), samples)
+    plan = inputs["top_down"].get(product)
+    if plan is None or plan["group"] not in inputs["groups"]:
+        return None
+    group_model = fit_forecaster(_frame(inputs["groups"][plan["group"]]), samples)
+    return TopDownForecast(group_model, plan["share"], plan["group"])
@@ -1,13 +1,97 @@
 import pandas as pd
 import numpy as np
+from .instrumentation import span
+from .forecast_format import columns
+from .prophet_backend import new_prophet
+from .config import FORECAST_HORIZON_MAX
 
-def prophet_forecast(df: pd.DataFrame, days=30):
+MIN_HORIZON = 7  # reorder rules use the first week
+MIN_SAMPLES, MAX_SAMPLES = 10, 1000
+
+
+def _columnar(start, yhat, lower, upper) -> dict:
+    """Columnar forecast (see forecast_format) from arrays, clipped at zero and rounded to 2 dp."""
+    clip = lambda a: np.round(np.maximum(np.asarray(a, dtype=float), 0), 2).tolist()
+    return columns(pd.Timestamp(start).date().isoformat(), clip(yhat), clip(lower), clip(upper))
+
+
+def _confidence(forecast: dict, scale: float) -> float:
+    """Narrower prediction interval relative to the forecast => higher confidence."""
+    widths = np.subtract(forecast["yhat_upper"], forecast["yhat_lower"])
+    avg_pred = np.mean(forecast["yhat"]) or 1.0
+    return max(0, min(100, 100 - (np.mean(widths) / avg_pred * scale)))
+
+
+class FittedForecast:
+    """
+    A fitted demand model that forecasts any number of days after its
+    history, so a longer horizon can be computed later from the same fit
+    (see forecast_inputs.py). Holds a fitted Prophet, or only the history
+    when the moving average is used.
+    """
+
+    def __init__(self, history: pd.DataFrame, model=None):
+        self.history = history
+        self.model = model
+
+    @property
+    def method(self) -> str:
+        return "prophet" if self.model is not None else "moving_average"
+
+    def predict(self, days: int = 30):
+        """(columnar forecast, confidence score) for the next `days` days; see forecast_format."""
+        if self.model is None:
+            return moving_average_forecast(self.history, days)
+        try:
+            # Future dates only: predicting (and sampling uncertainty) over the history is wasted work
+            with span("prophet.predict"):
+                future = self.model.make_future_dataframe(periods=days, freq='D', include_history=False)
+                forecast = self.model.predict(future)
+            
+            # Columnar output straight from the frame's arrays (no per-row objects)
+            results = _columnar(forecast["ds"].iloc[0], forecast["yhat"].to_numpy(),
+                                forecast["yhat_lower"].to_numpy(), forecast["yhat_upper"].to_numpy())
+            
+            # Calculate confidence score based on prediction interval width
+            conf = _confidence(results, 50)
+            
+            return results, round(conf, 2)
+        except Exception as e:
+            print(f"Prophet predict failed: {e}. Using moving average fallback.")
+            return moving_average_forecast(self.history, days)
+
+
+def check_horizon(days, name: str = "horizon") -> int:
+    try:
+        days = int(days)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a whole number of days")
+    if not MIN_HORIZON <= days <= FORECAST_HORIZON_MAX:
+        raise ValueError(f"{name} must be between {MIN_HORIZON} and {FORECAST_HORIZON_MAX} days")
+    return days
+
+
+def check_samples(samples):
+    """uncertainty_samples from a request: None keeps the per-model default."""
+    if samples is None:
+        return None
+    try:
+        samples = int(samples)
+    except (TypeError, ValueError):
+        raise ValueError("uncertainty_samples must be a whole number")
+    if not MIN_SAMPLES <= samples <= MAX_SAMPLES:
+        raise ValueError(f"uncertainty_samples must be between {MIN_SAMPLES} and {MAX_SAMPLES}")
+    return samples
+
+
+def fit_forecaster(df: pd.DataFrame, uncertainty_samples: int = None) -> FittedForecast:
     """
     Prophet-based forecasting with seasonality detection - OPTIMIZED for speed.
     Falls back to moving average if Prophet fails or insufficient data.
+    uncertainty_samples overrides the draws used for the intervals (50 for
+    short histories, 100 otherwise).
     """
     try:
-        from prophet import Prophet
         import logging
         
         # Suppress Prophet logging for speed
@@ -21,62 +105,48 @@ def prophet_forecast(df: pd.DataFrame, days=30):
         
         # Use moving average for small datasets (< 14 days)
         if len(prophet_df) < 14:
-            return moving_average_forecast(df, days)
+            return FittedForecast(df)
         
         # For datasets between 14-30 days, use simplified Prophet
         if len(prophet_df) < 30:
-            model = Prophet(
+            model = new_prophet(
                 daily_seasonality=False,
                 weekly_seasonality=False,  # Disable for small datasets
                 yearly_seasonality=False,
                 interval_width=0.8,
                 changepoint_prior_scale=0.01,  # Less sensitive for small data
                 mcmc_samples=0,
-                uncertainty_samples=50  # Reduced for speed
+                uncertainty_samples=uncertainty_samples or 50  # Reduced for speed
             )
         else:
             # Full Prophet for larger datasets
-            model = Prophet(
+            model = new_prophet(
                 daily_seasonality=False,
                 weekly_seasonality=True,
                 yearly_seasonality=False,
                 interval_width=0.8,
                 changepoint_prior_scale=0.05,
                 mcmc_samples=0,
-                uncertainty_samples=100
+                uncertainty_samples=uncertainty_samples or 100
             )
         
         # Fit model with reduced iterations
-        model.fit(prophet_df, algorithm='Newton')
-        
-        # Generate future dates
-        future = model.make_future_dataframe(periods=days, freq='D')
-        forecast = model.predict(future)
+        with span("prophet.fit"):
+            model.fit(prophet_df, algorithm='Newton')
+        # Predictions only need the parameters; drop the optimizer's output files and state
+        model.stan_fit = model.stan_backend.stan_fit = None
         
-        # Extract forecast for future dates only
-        forecast_future = forecast.tail(days)
-        
-        # Format output
-        results = []
-        for _, row in forecast_future.iterrows():
-            results.append({
-                "ds": row["ds"].date().isoformat(),
-                "yhat": round(max(0, row["yhat"]), 2),
-                "yhat_lower": round(max(0, row["yhat_lower"]), 2),
-                "yhat_upper": round(max(0, row["yhat_upper"]), 2)
-            })
-        
-        # Calculate confidence score based on prediction interval width
-        widths = [r["yhat_upper"] - r["yhat_lower"] for r in results]
-        avg_pred = np.mean([r["yhat"] for r in results]) or 1.0
-        conf = max(0, min(100, 100 - (np.mean(widths) / avg_pred * 50)))
-        
-        return results, round(conf, 2)
+        return FittedForecast(df, model)
         
     except Exception as e:
         # Fallback to moving average if Prophet fails
         print(f"Prophet forecast failed: {e}. Using moving average fallback.")
-        return moving_average_forecast(df, days)
+        return FittedForecast(df)
+
+
+def prophet_forecast(df: pd.DataFrame, days=30, uncertainty_samples: int = None):
+    """Fit and forecast in one step. Returns (columnar forecast, confidence score); see forecast_format."""
+    return fit_forecaster(df, uncertainty_samples).predict(days)
 
 
 def moving_average_forecast(df: pd.DataFrame, days=30):
@@ -112,29 +182,21 @@ def moving_average_forecast(df: pd.DataFrame, days=30):
         # No seasonality for very small datasets
         season = pd.Series(1.0, index=range(7))
 
-    future = []
     last_date = s.index.max()
-    for i in range(1, days + 1):
-        d = last_date + pd.Timedelta(days=i)
-        yhat = float(max(0, base * season.get(d.dayofweek, 1.0)))
-        
-        # Naive CI band based on historical std
-        if len(s) >= 7:
-            band = max(1.0, np.std(s.tail(min(28, len(s)))) * 1.5)
-        else:
-            band = max(1.0, yhat * 0.3)  # 30% band for small datasets
-            
-        future.append({
-            "ds": d.date().isoformat(),
-            "yhat": round(yhat, 2),
-            "yhat_lower": round(max(0, yhat - band), 2),
-            "yhat_upper": round(yhat + band, 2)
-        })
+    dates = last_date + pd.to_timedelta(np.arange(1, days + 1), unit="D")
+    factors = season.reindex(range(7), fill_value=1.0).to_numpy()[dates.dayofweek]
+    yhat = np.maximum(0, base * factors)
+    
+    # Naive CI band based on historical std
+    if len(s) >= 7:
+        band = np.full(days, max(1.0, np.std(s.tail(min(28, len(s)))) * 1.5))
+    else:
+        band = np.maximum(1.0, yhat * 0.3)  # 30% band for small datasets
+    
+    future = _columnar(dates[0], yhat, yhat - band, yhat + band)
     
     # Confidence score: narrower band => higher confidence
-    widths = [f["yhat_upper"] - f["yhat_lower"] for f in future]
-    avg_pred = np.mean([f["yhat"] for f in future]) or 1.0
-    conf = max(0, min(100, 100 - (np.mean(widths) / avg_pred * 100)))
+    conf = _confidence(future, 100)
     
     # Reduce confidence for small datasets
     if len(s) < 14:
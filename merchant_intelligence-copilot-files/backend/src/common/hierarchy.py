@@ -0,0 +1,166 @@
+"""
+Top-down forecasts for long-tail products ("forecast_mode": "hierarchical").
+
+Only the head of the catalog gets its own model: the HIERARCHY_HEAD_PRODUCTS
+best sellers over the last HIERARCHY_SHARE_DAYS days that have at least
+HIERARCHY_MIN_HEAD_DAYS days of history. Every other product belongs to a
+group (its value in an optional "category" column, or one "Other products"
+group; categories beyond HIERARCHY_MAX_GROUPS are merged into that one) and
+each group's total daily demand is forecast once. A tail product's forecast
+is its share of the group's recent sales times the group forecast, for the
+whole tail at once:
+
+    F_products = S @ F_groups    (S: products x groups, each row holds one share)
+
+So a request makes at most head + groups model fits however large the
+catalog is, and products with only a few sales (which per-product mode
+skips below 7 days) still get a forecast. reconcile() rounds the product
+forecasts so that each group's products add up exactly to the group
+forecast on every day. Interval bounds are split by the same shares; they
+are not additive, so only yhat is reconciled. Longer horizons requested
+later (TopDownForecast.predict) are split by share but not reconciled.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .config import HIERARCHY_HEAD_PRODUCTS, HIERARCHY_MAX_GROUPS, HIERARCHY_SHARE_DAYS, HIERARCHY_MIN_HEAD_DAYS
+from .forecast_format import COLUMNS, columns, to_columns
+from .instrumentation import span
+
+MODES = ("per_product", "hierarchical")
+OTHER_GROUP = "Other products"
+TOP_DOWN_CONFIDENCE = 0.8  # a share of a group forecast is less certain than the group forecast
+
+
+def check_mode(mode: str) -> str:
+    if mode not in MODES:
+        raise ValueError(f"forecast_mode must be one of: {', '.join(MODES)}")
+    return mode
+
+
+def _groups(df: pd.DataFrame, products: pd.Index, max_groups: int) -> pd.Series:
+    """Group per product: its most frequent category, the largest max_groups kept, the rest in OTHER_GROUP."""
+    if "category" not in df.columns:
+        return pd.Series(OTHER_GROUP, index=products)
+    category = df["category"].astype(str).str.strip().str.title().where(df["category"].notna())
+    per_product = (pd.DataFrame({"product_name": df["product_name"], "category": category}).dropna()
+                   .groupby("product_name")["category"].agg(lambda c: c.value_counts().index[0]))
+    groups = per_product.reindex(products).fillna(OTHER_GROUP)
+    kept = groups[groups != OTHER_GROUP].value_counts().index[:max(0, max_groups - 1)]
+    return groups.where(groups.isin(kept), OTHER_GROUP)
+
+
+def split_catalog(df: pd.DataFrame, head_products: int = HIERARCHY_HEAD_PRODUCTS,
+                  share_days: int = HIERARCHY_SHARE_DAYS, min_head_days: int = HIERARCHY_MIN_HEAD_DAYS) -> tuple:
+    """
+    (head product names, daily matrix) for a cleaned frame. The matrix is a
+    products x days DataFrame of units sold, zero on days without rows.
+    """
+    daily = df.pivot_table(index="product_name", columns="date", values="quantity_sold", aggfunc="sum", fill_value=0)
+    if daily.shape[1]:
+        daily = daily.reindex(columns=pd.date_range(daily.columns.min(), daily.columns.max(), freq="D"), fill_value=0)
+    history_days = df.groupby("product_name")["date"].nunique().reindex(daily.index)
+    recent = daily.iloc[:, -share_days:].sum(axis=1)
+    eligible = recent[history_days >= min_head_days]
+    head = eligible.sort_values(ascending=False, kind="stable").index[:head_products]
+    return set(head), daily
+
+
+def _shares(y: np.ndarray, membership: np.ndarray, group_of: np.ndarray, share_days: int) -> np.ndarray:
+    """Each product's share of its group's sales over the last share_days (all history, then equal, if that's empty)."""
+    share = np.zeros(len(y))
+    done = np.zeros(membership.shape[1], dtype=bool)
+    for totals in (y[:, -share_days:].sum(axis=1), y.sum(axis=1), np.ones(len(y))):
+        group_total = membership.T @ totals
+        use = ~done & (group_total > 0)
+        rows = use[group_of]
+        share[rows] = totals[rows] / group_total[group_of[rows]]
+        done |= use
+    return share
+
+
+def reconcile(values: np.ndarray, group_of: np.ndarray, targets: np.ndarray, decimals: int = 2) -> np.ndarray:
+    """
+    Round products x days values to `decimals` so every group's products sum
+    exactly to its rounded target on each day (largest-remainder rounding).
+    """
+    unit = 10 ** decimals
+    scaled = np.maximum(values, 0) * unit
+    out = np.floor(scaled)
+    target = np.round(np.maximum(targets, 0) * unit)
+    for g in range(len(targets)):
+        rows = np.flatnonzero(group_of == g)
+        if not len(rows):
+            continue
+        short = (target[g] - out[rows].sum(axis=0)).astype(np.int64)  # units left to hand out, per day
+        remainder = scaled[rows] - out[rows]
+        rank = np.argsort(np.argsort(-remainder, axis=0, kind="stable"), axis=0, kind="stable")
+        out[rows] += rank < short
+    return out / unit
+
+
+class TopDownForecast:
+    """A tail product's model: its share of a fitted group model (see FittedForecast.predict)."""
+
+    def __init__(self, group_model, share: float, group: str):
+        self.group_model = group_model
+        self.share = share
+        self.group = group
+
+    @property
+    def method(self) -> str:
+        return "top_down"
+
+    def predict(self, days: int = 30):
+        forecast, conf = self.group_model.predict(days)
+        fc = to_columns(forecast)
+        bands = (np.round(np.asarray(fc[c], dtype=float) * self.share, 2).tolist() for c in COLUMNS)
+        return columns(fc["start"], *bands), round(conf * TOP_DOWN_CONFIDENCE, 2)
+
+
+def top_down_forecasts(df: pd.DataFrame, fit, days: int = 30, head: set = None, daily: pd.DataFrame = None,
+                       max_groups: int = HIERARCHY_MAX_GROUPS, share_days: int = HIERARCHY_SHARE_DAYS) -> tuple:
+    """
+    ({product: {"forecast", "confidence", "group", "share", "model"}},
+    {group: fitted model}) for every product not in head. fit(frame) is
+    fit_forecaster's signature and is called once per group; "model" is the
+    product's TopDownForecast, for longer horizons later.
+    """
+    if daily is None:
+        head, daily = split_catalog(df)
+    tail = daily[~daily.index.isin(list(head or ()))]
+    if tail.empty:
+        return {}, {}
+
+    groups = _groups(df, tail.index, max_groups)
+    names, group_of = np.unique(groups.to_numpy(), return_inverse=True)
+    y = tail.to_numpy(dtype=float)
+    membership = np.zeros((len(y), len(names)))
+    membership[np.arange(len(y)), group_of] = 1.0
+    aggregate = membership.T @ y
+
+    models, fitted = {}, {}
+    for g, name in enumerate(names):
+        with span("forecast.group", group=name):
+            frame = pd.DataFrame({"date": tail.columns, "quantity_sold": aggregate[g]})
+            models[name] = fit(frame)
+            fitted[name] = models[name].predict(days)
+
+    share = _shares(y, membership, group_of, share_days)
+    split = membership * share[:, None]
+    group_fc = [to_columns(fitted[name][0]) for name in names]
+    bands = {c: split @ np.array([fc[c] for fc in group_fc], dtype=float) for c in COLUMNS}
+    bands["yhat"] = reconcile(bands["yhat"], group_of, np.array([fc["yhat"] for fc in group_fc], dtype=float))
+
+    out = {}
+    for i, product in enumerate(tail.index):
+        g = group_of[i]
+        out[product] = {
+            "forecast": columns(group_fc[g]["start"], *(np.round(bands[c][i], 2).tolist() for c in COLUMNS)),
+            "confidence": round(fitted[names[g]][1] * TOP_DOWN_CONFIDENCE, 2),
+            "group": names[g],
+            "share": round(float(share[i]), 4),
+            "model": TopDownForecast(models[names[g]], float(share[i]), names[g]),
+        }
+    return out, models
@@ -0,0 +1,338 @@
+"""
+Per-merchant sales history kept server-side as memory-mapped columns.
+
+Layout under HISTORY_DIR/<merchant>/:
+
+    manifest.json     generation, product dictionary, base and segment names
+    base-<gen>/       compacted rows, sorted by (product code, day), plus
+                      offsets.npy so product i is rows offsets[i]:offsets[i+1]
+    seg-<gen>-<id>/   append-only batches, one per upload, in arrival order
+
+Every directory holds one .npy file per column: product (int32 code into the
+manifest's product list), day (int32 days since 1970-01-01), quantity_sold,
+price and revenue (float64). Files are opened with np.load(mmap_mode="r"),
+so reading a product's series from the base is a zero-copy slice; rows
+from newer segments are merged in, with later rows replacing earlier ones
+for the same (product, day). Once there are more than HISTORY_MAX_SEGMENTS
+segments, compact() rewrites everything into a new base.
+
+When HISTORY_SYNC is on (the default with STORAGE_BACKEND=s3), every written
+file and the manifest are also put in the blob store under history/<merchant>/,
+and open_history() pulls a newer remote generation into the local cache before
+mapping it. Concurrent writers for the same merchant in different containers
+are not coordinated: the last manifest written wins.
+"""
+
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .config import HISTORY_DIR, HISTORY_MAX_SEGMENTS, HISTORY_SYNC
+from .storage import get_store
+from .request_context import safe_id, is_anonymous
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the thread lock applies
+    fcntl = None
+
+COLUMNS = {"product": np.int32, "day": np.int32, "quantity_sold": np.float64,
+           "price": np.float64, "revenue": np.float64}
+VALUE_COLUMNS = ("quantity_sold", "price", "revenue")
+MANIFEST_VERSION = 1
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _thread_lock(merchant):
+    with _locks_guard:
+        return _locks.setdefault(merchant, threading.Lock())
+
+
+class _MerchantLock:
+    """Thread + file lock around writes to one merchant's directory."""
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = _thread_lock(root)
+
+    def __enter__(self):
+        self.lock.acquire()
+        os.makedirs(self.root, exist_ok=True)
+        self.file = open(os.path.join(self.root, ".lock"), "w")
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        self.lock.release()
+
+
+def _empty_manifest():
+    return {"version": MANIFEST_VERSION, "generation": 0, "products": [], "base": None, "segments": [], "rows": 0}
+
+
+def _days(dates) -> np.ndarray:
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64).astype(np.int32)
+
+
+class History:
+    """Read-only view of one merchant's history at the generation it was opened at."""
+
+    def __init__(self, merchant: str, root: str, manifest: dict):
+        self.merchant = merchant
+        self.root = root
+        self.manifest = manifest
+        self.products = manifest["products"]
+        self._codes = {name: i for i, name in enumerate(self.products)}
+        self.base = self._map(manifest["base"]) if manifest["base"] else None
+        self.offsets = np.load(os.path.join(root, manifest["base"], "offsets.npy")) if manifest["base"] else None
+        self.segments = [self._map(name) for name in manifest["segments"]]
+
+    def _map(self, name):
+        return {c: np.load(os.path.join(self.root, name, f"{c}.npy"), mmap_mode="r") for c in COLUMNS}
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def series(self, product: str) -> dict:
+        """{column: array} of one product's rows ordered by day; zero-copy when no newer segment has the product."""
+        code = self._codes.get(product)
+        if code is None:
+            return {c: np.empty(0, dtype=t) for c, t in COLUMNS.items() if c != "product"}
+        base = None
+        if self.base is not None and code + 1 < len(self.offsets):
+            lo, hi = self.offsets[code], self.offsets[code + 1]
+            base = {c: self.base[c][lo:hi] for c in COLUMNS}
+        newer = []
+        for seg in self.segments:
+            rows = np.flatnonzero(seg["product"] == code)
+            if len(rows):
+                newer.append({c: seg[c][rows] for c in COLUMNS})
+        if base is not None and not newer:
+            merged = base  # views into the mapped base files
+        else:
+            merged = _latest_per_day(_concat(([base] if base is not None else []) + newer))
+        return {c: merged[c] for c in COLUMNS if c != "product"}
+
+    def columns(self, since_day: int = None) -> dict:
+        """All rows as {column: array}, one row per (product, day), sorted by product then day."""
+        parts = ([self.base] if self.base is not None else []) + self.segments
+        cols = _concat(parts) if len(parts) != 1 else dict(parts[0])
+        if self.segments:
+            cols = _latest_per_day(cols)
+        if since_day is not None:
+            keep = cols["day"] >= since_day
+            cols = {c: v[keep] for c, v in cols.items()}
+        return cols
+
+    def frame(self, days: int = None) -> pd.DataFrame:
+        """History as the cleaned frame generate_insights works on; days keeps only the trailing window."""
+        since = None
+        if days and len(self):
+            since = int(self.last_day()) - int(days) + 1
+        cols = self.columns(since)
+        return pd.DataFrame({
+            "date": pd.to_datetime(cols["day"].astype("datetime64[D]")),
+            "product_name": pd.Categorical.from_codes(cols["product"], categories=self.products).astype(str),
+            **{c: np.asarray(cols[c]) for c in VALUE_COLUMNS}
+        })
+
+    def last_day(self):
+        parts = ([self.base] if self.base is not None else []) + self.segments
+        return max((int(p["day"].max()) for p in parts if len(p["day"])), default=None)
+
+
+def _concat(parts: list) -> dict:
+    if not parts:
+        return {c: np.empty(0, dtype=t) for c, t in COLUMNS.items()}
+    return {c: np.concatenate([p[c] for p in parts]) for c in COLUMNS}
+
+
+def _latest_per_day(cols: dict) -> dict:
+    """Keep the last row for each (product, day) and sort by product then day."""
+    key = cols["product"].astype(np.int64) << 32 | (cols["day"].astype(np.int64) & 0xFFFFFFFF)
+    keep = ~pd.Series(key).duplicated(keep="last").to_numpy()
+    order = np.argsort(key[keep], kind="stable")
+    return {c: np.asarray(v)[keep][order] for c, v in cols.items()}
+
+
+# ---- writing ------------------------------------------------------------------
+
+def _merchant_root(merchant: str) -> str:
+    root = os.path.realpath(os.path.join(HISTORY_DIR, safe_id(merchant)))
+    if os.path.dirname(root) != os.path.realpath(HISTORY_DIR):
+        raise ValueError(f"Invalid merchant ID for sales history: {merchant!r}")
+    return root
+
+
+def _read_manifest(root):
+    try:
+        with open(os.path.join(root, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest_local(root, manifest):
+    tmp = os.path.join(root, f"manifest.json.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(root, "manifest.json"))
+
+
+def _write_manifest(merchant, root, manifest):
+    _write_manifest_local(root, manifest)
+    if HISTORY_SYNC:
+        get_store().put_json(f"history/{safe_id(merchant)}/manifest.json", manifest)
+
+
+def _write_part(merchant, root, name, cols: dict, offsets=None):
+    path = os.path.join(root, name)
+    tmp = path + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+    arrays = {c: np.ascontiguousarray(cols[c], dtype=t) for c, t in COLUMNS.items()}
+    if offsets is not None:
+        arrays["offsets"] = offsets
+    for c, array in arrays.items():
+        np.save(os.path.join(tmp, f"{c}.npy"), array)
+    os.replace(tmp, path)
+    if HISTORY_SYNC:
+        store = get_store()
+        for c in arrays:
+            with open(os.path.join(path, f"{c}.npy"), "rb") as f:
+                store.put_bytes(f"history/{safe_id(merchant)}/{name}/{c}.npy", f.read())
+
+
+def append(merchant: str, df: pd.DataFrame) -> dict:
+    """
+    Add cleaned rows (date, product_name, quantity_sold, price, revenue) as a
+    new segment. Rows are first summed per (product, day): quantity and
+    revenue add up, price is the mean. Returns the new manifest.
+    """
+    if is_anonymous(merchant):
+        raise ValueError("Sales history is only kept for an explicit merchant ID")
+    root = _merchant_root(merchant)
+    with _MerchantLock(root):
+        manifest = _sync(merchant, root) or _read_manifest(root) or _empty_manifest()
+        daily = df.assign(day=_days(df["date"])).groupby(["product_name", "day"], sort=False).agg(
+            quantity_sold=("quantity_sold", "sum"), price=("price", "mean"), revenue=("revenue", "sum")).reset_index()
+        if daily.empty:
+            return manifest
+
+        codes = {name: i for i, name in enumerate(manifest["products"])}
+        for name in daily["product_name"].unique():
+            if name not in codes:
+                codes[name] = len(manifest["products"])
+                manifest["products"].append(name)
+        cols = {"product": daily["product_name"].map(codes).to_numpy(), "day": daily["day"].to_numpy(),
+                **{c: daily[c].to_numpy() for c in VALUE_COLUMNS}}
+
+        manifest["generation"] += 1
+        name = f"seg-{manifest['generation']:06d}-{uuid.uuid4().hex[:8]}"
+        _write_part(merchant, root, name, cols)
+        manifest["segments"].append(name)
+        manifest["rows"] += len(daily)
+        if len(manifest["segments"]) > HISTORY_MAX_SEGMENTS:
+            manifest = _compact(merchant, root, manifest)
+        else:
+            _write_manifest(merchant, root, manifest)
+        return manifest
+
+
+def compact(merchant: str) -> dict:
+    """Merge the base and all segments into a new base; returns the new manifest."""
+    root = _merchant_root(merchant)
+    with _MerchantLock(root):
+        manifest = _sync(merchant, root) or _read_manifest(root)
+        if not manifest or not manifest["segments"]:
+            return manifest
+        return _compact(merchant, root, manifest)
+
+
+def _compact(merchant, root, manifest):
+    history = History(merchant, root, manifest)
+    cols = history.columns()
+    offsets = np.searchsorted(cols["product"], np.arange(len(manifest["products"]) + 1)).astype(np.int64)
+    old = [manifest["base"]] + manifest["segments"] if manifest["base"] else list(manifest["segments"])
+
+    manifest = dict(manifest, generation=manifest["generation"] + 1, segments=[], rows=len(cols["day"]))
+    manifest["base"] = f"base-{manifest['generation']:06d}"
+    _write_part(merchant, root, manifest["base"], cols, offsets)
+    _write_manifest(merchant, root, manifest)
+    del history  # release the maps before removing their files
+    for name in old:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        if HISTORY_SYNC:
+            store = get_store()
+            for c in list(COLUMNS) + ["offsets"]:
+                store.delete(f"history/{safe_id(merchant)}/{name}/{c}.npy")
+    return manifest
+
+
+# ---- reading ------------------------------------------------------------------
+
+def _sync(merchant, root):
+    """Pull a newer remote generation into the local cache; returns its manifest, or None if nothing newer."""
+    if not HISTORY_SYNC:
+        return None
+    store = get_store()
+    remote = store.get_json(f"history/{safe_id(merchant)}/manifest.json")
+    local = _read_manifest(root)
+    if not remote or (local and local["generation"] >= remote["generation"]):
+        return None
+    os.makedirs(root, exist_ok=True)
+    for name in ([remote["base"]] if remote["base"] else []) + remote["segments"]:
+        if os.path.isdir(os.path.join(root, name)):
+            continue  # parts are immutable once written
+        tmp = os.path.join(root, name + ".tmp")
+        os.makedirs(tmp, exist_ok=True)
+        for c in list(COLUMNS) + (["offsets"] if name.startswith("base-") else []):
+            data = store.get_bytes(f"history/{safe_id(merchant)}/{name}/{c}.npy")
+            if data is None:
+                raise FileNotFoundError(f"history/{merchant}/{name}/{c}.npy missing from storage")
+            with open(os.path.join(tmp, f"{c}.npy"), "wb") as f:
+                f.write(data)
+        os.replace(tmp, os.path.join(root, name))
+    _write_manifest_local(root, remote)
+    return remote
+
+
+def open_history(merchant: str):
+    """History for a merchant, or None when nothing has been stored (always for anonymous requests)."""
+    if is_anonymous(merchant):
+        return None
+    root = _merchant_root(merchant)
+    if HISTORY_SYNC:
+        with _MerchantLock(root):
+            _sync(merchant, root)
+    # A compaction can remove parts between reading the manifest and mapping them: retry once
+    for attempt in range(2):
+        manifest = _read_manifest(root)
+        if not manifest or not manifest["rows"]:
+            return None
+        try:
+            return History(merchant, root, manifest)
+        except FileNotFoundError:
+            if attempt:
+                raise
+
+
+def merchants() -> list:
+    """Merchants with stored history: local directories, plus the blob store's when HISTORY_SYNC is on."""
+    found = set()
+    if os.path.isdir(HISTORY_DIR):
+        found.update(name for name in os.listdir(HISTORY_DIR)
+                     if os.path.isfile(os.path.join(HISTORY_DIR, name, "manifest.json")))
+    if HISTORY_SYNC:
+        found.update(key.split("/")[1] for key in get_store().list("history/") if key.endswith("/manifest.json"))
+    return sorted(m for m in found if not is_anonymous(m))
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from scipy import stats
+from .forecast_format import yhat_values
 
 def detect_anomalies(product_df: pd.DataFrame):
     """
@@ -69,7 +70,7 @@ def reorder_recommendation(forecast7, safety=0.2, current_stock=None):
     Calculate reorder quantity based on forecast and safety stock.
     Includes urgency level based on stockout risk.
     """
-    demand = sum([d["yhat"] for d in forecast7])
+    demand = sum(yhat_values(forecast7))
     qty = demand * (1 + safety)
     
     # Determine urgency based on quantity and current stock
@@ -133,7 +134,8 @@ def generate_demand_reasoning(product_df: pd.DataFrame, forecast, anomalies):
     Generate plain-language explanation for demand patterns.
     This can be enhanced with LLM but provides rule-based baseline.
     """
-    s = product_df.sort_values("date")["quantity_sold"]
+    ordered = product_df.sort_values("date")
+    s = ordered["quantity_sold"]
     
     # Trend analysis
     recent_avg = s.tail(7).mean()
@@ -142,7 +144,7 @@ def generate_demand_reasoning(product_df: pd.DataFrame, forecast, anomalies):
     
     # Seasonality detection
     if len(s) >= 28:
-        dow_pattern = s.groupby(s.index.dayofweek).mean()
+        dow_pattern = s.groupby(ordered["date"].dt.dayofweek).mean()
         has_weekly_pattern = dow_pattern.std() / dow_pattern.mean() > 0.3 if dow_pattern.mean() > 0 else False
     else:
         has_weekly_pattern = False
@@ -156,7 +158,7 @@ def generate_demand_reasoning(product_df: pd.DataFrame, forecast, anomalies):
         reasoning += f"{len(anomalies)} anomalies detected: {', '.join([a['type'] for a in anomalies])}. "
     
     # Forecast summary
-    forecast_avg = np.mean([f["yhat"] for f in forecast])
+    forecast_avg = np.mean(yhat_values(forecast))
     if forecast_avg > recent_avg * 1.1:
         reasoning += "Forecast predicts demand increase."
     elif forecast_avg < recent_avg * 0.9:
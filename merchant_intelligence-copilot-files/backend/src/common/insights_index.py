@@ -0,0 +1,154 @@
+"""
+Precomputed lookups over an insights payload.
+
+generate_insights emits the index alongside the products (insights["index"]),
+so chat and weekly_report can read urgency buckets, anomaly/low-confidence
+lists, price actions and the top products by forecast demand directly instead
+of rescanning and re-sorting the product list on every request. Positions in
+the index refer to the order of insights["products"].
+"""
+
+from .forecast_format import yhat_values
+
+INDEX_VERSION = 1
+LOW_CONFIDENCE_THRESHOLD = 60
+TOP_N = 10
+
+
+def forecast_total(product: dict) -> float:
+    """Units expected over the product's short-term (7-day) forecast."""
+    return sum(yhat_values(product.get("forecast")))
+
+
+def build_insights_index(products: list, top_n: int = TOP_N) -> dict:
+    """Single pass over the products producing a JSON-serializable index."""
+    urgency = {"high": [], "medium": [], "low": []}
+    price_actions = {"increase": [], "discount": []}
+    anomalies, low_confidence, totals = [], [], []
+    confidence_sum = reorder_units = 0.0
+
+    for i, p in enumerate(products):
+        level = (p.get("reorder") or {}).get("urgency")
+        if level in urgency:
+            urgency[level].append(i)
+        if p.get("anomalies"):
+            anomalies.append(i)
+        if p.get("confidence_score", 100) < LOW_CONFIDENCE_THRESHOLD:
+            low_confidence.append(i)
+        action = (p.get("price_hint") or {}).get("action")
+        if action in price_actions:
+            price_actions[action].append(i)
+
+        totals.append(round(forecast_total(p), 2))
+        confidence_sum += p.get("confidence_score", 0)
+        reorder_units += (p.get("reorder") or {}).get("quantity", 0)
+
+    top = sorted(range(len(products)), key=lambda i: totals[i], reverse=True)[:top_n]
+
+    return {
+        "version": INDEX_VERSION,
+        "product_count": len(products),
+        "urgency": urgency,
+        "anomalies": anomalies,
+        "low_confidence": low_confidence,
+        "price_actions": price_actions,
+        "top_by_forecast": top,
+        "forecast_totals": totals,
+        "totals": {
+            "forecast_units": round(sum(totals), 2),
+            "avg_confidence": round(confidence_sum / len(products), 2) if products else 0,
+            "reorder_units": round(reorder_units, 2)
+        }
+    }
+
+
+class InsightsIndex:
+    """Read-side view that resolves index positions back to product dicts."""
+
+    def __init__(self, products: list, index: dict):
+        self.products = products
+        self.index = index
+
+    def _pick(self, positions):
+        return [self.products[i] for i in positions]
+
+    @property
+    def high_urgency(self):
+        return self._pick(self.index["urgency"]["high"])
+
+    @property
+    def medium_urgency(self):
+        return self._pick(self.index["urgency"]["medium"])
+
+    @property
+    def anomalies(self):
+        return self._pick(self.index["anomalies"])
+
+    @property
+    def low_confidence(self):
+        return self._pick(self.index["low_confidence"])
+
+    @property
+    def price_opportunities(self):
+        actions = self.index["price_actions"]
+        return self._pick(sorted(actions["increase"] + actions["discount"]))
+
+    @property
+    def totals(self):
+        return self.index["totals"]
+
+    def top_by_forecast(self, n: int = 5):
+        """[(product, 7-day forecast units)] in descending order of demand."""
+        positions = self.index["top_by_forecast"]
+        if n > len(positions) and len(positions) < len(self.products):
+            positions = sorted(range(len(self.products)), key=lambda i: self.index["forecast_totals"][i], reverse=True)
+        return [(self.products[i], self.index["forecast_totals"][i]) for i in positions[:n]]
+
+
+def extract_products(insights: dict) -> tuple:
+    """
+    (products, emitted_index) from either the full generate_insights response
+    ({"insights": {"products": ...}}) or the inner results ({"products": ...}).
+    """
+    if not insights:
+        return [], None
+    if isinstance(insights.get("insights"), dict):
+        insights = insights["insights"]
+    return insights.get("products") or [], insights.get("index")
+
+
+def _usable(index, count: int) -> bool:
+    """True if index is this version's, for count products, with every position in range."""
+    if not (isinstance(index, dict) and index.get("version") == INDEX_VERSION and index.get("product_count") == count):
+        return False
+    try:
+        positions = [*index["urgency"]["high"], *index["urgency"]["medium"], *index["anomalies"],
+                     *index["low_confidence"], *index["price_actions"]["increase"],
+                     *index["price_actions"]["discount"], *index["top_by_forecast"]]
+        return (len(index["forecast_totals"]) == count and isinstance(index["totals"], dict)
+                and all(isinstance(i, int) and 0 <= i < count for i in positions))
+    except (KeyError, TypeError):
+        return False
+
+
+def get_index(insights: dict) -> InsightsIndex:
+    """Use the index emitted by generate_insights when it is usable, otherwise build one."""
+    products, index = extract_products(insights)
+    if not _usable(index, len(products)):
+        index = build_insights_index(products)
+    return InsightsIndex(products, index)
+
+
+def reindexed(insights: dict) -> dict:
+    """
+    A client-supplied payload with its index rebuilt from its products
+    (shallow copy). Only indexes generate_insights built itself are trusted;
+    a stale or edited one would point chat and reports at the wrong products.
+    """
+    if not insights:
+        return insights
+    if isinstance(insights.get("insights"), dict):
+        return {**insights, "insights": reindexed(insights["insights"])}
+    if "index" not in insights:
+        return insights
+    return {**insights, "index": build_insights_index(insights.get("products") or [])}
@@ -0,0 +1,67 @@
+"""
+Stored insights results, keyed by merchant and a digest of their products.
+
+The digest identifies "the same analysis" regardless of which envelope the
+client sends (full generate_insights response or just its insights part), so
+anything derived from a result (weekly reports, chat sessions) can be cached
+under it and recomputed only when the content actually changes.
+"""
+
+import time
+
+from .storage import get_store, content_digest
+from .insights_index import extract_products, reindexed
+from .insights_view import is_view
+from .request_context import safe_id
+
+
+def insights_digest(insights: dict) -> str:
+    products, _ = extract_products(insights)
+    return content_digest(products)
+
+
+def _key(merchant_id, digest):
+    return f"insights/{merchant_id}/{digest}.json"
+
+
+def save_insights(merchant_id: str, insights: dict, digest: str = None) -> str:
+    """Store a result once per distinct content and mark it as the merchant's latest. Returns the digest."""
+    digest = digest or insights_digest(insights)
+    store = get_store()
+    if not store.exists(_key(merchant_id, digest)):
+        store.put_json(_key(merchant_id, digest), insights)
+    store.put_json(f"insights/{merchant_id}/latest.json", {"digest": digest, "updated_at": time.time()})
+    return digest
+
+
+def latest_digest(merchant_id: str):
+    """Digest of the merchant's most recently stored result, or None."""
+    latest = get_store().get_json(f"insights/{merchant_id}/latest.json")
+    return latest["digest"] if latest else None
+
+
+def load_insights(merchant_id: str, digest: str = None):
+    """Stored result by digest, or the merchant's latest when digest is None."""
+    if digest is None:
+        digest = latest_digest(merchant_id)
+        if digest is None:
+            return None
+    return get_store().get_json(_key(merchant_id, digest))
+
+
+def insights_key(merchant_id: str, digest: str) -> str:
+    return _key(merchant_id, digest)
+
+
+def resolve_insights(merchant_id: str, insights: dict):
+    """
+    The complete result for a client payload. A projected or paged response
+    (see insights_view) only carries part of the products, so the stored
+    result it came from is used instead when it can be found. Otherwise the
+    payload's own index is rebuilt, so only server-built indexes are stored.
+    """
+    if is_view(insights) and insights.get("report_digest"):
+        stored = load_insights(merchant_id, safe_id(insights["report_digest"], default=""))
+        if stored:
+            return stored
+    return reindexed(insights)
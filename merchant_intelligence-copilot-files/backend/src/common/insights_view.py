@@ -0,0 +1,173 @@
+"""
+Field projection and cursor pagination over an insights result.
+
+A client can ask generate_insights (or GET /insights/products) for only some
+product fields ("fields" / "exclude_fields") and for one page of products in
+a chosen order. Later pages are served from the stored result, so response
+size stays bounded by the page size rather than the catalog size.
+
+Cursors are opaque (base64 JSON of digest, sort, order, offset, page size
+and projection), so following next_cursor alone returns the next page in the
+same shape; page_size / fields / exclude_fields sent with a cursor override
+its values. Stored results are immutable per digest, so an offset into a
+sorted copy is stable for as long as the result is kept.
+"""
+
+import base64
+import json
+
+from .config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from .insights_index import forecast_total
+
+URGENCY_RANK = {"high": 3, "medium": 2, "low": 1}
+
+
+def _urgency_key(p):
+    reorder = p.get("reorder") or {}
+    return (URGENCY_RANK.get(reorder.get("urgency"), 0), reorder.get("quantity", 0))
+
+
+# sort name -> (key, descending by default)
+SORT_KEYS = {
+    "name": (lambda p: p.get("product_name", ""), False),
+    "urgency": (_urgency_key, True),
+    "revenue": (lambda p: p.get("revenue_total", 0), True),
+    "forecast": (forecast_total, True),
+    "confidence": (lambda p: p.get("confidence_score", 0), False),
+}
+
+
+class ViewError(ValueError):
+    """Invalid projection, sort or cursor; reported to the client as a 400."""
+
+
+def parse_fields(value) -> list:
+    """Field list from a JSON list or a comma-separated string; None when not given."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        raise ViewError("fields must be a list or a comma-separated string")
+    return [str(f).strip() for f in value if str(f).strip()]
+
+
+def project(product: dict, fields: list = None, exclude: list = None) -> dict:
+    """Copy of product with only the requested fields (product_name is always kept)."""
+    if fields:
+        keep = set(fields) | {"product_name"}
+        product = {k: v for k, v in product.items() if k in keep}
+    if exclude:
+        drop = set(exclude) - {"product_name"}
+        product = {k: v for k, v in product.items() if k not in drop}
+    return product
+
+
+def sorted_positions(products: list, sort: str = "name", order: str = None) -> list:
+    """Positions of products in the requested order; ties keep the stored (name) order."""
+    if sort not in SORT_KEYS:
+        raise ViewError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+    key, descending = SORT_KEYS[sort]
+    if order is not None:
+        if order not in ("asc", "desc"):
+            raise ViewError("order must be 'asc' or 'desc'")
+        descending = order == "desc"
+    return sorted(range(len(products)), key=lambda i: key(products[i]), reverse=descending)
+
+
+def encode_cursor(digest: str, sort: str, order: str, offset: int, limit: int = None,
+                  fields: list = None, exclude: list = None) -> str:
+    data = {"d": digest, "s": sort, "o": order, "n": offset}
+    for key, value in (("l", limit), ("f", fields), ("x", exclude)):
+        if value:
+            data[key] = value
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return {"digest": str(data["d"]), "sort": data["s"], "order": data["o"], "offset": int(data["n"]),
+                "limit": page_size(data.get("l")), "fields": parse_fields(data.get("f")),
+                "exclude": parse_fields(data.get("x"))}
+    except Exception:
+        raise ViewError("Invalid cursor")
+
+
+def page_size(value) -> int:
+    if value in (None, ""):
+        return PAGE_SIZE_DEFAULT
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise ViewError("page_size must be an integer")
+    if size < 1:
+        raise ViewError("page_size must be at least 1")
+    return min(size, PAGE_SIZE_MAX)
+
+
+def page(products: list, digest: str, sort: str = "name", order: str = None, offset: int = 0,
+         limit: int = PAGE_SIZE_DEFAULT, fields: list = None, exclude: list = None, positions: list = None) -> tuple:
+    """
+    (projected products for one page, page metadata). positions may be passed
+    in when the caller caches sorted orders for a stored result.
+    """
+    if positions is None:
+        positions = sorted_positions(products, sort, order)
+    order = order or ("desc" if SORT_KEYS[sort][1] else "asc")
+    offset = max(0, offset)
+    limit = limit or len(products)
+    window = positions[offset:offset + limit]
+    end = offset + len(window)
+    meta = {
+        "total": len(products),
+        "offset": offset,
+        "page_size": limit,
+        "sort": sort,
+        "order": order,
+        "next_cursor": encode_cursor(digest, sort, order, end, limit, fields, exclude)
+                       if digest and end < len(products) else None,
+    }
+    if fields:
+        meta["fields"] = sorted(set(fields) | {"product_name"})
+    if exclude:
+        meta["exclude_fields"] = sorted(exclude)
+    return [project(products[i], fields, exclude) for i in window], meta
+
+
+def view_options(options: dict, paged: bool = False) -> dict:
+    """
+    Validated projection/paging options from a request body or query string,
+    or None when the client asked for the full, unprojected product list.
+    paged=True always pages (PAGE_SIZE_DEFAULT products unless page_size says otherwise).
+    """
+    fields = parse_fields(options.get("fields"))
+    exclude = parse_fields(options.get("exclude_fields"))
+    cursor = options.get("cursor")
+    paged = paged or bool(cursor) or any(options.get(k) not in (None, "") for k in ("page_size", "limit", "sort", "order"))
+    if not (fields or exclude or paged):
+        return None
+    view = {"fields": fields, "exclude": exclude, "offset": 0, "digest": None,
+            "sort": options.get("sort") or "name", "order": options.get("order") or None,
+            "limit": page_size(options.get("page_size", options.get("limit")))}
+    if not paged:
+        view["limit"] = None  # projection only: every product
+    if cursor:
+        state = decode_cursor(cursor)
+        # Page size and projection carry over from the cursor unless given again
+        given = {"limit": options.get("page_size", options.get("limit")) not in (None, ""),
+                 "fields": fields is not None, "exclude": exclude is not None}
+        view.update({k: v for k, v in state.items() if not given.get(k)})
+    if view["sort"] not in SORT_KEYS:
+        raise ViewError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+    return view
+
+
+def is_view(insights: dict) -> bool:
+    """True for a projected/paged response, which is not the complete result."""
+    if not insights:
+        return False
+    inner = insights.get("insights") if isinstance(insights.get("insights"), dict) else insights
+    return "page" in inner
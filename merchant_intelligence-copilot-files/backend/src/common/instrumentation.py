@@ -0,0 +1,223 @@
+"""
+Lightweight per-stage timing for the Lambda handlers.
+
+    with span("forecast", product=name):
+        ...
+
+records wall time, CPU time and peak memory for the block into the current
+invocation's recorder. When no recorder is active (instrumentation disabled
+and no debug request) span() returns a shared no-op object, so leaving spans
+in hot loops costs one context-variable lookup.
+
+At the end of an invocation the @instrumented decorator:
+- prints one CloudWatch Embedded Metric Format (EMF) line with per-stage totals
+- adds a "timings" block to the JSON response when the request asked for it
+  ("debug": true in the body or an X-Debug: 1 header) and TIMINGS_DEBUG_ENABLED
+"""
+
+import contextvars
+import functools
+import json
+import threading
+import time
+import tracemalloc
+
+from .config import INSTRUMENTATION_ENABLED, INSTRUMENT_MEMORY, TIMINGS_DEBUG_ENABLED, METRICS_NAMESPACE
+from .request_context import header
+from .serialization import dumps
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_recorder = contextvars.ContextVar("recorder", default=None)
+
+# Per-product spans beyond this many are aggregated but not listed individually
+MAX_DETAILED_SPANS = 200
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Recorder:
+    """Collects finished spans for one invocation (shared by its worker threads)."""
+
+    def __init__(self, track_memory: bool):
+        self.track_memory = track_memory
+        self.spans = []
+        self._lock = threading.Lock()
+        self._stacks = {}  # thread id -> open spans, for nesting and memory attribution
+        self.start = time.perf_counter()
+
+    def stack(self):
+        return self._stacks.setdefault(threading.get_ident(), [])
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def summary(self) -> dict:
+        """Per-stage totals plus the slowest individual spans."""
+        stages = {}
+        for s in self.spans:
+            agg = stages.setdefault(s["name"], {"count": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "peak_kb": 0.0})
+            agg["count"] += 1
+            agg["wall_ms"] += s["wall_ms"]
+            agg["cpu_ms"] += s["cpu_ms"]
+            agg["peak_kb"] = max(agg["peak_kb"], s.get("peak_kb") or 0.0)
+        for agg in stages.values():
+            agg["wall_ms"] = round(agg["wall_ms"], 2)
+            agg["cpu_ms"] = round(agg["cpu_ms"], 2)
+            agg["peak_kb"] = round(agg["peak_kb"], 1)
+        slowest = sorted(self.spans, key=lambda s: s["wall_ms"], reverse=True)[:MAX_DETAILED_SPANS]
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "max_rss_kb": max_rss_kb(),
+            "stages": stages,
+            "spans": slowest
+        }
+
+
+class Span:
+    __slots__ = ("recorder", "name", "dims", "wall", "cpu", "peak")
+
+    def __init__(self, recorder, name, dims):
+        self.recorder = recorder
+        self.name = name
+        self.dims = dims
+
+    def __enter__(self):
+        if self.recorder.track_memory:
+            # Fold the peak so far into the enclosing span before resetting it for this one
+            stack = self.recorder.stack()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.peak = 0
+        self.recorder.stack().append(self)
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall_ms = (time.perf_counter() - self.wall) * 1000
+        cpu_ms = (time.thread_time() - self.cpu) * 1000
+        stack = self.recorder.stack()
+        stack.pop()
+        record = {"name": self.name, "wall_ms": round(wall_ms, 3), "cpu_ms": round(cpu_ms, 3)}
+        if self.recorder.track_memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+            record["peak_kb"] = round(self.peak / 1024, 1)
+        if self.dims:
+            record.update(self.dims)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self.recorder.add(record)
+        return False
+
+
+def span(name: str, **dims):
+    """Time a block as stage `name`; a no-op unless this invocation is being recorded."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return _NOOP
+    return Span(recorder, name, dims)
+
+
+def recording() -> bool:
+    return _recorder.get() is not None
+
+
+def max_rss_kb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux (Lambda)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def emf_record(handler_name: str, summary: dict) -> dict:
+    """CloudWatch Embedded Metric Format document for one invocation."""
+    doc = {"Handler": handler_name, "total_ms": summary["total_ms"]}
+    metrics = [{"Name": "total_ms", "Unit": "Milliseconds"}]
+    if summary.get("max_rss_kb") is not None:
+        doc["max_rss_kb"] = summary["max_rss_kb"]
+        metrics.append({"Name": "max_rss_kb", "Unit": "Kilobytes"})
+    for stage, agg in summary["stages"].items():
+        for field, unit in (("wall_ms", "Milliseconds"), ("cpu_ms", "Milliseconds"), ("count", "Count")):
+            doc[f"{stage}.{field}"] = agg[field]
+            metrics.append({"Name": f"{stage}.{field}", "Unit": unit})
+        if agg["peak_kb"]:
+            doc[f"{stage}.peak_kb"] = agg["peak_kb"]
+            metrics.append({"Name": f"{stage}.peak_kb", "Unit": "Kilobytes"})
+    doc["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{
+            "Namespace": METRICS_NAMESPACE,
+            "Dimensions": [["Handler"]],
+            "Metrics": metrics
+        }]
+    }
+    return doc
+
+
+def _debug_requested(event) -> bool:
+    if not TIMINGS_DEBUG_ENABLED:
+        return False
+    if str(header(event, "X-Debug", "")).lower() in ("1", "true"):
+        return True
+    body = event.get("body")
+    # Cheap substring check first so ordinary requests never pay for a second JSON parse
+    if isinstance(body, str) and '"debug"' in body:
+        try:
+            return json.loads(body).get("debug") is True
+        except (ValueError, AttributeError):
+            return False
+    return False
+
+
+def instrumented(handler_name: str):
+    """Decorator for Lambda handlers; see module docstring."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            debug = _debug_requested(event)
+            if not (INSTRUMENTATION_ENABLED or debug):
+                return handler(event, context)
+
+            started_tracing = False
+            if INSTRUMENT_MEMORY and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            recorder = Recorder(track_memory=tracemalloc.is_tracing())
+            token = _recorder.set(recorder)
+            try:
+                with span("handler"):
+                    response = handler(event, context)
+            finally:
+                _recorder.reset(token)
+                if started_tracing:
+                    tracemalloc.stop()
+
+            summary = recorder.summary()
+            print(json.dumps(emf_record(handler_name, summary)))
+            if debug and isinstance(response, dict) and response.get("body"):
+                try:
+                    body = json.loads(response["body"])
+                    body["timings"] = summary
+                    response["body"] = dumps(body)
+                except (ValueError, TypeError):
+                    pass
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,230 @@
+"""
+Stock-aware reorder recommendations from Monte Carlo demand simulation.
+
+Daily demand is drawn from each product's forecast interval (normal, with
+the standard deviation implied by yhat_lower/yhat_upper, clipped at zero)
+for INVENTORY_PATHS paths x products x horizon in one array operation per
+chunk of products. All products share one matrix of standard-normal draws
+(common random numbers): each product's own demand distribution is exact,
+draws cost paths x horizon instead of paths x products x horizon, and a
+product's result doesn't depend on which other products are in the request.
+From the simulated cumulative demand:
+
+- stockout_probability: chance the current stock runs out before an order
+  placed today arrives (within the lead time)
+- days_of_cover: days the current stock lasts at forecast demand (from the
+  forecast itself, up to its full horizon; no sampling needed)
+- quantity: order-up-to quantile of demand over lead time + review period at
+  the target service level, minus current stock
+
+The same paths answer what-if sweeps (other service levels or safety
+factors) without refitting any forecast; see handlers/inventory_whatif.py.
+"""
+
+import math
+
+import numpy as np
+
+from .config import (
+    INVENTORY_PATHS, INVENTORY_SERVICE_LEVEL, INVENTORY_LEAD_TIME_DAYS,
+    INVENTORY_REVIEW_DAYS, INVENTORY_SEED, INVENTORY_CHUNK_MB
+)
+from .forecast_format import to_columns
+
+INTERVAL_Z = 1.2816  # forecasts carry 80% intervals (Prophet interval_width=0.8)
+MAX_DAYS = 365  # lead time / review period; the simulation allocates paths x (lead + review) days
+
+
+class InventoryError(ValueError):
+    """Invalid stock / lead time input; reported to the client as a 400."""
+
+
+def _number(value, name, product):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise InventoryError(f"{name} for '{product}' must be a number")
+    if not math.isfinite(value) or value < 0:
+        raise InventoryError(f"{name} for '{product}' must be zero or more")
+    return value
+
+
+def check_days(value, name: str) -> int:
+    """A lead time or review period in whole days, 0..MAX_DAYS."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise InventoryError(f"{name} must be a number of days")
+    if not math.isfinite(value) or not 0 <= value <= MAX_DAYS:
+        raise InventoryError(f"{name} must be between 0 and {MAX_DAYS} days")
+    return int(value)
+
+
+def parse_inventory(inventory) -> dict:
+    """
+    {product_name: {"current_stock": float, "lead_time_days": int}} from the
+    request's "inventory": either that mapping (a bare number is the stock) or
+    a list of {"product_name", "current_stock", "lead_time_days"}. Names are
+    normalized like the CSV (stripped, title case).
+    """
+    if not inventory:
+        return {}
+    if isinstance(inventory, list):
+        try:
+            inventory = {item["product_name"]: item for item in inventory}
+        except (TypeError, KeyError):
+            raise InventoryError("inventory items need a product_name")
+    if not isinstance(inventory, dict):
+        raise InventoryError("inventory must be an object or a list")
+    out = {}
+    for name, item in inventory.items():
+        item = item if isinstance(item, dict) else {"current_stock": item}
+        entry = {"current_stock": _number(item.get("current_stock"), "current_stock", name)}
+        if item.get("lead_time_days") is not None:
+            entry["lead_time_days"] = check_days(item["lead_time_days"], f"lead_time_days for '{name}'")
+        out[str(name).strip().title()] = entry
+    return out
+
+
+def inventory_from_frame(df) -> dict:
+    """Latest current_stock / lead_time_days per product when the CSV has those columns."""
+    if "current_stock" not in df.columns:
+        return {}
+    cols = [c for c in ("current_stock", "lead_time_days") if c in df.columns]
+    latest = df.dropna(subset=["current_stock"]).sort_values("date").groupby("product_name")[cols].last()
+    out = {}
+    for name, row in latest.iterrows():
+        entry = {"current_stock": _number(row["current_stock"], "current_stock", name)}
+        if "lead_time_days" in cols and row["lead_time_days"] == row["lead_time_days"]:
+            entry["lead_time_days"] = check_days(row["lead_time_days"], f"lead_time_days for '{name}'")
+        out[name] = entry
+    return out
+
+
+def _forecast_arrays(forecasts: list, horizon: int) -> tuple:
+    """(mean, sd) arrays of shape (products, horizon); short forecasts repeat their last day."""
+    mean = np.zeros((len(forecasts), horizon), dtype=np.float32)
+    sd = np.zeros_like(mean)
+    for i, forecast in enumerate(forecasts):
+        cols = to_columns(forecast)
+        if not cols:
+            continue
+        yhat = np.asarray(cols["yhat"], dtype=np.float32)
+        spread = (np.asarray(cols["yhat_upper"], dtype=np.float32) - np.asarray(cols["yhat_lower"], dtype=np.float32)) / (2 * INTERVAL_Z)
+        n = min(horizon, len(yhat))
+        mean[i, :n], sd[i, :n] = yhat[:n], spread[:n]
+        mean[i, n:], sd[i, n:] = yhat[n - 1], spread[n - 1]
+    return mean, np.maximum(sd, 0)
+
+
+def _chunks(n_products: int, paths: int, horizon: int):
+    per_product = paths * horizon * 4  # float32 demand, cumulated in place
+    size = max(1, int(INVENTORY_CHUNK_MB * 2 ** 20 // per_product))
+    for start in range(0, n_products, size):
+        yield slice(start, min(n_products, start + size))
+
+
+def simulate(forecasts: list, stock, lead_time=None, service_level: float = INVENTORY_SERVICE_LEVEL,
+             review_days: int = INVENTORY_REVIEW_DAYS, paths: int = INVENTORY_PATHS, seed=INVENTORY_SEED,
+             service_levels: list = None, safety_factors: list = None) -> list:
+    """
+    One result dict per forecast (either forecast shape). stock and lead_time
+    are per product (lead_time defaults to INVENTORY_LEAD_TIME_DAYS).
+    service_levels / safety_factors add a "what_if" list evaluated on the
+    same simulated paths.
+    """
+    n = len(forecasts)
+    stock = np.asarray(stock, dtype=np.float64).reshape(n)
+    lead = np.full(n, INVENTORY_LEAD_TIME_DAYS, dtype=np.int64) if lead_time is None else \
+        np.asarray(lead_time, dtype=np.int64).reshape(n)
+    lead = np.maximum(lead, 1)
+    cycle = lead + max(0, int(review_days))
+    cover_days = max((len(to_columns(f)["yhat"]) for f in forecasts if f), default=1)
+    horizon = max(int(cycle.max()) if n else 1, cover_days)
+    mean, sd = _forecast_arrays(forecasts, horizon)
+    cover = (np.cumsum(mean[:, :cover_days], axis=1) <= stock[:, None]).sum(axis=1)
+    # Only lead time + review period is simulated
+    horizon = int(cycle.max()) if n else 1
+    mean, sd = mean[:, :horizon], sd[:, :horizon]
+    z = np.random.default_rng(seed).standard_normal((paths, 1, horizon), dtype=np.float32)
+    rows = np.arange(n)
+
+    stockout = np.zeros(n)
+    expected = np.zeros(n)
+    order_up_to = np.zeros(n)
+    what_if = [[] for _ in range(n)]
+    for part in _chunks(n, paths, horizon):
+        # (paths, products, horizon) daily demand, then running totals per path
+        draws = z * sd[part]
+        draws += mean[part]
+        np.maximum(draws, 0, out=draws)
+        cum = np.cumsum(draws, axis=2, out=draws)
+        local = rows[part] - part.start
+        s = stock[part]
+
+        at_lead = cum[:, local, lead[part] - 1]  # (paths, products)
+        at_cycle = cum[:, local, cycle[part] - 1].astype(np.float64)
+        stockout[part] = (at_lead > s).mean(axis=0)
+        expected[part] = at_cycle.mean(axis=0)
+        order_up_to[part] = np.quantile(at_cycle, service_level, axis=0)
+        if service_levels or safety_factors:
+            for setting, values in _what_if(at_cycle, s, service_levels, safety_factors):
+                for j, i in enumerate(rows[part]):
+                    what_if[i].append(dict(setting, **{k: v[j] for k, v in values.items()}))
+
+    results = []
+    for i in range(n):
+        result = {
+            "quantity": float(max(0, math.ceil(order_up_to[i] - stock[i]))),
+            "urgency": urgency(stockout[i], cover[i], lead[i], cycle[i]),
+            "current_stock": round(float(stock[i]), 2),
+            "lead_time_days": int(lead[i]),
+            "review_days": int(cycle[i] - lead[i]),
+            "service_level": service_level,
+            "stockout_probability": round(float(stockout[i]), 3),
+            "days_of_cover": int(cover[i]),
+            "cover_capped": bool(cover[i] >= cover_days),
+            "expected_demand": round(float(expected[i]), 2),
+        }
+        if service_levels or safety_factors:
+            result["what_if"] = what_if[i]
+        results.append(result)
+    return results
+
+
+def _what_if(at_cycle: np.ndarray, stock: np.ndarray, service_levels, safety_factors) -> list:
+    """[(setting, {metric: per-product list})] for one chunk of products."""
+    out = []
+    mean = at_cycle.mean(axis=0)
+    for level in service_levels or []:
+        up_to = np.quantile(at_cycle, level, axis=0)
+        out.append(({"service_level": level}, {
+            "quantity": np.maximum(0, np.ceil(up_to - stock)).tolist(),
+            "order_up_to": np.round(up_to, 2).tolist(),
+        }))
+    for factor in safety_factors or []:
+        up_to = mean * (1 + factor)
+        achieved = (at_cycle <= up_to).mean(axis=0)
+        out.append(({"safety_factor": factor}, {
+            "quantity": np.maximum(0, np.ceil(up_to - stock)).tolist(),
+            "order_up_to": np.round(up_to, 2).tolist(),
+            "achieved_service_level": np.round(achieved, 3).tolist(),
+        }))
+    return out
+
+
+def urgency(stockout_probability: float, days_of_cover: float, lead_time: int, cycle: int) -> str:
+    """high: likely to run out before an order placed today arrives; medium: before the next review."""
+    if stockout_probability >= 0.5 or days_of_cover < lead_time:
+        return "high"
+    if stockout_probability >= 0.1 or days_of_cover < cycle:
+        return "medium"
+    return "low"
+
+
+def reorder_logic(result: dict) -> str:
+    return (f"Recommended quantity: {result['quantity']:.0f} units. Stock of {result['current_stock']:.0f} covers about "
+            f"{result['days_of_cover']:.0f} days{'+' if result['cover_capped'] else ''}; "
+            f"{result['stockout_probability'] * 100:.0f}% chance of running out within the {result['lead_time_days']}-day lead time. "
+            f"Orders up to the {result['service_level'] * 100:.0f}th percentile of simulated demand over "
+            f"{result['lead_time_days'] + result['review_days']} days ({result['expected_demand']:.1f} units expected).")
@@ -0,0 +1,185 @@
+"""
+Sampled per-invocation profiling for the Lambda handlers.
+
+A PROFILE_SAMPLE_RATE fraction of invocations (or requests carrying
+X-Profile: 1 when PROFILE_HEADER_ENABLED) run under cProfile and/or
+tracemalloc, as chosen by PROFILE_MODE. Each profiled invocation writes:
+
+    <handler>/<date>/<request_id>.json   summary: tags, hottest functions, top allocation sites
+    <handler>/<date>/<request_id>.prof   raw pstats, for snakeviz / pstats.Stats
+
+under PROFILE_DIR or, with PROFILE_OUTPUT=s3, under profiles/ in S3_BUCKET_NAME. Handlers tag the
+profile with the shape of the data they worked on via annotate(rows=..., ...)
+so slow production runs can be matched to a dataset size.
+
+cProfile only sees the handler's own thread; time spent in worker threads
+(batched explanations) shows up as waiting in the caller.
+"""
+
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from .config import (
+    PROFILE_SAMPLE_RATE, PROFILE_MODE, PROFILE_OUTPUT, PROFILE_DIR,
+    PROFILE_HEADER_ENABLED, PROFILE_TOP_N, S3_BUCKET_NAME
+)
+from .request_context import header, safe_id
+
+logger = logging.getLogger()
+
+_tags = contextvars.ContextVar("profile_tags", default=None)
+
+
+def annotate(**tags):
+    """Attach dataset-shape tags (rows, products, days, ...) to the current profile, if any."""
+    current = _tags.get()
+    if current is not None:
+        current.update(tags)
+
+
+def _should_profile(event) -> bool:
+    if PROFILE_HEADER_ENABLED and str(header(event, "X-Profile", "")).lower() in ("1", "true"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _request_id(event, context) -> str:
+    rid = getattr(context, "aws_request_id", None) or (event.get("requestContext") or {}).get("requestId")
+    return safe_id(rid, default=uuid.uuid4().hex)
+
+
+def top_functions(profiler, limit: int = PROFILE_TOP_N) -> list:
+    """Hottest functions by cumulative time, as plain dicts."""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({func})",
+            "calls": nc,
+            "primitive_calls": cc,
+            "self_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3)
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def top_allocations(before, after, limit: int = PROFILE_TOP_N) -> list:
+    """Source lines that allocated the most memory between two snapshots."""
+    ignore = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+    ]
+    after = after.filter_traces(ignore)
+    before = before.filter_traces(ignore)
+    rows = []
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        frame = stat.traceback[0]
+        rows.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count_diff": stat.count_diff
+        })
+    return rows
+
+
+def _write_artifacts(key_base: str, summary: dict, raw_stats: bytes = None) -> str:
+    files = {f"{key_base}.json": json.dumps(summary, indent=1, default=str).encode("utf-8")}
+    if raw_stats is not None:
+        files[f"{key_base}.prof"] = raw_stats
+
+    if PROFILE_OUTPUT == "s3" and S3_BUCKET_NAME:
+        from .storage import S3Store
+        store = S3Store(S3_BUCKET_NAME, "profiles")
+        for key, data in files.items():
+            store.put_bytes(key, data)
+        return f"s3://{S3_BUCKET_NAME}/profiles/{key_base}"
+
+    for key, data in files.items():
+        path = os.path.join(PROFILE_DIR, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    return os.path.join(PROFILE_DIR, key_base)
+
+
+def profiled(handler_name: str):
+    """Decorator for Lambda handlers; see module docstring. Never changes the response."""
+    modes = {m.strip() for m in PROFILE_MODE.split(",") if m.strip()}
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if not _should_profile(event):
+                return handler(event, context)
+
+            request_id = _request_id(event, context)
+            tags = {}
+            token = _tags.set(tags)
+
+            profiler = None
+            if "cprofile" in modes:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler (e.g. an outer debugger) is active; skip CPU profiling
+                    profiler = None
+
+            started_tracing = False
+            before = None
+            if "tracemalloc" in modes:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    started_tracing = True
+                before = tracemalloc.take_snapshot()
+
+            start = time.perf_counter()
+            try:
+                return handler(event, context)
+            finally:
+                elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+                if profiler is not None:
+                    profiler.disable()
+                summary = {
+                    "handler": handler_name,
+                    "request_id": request_id,
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "elapsed_ms": elapsed_ms,
+                    "tags": tags
+                }
+                # Snapshot before building the CPU summary so pstats' own allocations don't show up
+                if before is not None:
+                    after = tracemalloc.take_snapshot()
+                    summary["peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+                    if started_tracing:
+                        tracemalloc.stop()
+                    summary["top_allocations"] = top_allocations(before, after)
+                raw_stats = None
+                if profiler is not None:
+                    summary["top_functions"] = top_functions(profiler)
+                    raw_stats = marshal.dumps(profiler.stats)  # same format as Profile.dump_stats
+                _tags.reset(token)
+
+                key_base = f"{handler_name}/{datetime.utcnow():%Y-%m-%d}/{request_id}"
+                try:
+                    location = _write_artifacts(key_base, summary, raw_stats)
+                    logger.info(f"Profile for {handler_name} ({elapsed_ms} ms, {tags}) written to {location}")
+                except Exception as e:
+                    logger.warning(f"Could not write profile for {handler_name}: {str(e)}")
+        return wrapper
+    return decorator
@@ -0,0 +1,131 @@
+"""
+One compiled Prophet Stan model per process, shared by every fit.
+
+Prophet() normally builds a new CmdStanPyBackend, and with it a new
+CmdStanModel, for each model object. new_prophet() returns a Prophet whose
+backend reuses one CmdStanModel loaded on first use (or at import with
+PROPHET_PRELOAD, so a Lambda container pays for it in the init phase rather
+than in its first request). PROPHET_STAN_MODEL points at a compiled model
+shipped with the deployment, e.g. a layer under /opt; by default the one
+inside the prophet package is used.
+
+Where a fit's time goes is recorded both as spans and in per-process totals
+(fit_stats()):
+
+- prophet.setup: building the Prophet object and its backend
+- prophet.fit: all of Prophet.fit
+- prophet.optimize: the Stan optimizer run inside it (including launching the
+  compiled model), so fit - optimize is Prophet's own preprocessing
+"""
+
+import importlib.resources
+import threading
+import time
+
+from .config import PROPHET_STAN_MODEL, PROPHET_PRELOAD
+from .instrumentation import span
+
+_lock = threading.Lock()
+_model = None
+_prophet_class = None
+_stats = {"fits": 0, "load_model_ms": 0.0, "setup_ms": 0.0, "fit_ms": 0.0, "optimize_ms": 0.0}
+
+
+def _record(key: str, started: float, count: bool = False):
+    with _lock:
+        _stats[key] += (time.perf_counter() - started) * 1000
+        if count:
+            _stats["fits"] += 1
+
+
+def stan_model():
+    """The process-wide CmdStanModel, loaded on first call."""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                started = time.perf_counter()
+                with span("prophet.load_model"):
+                    import cmdstanpy
+                    from prophet.models import CmdStanPyBackend
+
+                    # What CmdStanPyBackend.__init__ does for every model object, done once
+                    stan_dir = importlib.resources.files("prophet") / "stan_model"
+                    cmdstan = stan_dir / f"cmdstan-{CmdStanPyBackend.CMDSTAN_VERSION}"
+                    if cmdstan.exists():
+                        cmdstanpy.set_cmdstan_path(str(cmdstan))
+                    _model = cmdstanpy.CmdStanModel(exe_file=PROPHET_STAN_MODEL or str(stan_dir / "prophet_model.bin"))
+                _stats["load_model_ms"] += (time.perf_counter() - started) * 1000
+    return _model
+
+
+def _shared_prophet():
+    """Prophet subclass using the shared model (built lazily: prophet is an optional import)."""
+    global _prophet_class
+    if _prophet_class is None:
+        from prophet import Prophet
+        from prophet.models import CmdStanPyBackend, IStanBackend
+
+        class SharedModelBackend(CmdStanPyBackend):
+            def __init__(self):
+                IStanBackend.__init__(self)  # cmdstan path already set by stan_model()
+
+            def load_model(self):
+                return stan_model()
+
+            def fit(self, stan_init, stan_data, **kwargs):
+                started = time.perf_counter()
+                try:
+                    with span("prophet.optimize"):
+                        return super().fit(stan_init, stan_data, **kwargs)
+                finally:
+                    _record("optimize_ms", started)
+
+        class SharedModelProphet(Prophet):
+            def _load_stan_backend(self, stan_backend):
+                self.stan_backend = SharedModelBackend()
+
+            def fit(self, df, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return super().fit(df, **kwargs)
+                finally:
+                    _record("fit_ms", started, count=True)
+
+        _prophet_class = SharedModelProphet
+    return _prophet_class
+
+
+def new_prophet(**kwargs):
+    """Prophet(**kwargs) backed by the shared Stan model. Raises ImportError without prophet."""
+    cls = _shared_prophet()
+    started = time.perf_counter()
+    with span("prophet.setup"):
+        model = cls(**kwargs)
+    _record("setup_ms", started)
+    return model
+
+
+def fit_stats() -> dict:
+    """Per-process totals and per-fit averages; overhead_ms is everything but the optimizer."""
+    with _lock:
+        stats = dict(_stats)
+    fits = stats["fits"] or 1
+    stats["overhead_ms"] = stats["setup_ms"] + stats["fit_ms"] - stats["optimize_ms"]
+    stats["per_fit"] = {k: round(stats[k] / fits, 2) for k in ("setup_ms", "fit_ms", "optimize_ms", "overhead_ms")}
+    return {k: round(v, 2) if isinstance(v, float) else v for k, v in stats.items()}
+
+
+def preload():
+    """Import prophet and load the model now; forecasting falls back to moving averages if this fails."""
+    try:
+        _shared_prophet()
+        stan_model()
+    except ImportError:
+        pass
+    except Exception as e:
+        print(f"Prophet model preload failed: {e}")
+
+
+if PROPHET_PRELOAD:
+    preload()
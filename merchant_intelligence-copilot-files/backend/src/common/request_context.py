@@ -0,0 +1,44 @@
+"""
+Helpers for reading API Gateway proxy events.
+"""
+
+import json
+import re
+
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.-]")
+ANONYMOUS = "anonymous"  # requests without a merchant ID; shared by every such client
+
+
+def header(event, name, default=None):
+    """Case-insensitive header lookup (API Gateway preserves client casing)."""
+    name = name.lower()
+    for k, v in (event.get("headers") or {}).items():
+        if k.lower() == name:
+            return v
+    return default
+
+
+def safe_id(value, default=ANONYMOUS) -> str:
+    """Make a client-supplied ID safe to use in storage keys and metric names."""
+    cleaned = _SAFE_ID.sub("", str(value or ""))[:64]
+    # "." and ".." would name a directory's own or parent path in file-backed stores
+    return cleaned if cleaned.strip(".") else default
+
+
+def merchant_id(event, body=None) -> str:
+    """Merchant/tenant ID from the X-Merchant-Id header, falling back to the body."""
+    return safe_id(header(event, "X-Merchant-Id") or (body or {}).get("merchant_id"))
+
+
+def json_body(event) -> dict:
+    """The request body as a dict; {} when it is missing or not a JSON object."""
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except (ValueError, TypeError):
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def is_anonymous(merchant: str) -> bool:
+    """True for the shared ID of requests that didn't say which merchant they are."""
+    return merchant == ANONYMOUS
@@ -1,4 +1,7 @@
-import json
+import base64, functools, math
+from .config import RESPONSE_COMPRESSION
+from .serialization import dumps, negotiate_encoding, encode_body
+from .request_context import header
 
 def resp(status, body):
     return {
@@ -9,7 +12,7 @@ def resp(status, body):
             "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Merchant-Id",
             "Access-Control-Allow-Methods": "GET,POST,OPTIONS"
         },
-        "body": json.dumps(body, ensure_ascii=False)
+        "body": dumps(body)
     }
 
 def ok(body): return resp(200, body)
@@ -17,3 +20,32 @@ def bad(msg, extra=None):
     b={"error":"BadRequest","message":msg}
     if extra: b["details"]=extra
     return resp(400,b)
+def too_many(msg, retry_after):
+    r = resp(429, {"error":"TooManyRequests","message":msg,"retry_after":round(retry_after, 1)})
+    r["headers"]["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return r
+
+def content_encoding(handler):
+    """
+    Outermost decorator for API handlers. Decodes base64 request bodies (API
+    Gateway sends them when binary media types are enabled) and compresses
+    the response body with gzip/br when the client's Accept-Encoding allows.
+    Non-HTTP invocations (async invokes, schedules) pass through untouched.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if isinstance(event, dict) and event.get("isBase64Encoded") and event.get("body"):
+            event = {**event, "body": base64.b64decode(event["body"]).decode("utf-8"), "isBase64Encoded": False}
+        response = handler(event, context)
+        if not (RESPONSE_COMPRESSION and isinstance(response, dict) and isinstance(response.get("body"), str)
+                and not response.get("isBase64Encoded")):
+            return response
+        coding = negotiate_encoding(header(event or {}, "Accept-Encoding", ""))
+        body, coding = encode_body(response["body"], coding)
+        response_headers = dict(response.get("headers") or {})
+        response_headers["Vary"] = "Accept-Encoding"
+        if coding:
+            response_headers["Content-Encoding"] = coding
+            response = {**response, "body": body, "isBase64Encoded": True}
+        return {**response, "headers": response_headers}
+    return wrapper
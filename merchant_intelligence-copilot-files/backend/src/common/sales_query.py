@@ -0,0 +1,325 @@
+"""
+Exact sales figures from a merchant's stored history (see history_store.py),
+computed in-process so chat can quote numbers without sending tables to the LLM.
+
+A query is a small dict, which is also the input schema of the chat's
+sales_query tool (TOOL_SPEC):
+
+    {"metric": "quantity", "products": ["Atta"], "start": "2025-12-01", "end": "2025-12-31",
+     "group_by": "weekday", "limit": 10}
+
+metric is quantity (units sold), revenue, days_sold or avg_price (revenue per
+unit). group_by is product, day, week, month or weekday, or omitted for a
+single total. Product names match exactly or by words ("Atta" matches every
+Atta SKU). Lookups are indexed: named products come from History.series()
+(a zero-copy slice of the compacted base) cut to the date range with
+searchsorted, and catalog-wide queries mask one set of columns cached per
+history generation. Grouping is np.unique plus bincount, so a query over a
+year of a large catalog takes milliseconds.
+
+parse_question() is the rule-based router: it turns common English questions
+("how much Atta did I sell in December", "revenue by day of week last month")
+into a query, so most numeric questions need no tool round trip.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from .config import SALES_QUERY_MAX_ROWS, SALES_QUERY_CACHE_SIZE
+from .history_store import open_history
+
+METRICS = ("quantity", "revenue", "days_sold", "avg_price")
+GROUPS = ("product", "day", "week", "month", "weekday")
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MONTHS = ("january", "february", "march", "april", "may", "june", "july", "august",
+          "september", "october", "november", "december")
+
+TOOL_SPEC = {
+    "name": "sales_query",
+    "description": ("Exact totals from the merchant's sales history. Use it for any question about how much or how "
+                    "many units were sold, revenue, or which products/days/months sold most, over a date range."),
+    "inputSchema": {"json": {
+        "type": "object",
+        "properties": {
+            "metric": {"type": "string", "enum": list(METRICS), "description": "quantity = units sold"},
+            "products": {"type": "array", "items": {"type": "string"},
+                         "description": "Product names or words in them; omit for all products"},
+            "start": {"type": "string", "description": "First day, YYYY-MM-DD; omit for the start of history"},
+            "end": {"type": "string", "description": "Last day, YYYY-MM-DD; omit for the latest day"},
+            "group_by": {"type": "string", "enum": list(GROUPS), "description": "Omit for a single total"},
+            "limit": {"type": "integer", "description": f"Rows to return (max {SALES_QUERY_MAX_ROWS})"}
+        },
+        "required": ["metric"]
+    }}
+}
+
+
+class QueryError(ValueError):
+    """Invalid query; returned to the LLM as a tool error."""
+
+
+def _day(value, name) -> int:
+    try:
+        return int(np.datetime64(date.fromisoformat(str(value)), "D").astype(np.int64))
+    except ValueError:
+        raise QueryError(f"{name} must be a date as YYYY-MM-DD")
+
+
+def _iso(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+class SalesQuery:
+    """Query engine over one History generation."""
+
+    def __init__(self, history):
+        self.history = history
+        self.products = history.products
+        self._lower = [p.lower() for p in self.products]
+        self._words = [set(re.findall(r"\w+", p)) for p in self._lower]
+        self._columns = None
+        self._lock = threading.Lock()
+
+    @property
+    def last_day(self) -> int:
+        return self.history.last_day()
+
+    def columns(self) -> dict:
+        with self._lock:
+            if self._columns is None:
+                self._columns = self.history.columns()
+            return self._columns
+
+    def match_products(self, names) -> tuple:
+        """(matched product codes, names that matched nothing). Exact names win over word matches."""
+        codes, unmatched = [], []
+        for name in names:
+            wanted = str(name).strip().lower()
+            if wanted in self._lower:
+                codes.append(self._lower.index(wanted))
+                continue
+            words = set(re.findall(r"\w+", wanted))
+            hits = [i for i, have in enumerate(self._words) if words and words <= have]
+            if hits:
+                codes.extend(hits)
+            else:
+                unmatched.append(name)
+        return sorted(set(codes)), unmatched
+
+    def _rows(self, codes, start: int, end: int) -> dict:
+        """Columns for the given product codes (None = all) within [start, end]."""
+        if codes is None:
+            cols = self.columns()
+            keep = (cols["day"] >= start) & (cols["day"] <= end)
+            return {c: np.asarray(v)[keep] for c, v in cols.items()}
+        parts = []
+        for code in codes:
+            series = self.history.series(self.products[code])
+            lo, hi = np.searchsorted(series["day"], [start, end + 1])
+            parts.append({"product": np.full(hi - lo, code, dtype=np.int32),
+                          **{c: np.asarray(v[lo:hi]) for c, v in series.items()}})
+        if not parts:
+            return {c: np.empty(0) for c in ("product", "day", "quantity_sold", "price", "revenue")}
+        return {c: np.concatenate([p[c] for p in parts]) for c in parts[0]}
+
+    def run(self, query: dict) -> dict:
+        """Result dict for a query (see module docstring); raises QueryError for bad input."""
+        if not isinstance(query, dict):
+            raise QueryError("query must be an object")
+        metric = query.get("metric", "quantity")
+        if metric not in METRICS:
+            raise QueryError(f"metric must be one of: {', '.join(METRICS)}")
+        group_by = query.get("group_by") or None
+        if group_by is not None and group_by not in GROUPS:
+            raise QueryError(f"group_by must be one of: {', '.join(GROUPS)}")
+        try:
+            limit = max(1, min(SALES_QUERY_MAX_ROWS, int(query.get("limit") or SALES_QUERY_MAX_ROWS)))
+        except (TypeError, ValueError):
+            raise QueryError("limit must be a number")
+        if self.last_day is None:
+            return {"metric": metric, "total": 0, "rows": [], "note": "No sales history stored"}
+        start = _day(query["start"], "start") if query.get("start") else np.iinfo(np.int32).min
+        end = _day(query["end"], "end") if query.get("end") else self.last_day
+
+        codes, unmatched = None, []
+        if query.get("products"):
+            names = query["products"] if isinstance(query["products"], list) else [query["products"]]
+            codes, unmatched = self.match_products(names)
+        rows = self._rows(codes, start, end)
+
+        result = {
+            "metric": metric,
+            "start": _iso(start) if query.get("start") else (_iso(rows["day"].min()) if len(rows["day"]) else None),
+            "end": _iso(end),
+            "products": [self.products[c] for c in codes][:SALES_QUERY_MAX_ROWS] if codes is not None else "all",
+            "total": _value(metric, rows["quantity_sold"].sum(), rows["revenue"].sum(),
+                            int((rows["quantity_sold"] > 0).sum())),
+        }
+        if unmatched:
+            result["unmatched_products"] = unmatched
+        if group_by:
+            result["group_by"] = group_by
+            result.update(self._grouped(rows, metric, group_by, limit))
+        return result
+
+    def run_tool(self, name: str, query: dict) -> dict:
+        """tool_handler for nova_converse."""
+        if name != TOOL_SPEC["name"]:
+            raise QueryError(f"Unknown tool: {name}")
+        return self.run(query)
+
+    def _grouped(self, rows: dict, metric: str, group_by: str, limit: int) -> dict:
+        day = rows["day"].astype(np.int64)
+        if group_by == "product":
+            key = rows["product"].astype(np.int64)
+        elif group_by == "day":
+            key = day
+        elif group_by == "weekday":
+            key = (day + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+        elif group_by == "week":
+            key = day - (day + 3) % 7  # the week's Monday
+        else:
+            key = day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        keys, inverse = np.unique(key, return_inverse=True)
+        qty = np.bincount(inverse, weights=rows["quantity_sold"], minlength=len(keys))
+        revenue = np.bincount(inverse, weights=rows["revenue"], minlength=len(keys))
+        sold = np.bincount(inverse, weights=rows["quantity_sold"] > 0, minlength=len(keys))
+        values = [_value(metric, q, r, int(s)) for q, r, s in zip(qty, revenue, sold)]
+
+        # Products are ranked by value; time buckets stay in calendar order
+        order = np.argsort([-v for v in values], kind="stable") if group_by == "product" else np.arange(len(keys))
+        out = [{"key": self._label(group_by, keys[i]), "value": values[i]} for i in order[:limit]]
+        return {"rows": out, "row_count": len(keys)}
+
+    def _label(self, group_by: str, key) -> str:
+        if group_by == "product":
+            return self.products[int(key)]
+        if group_by == "weekday":
+            return WEEKDAYS[int(key)]
+        if group_by == "month":
+            return str(np.datetime64(int(key), "M"))
+        return _iso(key)
+
+    # ---- rule-based router ----------------------------------------------------
+
+    def parse_question(self, message: str):
+        """Query for a numeric English question about past sales, or None when it isn't one."""
+        text = message.lower()
+        if not re.search(r"\bhow (much|many)\b|\btotal\b|\bunits\b|\brevenue\b|\bsold\b|\bsell\b|\bsales\b|\bearn", text):
+            return None
+        if re.search(r"\b(forecast|next|will|predict|should|reorder|order)\b", text):
+            return None  # about the future: answered from the insights, not history
+        if self.last_day is None:
+            return None
+
+        query = {"metric": "revenue" if re.search(r"\brevenue\b|\bearn|\bincome\b|₹|\brs\b|\brupees?\b", text) else "quantity"}
+        products = self._products_in(text)
+        if products:
+            query["products"] = products
+        period = _period(text, date.fromisoformat(_iso(self.last_day)))
+        if period:
+            query["start"], query["end"] = period
+        if re.search(r"day of (the )?week|\bweekday|which day", text):
+            query["group_by"] = "weekday"
+        elif re.search(r"\bby month\b|\bmonthly\b|each month|per month", text):
+            query["group_by"] = "month"
+        elif re.search(r"\bby week\b|\bweekly\b|each week|per week", text):
+            query["group_by"] = "week"
+        elif re.search(r"\bdaily\b|each day|per day|by day\b", text):
+            query["group_by"] = "day"
+        elif not products and re.search(r"\bwhich\b|\btop\b|\bbest\b|\bmost\b|\bleast\b|\bworst\b|\bby product\b", text):
+            query["group_by"] = "product"
+        if not products and not period and "group_by" not in query:
+            return None  # too vague to be worth an exact figure
+        return query
+
+    def _products_in(self, text: str) -> list:
+        """Products the message names, keeping those with the most words matched."""
+        words = set(re.findall(r"\w+", text))
+        scores = []
+        for have in self._words:
+            hit = have & words
+            # At least one real word ("atta"), not just a size like "1kg"
+            scores.append(len(hit) if any(len(w) >= 3 and w.isalpha() for w in hit) else 0)
+        best = max(scores, default=0)
+        return [self.products[i] for i, score in enumerate(scores) if best and score == best]
+
+
+def _value(metric: str, quantity: float, revenue: float, days_sold: int):
+    if metric == "quantity":
+        return round(float(quantity), 2)
+    if metric == "revenue":
+        return round(float(revenue), 2)
+    if metric == "days_sold":
+        return days_sold
+    return round(float(revenue) / float(quantity), 2) if quantity else None
+
+
+def _period(text: str, today: date):
+    """(start, end) ISO dates for a time phrase, relative to the last day of history."""
+    if "yesterday" in text:
+        day = today - timedelta(days=1)
+        return day.isoformat(), day.isoformat()
+    if re.search(r"\btoday\b", text):
+        return today.isoformat(), today.isoformat()
+    m = re.search(r"\b(?:last|past)\s+(\d+)\s+(day|week|month)s?\b", text)
+    if m:
+        days = int(m.group(1)) * {"day": 1, "week": 7, "month": 30}[m.group(2)]
+        return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
+    if re.search(r"\b(last|past) week\b", text):
+        return (today - timedelta(days=6)).isoformat(), today.isoformat()
+    if re.search(r"\bthis month\b", text):
+        return today.replace(day=1).isoformat(), today.isoformat()
+    if re.search(r"\blast month\b", text):
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1).isoformat(), end.isoformat()
+    for i, name in enumerate(MONTHS):
+        if re.search(rf"\b({name}|{name[:3]})\b", text) and not (name == "may" and not re.search(r"\bin may\b", text)):
+            m = re.search(rf"\b(?:{name}|{name[:3]})\s+(\d{{4}})\b", text)
+            # The latest such month that has started by the end of history
+            year = int(m.group(1)) if m else (today.year if i + 1 <= today.month else today.year - 1)
+            first = date(year, i + 1, 1)
+            last = date(year + (i == 11), (i + 1) % 12 + 1, 1) - timedelta(days=1)
+            return first.isoformat(), last.isoformat()
+    return None
+
+
+# merchant -> SalesQuery for its latest history generation
+_engines = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+def sales_engine(merchant: str):
+    """SalesQuery over the merchant's current history, or None if nothing is stored (or the request is anonymous)."""
+    history = open_history(merchant)
+    if history is None:
+        return None
+    key = (merchant, history.manifest["generation"])
+    with _engines_lock:
+        engine = _engines.get(merchant)
+        if engine is not None and engine[0] == key:
+            _engines.move_to_end(merchant)
+            return engine[1]
+        engine = SalesQuery(history)
+        _engines[merchant] = (key, engine)
+        while len(_engines) > SALES_QUERY_CACHE_SIZE:
+            _engines.popitem(last=False)
+    return engine
+
+
+def format_result(result: dict) -> str:
+    """Compact text of a result for the prompt."""
+    products = result.get("products")
+    scope = "all products" if products == "all" else ", ".join(products or []) or "no matching products"
+    lines = [f"{result['metric']} for {scope}, {result.get('start')} to {result.get('end')}: total {result['total']}"]
+    if result.get("unmatched_products"):
+        lines.append(f"No product matches: {', '.join(result['unmatched_products'])}")
+    for row in result.get("rows", []):
+        lines.append(f"- {row['key']}: {row['value']}")
+    if result.get("row_count", 0) > len(result.get("rows", [])):
+        lines.append(f"({result['row_count'] - len(result['rows'])} more not shown)")
+    return "\n".join(lines)
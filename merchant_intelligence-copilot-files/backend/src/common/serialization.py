@@ -0,0 +1,152 @@
+"""
+JSON serialization and HTTP content encoding for responses.
+
+JSON_SERIALIZER picks the encoder: "orjson" (several times faster on the
+large insights payloads, serializes NumPy arrays natively), "stdlib", or
+"auto" (orjson when installed). Both accept NumPy/pandas scalars, arrays,
+timestamps and dates, so handlers don't have to convert them by hand, and
+both write NaN and infinity as null.
+
+Compression is negotiated from Accept-Encoding (br when the brotli package
+is installed, otherwise gzip) for bodies over COMPRESS_MIN_BYTES; see
+responses.content_encoding.
+"""
+
+import base64
+import datetime
+import decimal
+import gzip
+import json
+import math
+
+import numpy as np
+
+from .config import JSON_SERIALIZER, COMPRESS_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import orjson
+except ImportError:  # optional, see requirements.txt
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+
+def _default(obj):
+    """Values the encoders don't handle natively."""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        value = float(obj)
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()  # includes pandas.Timestamp
+    if isinstance(obj, np.datetime64):
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if hasattr(obj, "item"):
+        return obj.item()  # other NumPy/pandas scalars
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite(obj):
+    """obj with non-finite floats (plain or NumPy, also inside arrays) replaced by None."""
+    if isinstance(obj, (float, np.floating)):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist())
+    return obj
+
+
+def _stdlib_dumps(obj) -> bytes:
+    # json writes NaN/Infinity, which isn't JSON; only pay for the rewrite when there is one
+    try:
+        text = json.dumps(obj, ensure_ascii=False, default=_default, allow_nan=False)
+    except ValueError:
+        text = json.dumps(_finite(obj), ensure_ascii=False, default=_default, allow_nan=False)
+    return text.encode("utf-8")
+
+
+def _orjson_dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+SERIALIZERS = {"stdlib": _stdlib_dumps}
+if orjson is not None:
+    SERIALIZERS["orjson"] = _orjson_dumps
+
+
+def get_serializer(name: str = JSON_SERIALIZER):
+    if name == "auto":
+        name = "orjson" if orjson is not None else "stdlib"
+    if name not in SERIALIZERS:
+        raise ValueError(f"JSON serializer '{name}' is not available (have: {', '.join(SERIALIZERS)})")
+    return SERIALIZERS[name]
+
+
+_dumps = get_serializer()
+
+
+def dumps_bytes(obj) -> bytes:
+    """UTF-8 JSON for obj using the configured serializer."""
+    return _dumps(obj)
+
+
+def dumps(obj) -> str:
+    return _dumps(obj).decode("utf-8")
+
+
+# ---- content encoding -------------------------------------------------------------
+
+ENCODERS = {"gzip": lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)}
+if brotli is not None:
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+
+PREFERENCE = ["br", "gzip"]  # on equal q-values
+
+
+def negotiate_encoding(accept_encoding: str):
+    """Best supported coding for an Accept-Encoding header value, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in PREFERENCE:
+        if coding not in ENCODERS:
+            continue
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def encode_body(body: str, coding: str):
+    """(base64 body, coding) for a text body, or (body, None) when compression doesn't pay."""
+    data = body.encode("utf-8")
+    if coding is None or len(data) < COMPRESS_MIN_BYTES:
+        return body, None
+    compressed = ENCODERS[coding](data)
+    if len(compressed) >= len(data):
+        return body, None
+    return base64.b64encode(compressed).decode("ascii"), coding
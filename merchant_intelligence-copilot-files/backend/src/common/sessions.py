@@ -0,0 +1,113 @@
+"""
+Server-side chat sessions.
+
+A session keeps a reference to the merchant's insights (stored once, by
+content digest) plus a token-bounded conversation history. When the verbatim
+history grows past CHAT_HISTORY_MAX_TOKENS the oldest turns are folded into a
+rolling summary, so the prompt sent to Bedrock stays roughly the same size no
+matter how long the conversation runs.
+"""
+
+import logging
+import time
+import uuid
+
+from .config import BEDROCK_MODEL_BASELINE, CHAT_HISTORY_MAX_TOKENS, CHAT_SUMMARY_MAX_TOKENS
+from .bedrock_nova import nova_converse
+from .storage import get_store
+from .request_context import safe_id
+from .insights_store import load_insights
+
+logger = logging.getLogger()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text or "") // 4 + 1
+
+
+def _session_key(merchant_id, session_id):
+    return f"sessions/{merchant_id}/{session_id}.json"
+
+
+def load_session(merchant_id: str, session_id: str = None) -> dict:
+    """Load a session, or start a new one if the ID is missing or unknown."""
+    if session_id:
+        session = get_store().get_json(_session_key(merchant_id, safe_id(session_id)))
+        if session:
+            return session
+    return {
+        "session_id": uuid.uuid4().hex,
+        "merchant_id": merchant_id,
+        "insights_digest": None,
+        "summary": "",
+        "history": [],
+        "created_at": time.time(),
+        "is_new": True
+    }
+
+
+def save_session(session: dict):
+    session.pop("is_new", None)
+    session["updated_at"] = time.time()
+    get_store().put_json(_session_key(session["merchant_id"], session["session_id"]), session)
+
+
+def session_insights(session: dict):
+    """Insights referenced by the session, or None."""
+    if not session.get("insights_digest"):
+        return None
+    return load_insights(session["merchant_id"], session["insights_digest"])
+
+
+def history_tokens(session: dict) -> int:
+    return sum(estimate_tokens(turn["content"]) for turn in session["history"])
+
+
+def add_turn(session: dict, user_message: str, assistant_message: str):
+    """Append a user/assistant exchange and compact the history if it is over budget."""
+    session["history"].append({"role": "user", "content": user_message})
+    session["history"].append({"role": "assistant", "content": assistant_message})
+    compact_history(session)
+
+
+def compact_history(session: dict, max_tokens: int = CHAT_HISTORY_MAX_TOKENS):
+    """
+    Fold the oldest exchanges into the rolling summary until the verbatim
+    history fits in max_tokens. Always keeps the most recent exchange.
+    """
+    if history_tokens(session) <= max_tokens:
+        return
+
+    evicted = []
+    # Drop whole user/assistant pairs so the remaining history still alternates
+    while len(session["history"]) > 2 and history_tokens(session) > max_tokens // 2:
+        evicted.extend(session["history"][:2])
+        session["history"] = session["history"][2:]
+
+    if evicted:
+        session["summary"] = summarize_turns(session.get("summary", ""), evicted)
+
+
+def summarize_turns(summary: str, turns: list) -> str:
+    """Merge evicted turns into the running summary, bounded to CHAT_SUMMARY_MAX_TOKENS."""
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    system = """You maintain a running summary of a conversation between a merchant and their business advisor.
+Keep product names, quantities, decisions and open questions. Drop greetings and filler.
+Reply with the updated summary only, in at most 5 short sentences."""
+    user = f"Current summary:\n{summary or '(none)'}\n\nNew conversation turns:\n{transcript}"
+
+    try:
+        updated = nova_converse(BEDROCK_MODEL_BASELINE, system, user, max_tokens=CHAT_SUMMARY_MAX_TOKENS)
+    except Exception as e:
+        # Fallback: keep the tail of the raw transcript so context is not silently lost
+        logger.warning(f"Session summarization failed, truncating instead: {str(e)}")
+        updated = f"{summary}\n{transcript}".strip()
+
+    max_chars = CHAT_SUMMARY_MAX_TOKENS * 4
+    return updated[-max_chars:] if len(updated) > max_chars else updated
+
+
+def prompt_history(session: dict) -> list:
+    """History in the shape nova_converse expects for prior turns."""
+    return [{"role": t["role"], "content": t["content"]} for t in session["history"]] if session else []
@@ -0,0 +1,182 @@
+"""
+Small key/value blob storage used for server-side state (chat sessions,
+stored insights, reports). Keys are slash-separated paths.
+
+STORAGE_BACKEND selects the implementation:
+- local: files under LOCAL_STORAGE_DIR (default, stand-in for development)
+- s3: objects in S3_BUCKET_NAME under STORAGE_PREFIX
+- memory: process-local dict, for tests and benchmarks
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from .config import STORAGE_BACKEND, LOCAL_STORAGE_DIR, S3_BUCKET_NAME, STORAGE_PREFIX
+from .serialization import dumps_bytes
+
+
+def content_digest(obj) -> str:
+    """Stable SHA-256 digest of a JSON-serializable object."""
+    canonical = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class BlobStore:
+    """Interface shared by all backends; subclasses implement the byte-level methods."""
+
+    def get_bytes(self, key):
+        raise NotImplementedError
+
+    def put_bytes(self, key, data: bytes):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def list(self, prefix=""):
+        raise NotImplementedError
+
+    def exists(self, key) -> bool:
+        return self.get_bytes(key) is not None
+
+    def get_json(self, key):
+        data = self.get_bytes(key)
+        return json.loads(data) if data is not None else None
+
+    def put_json(self, key, obj):
+        self.put_bytes(key, dumps_bytes(obj))
+
+
+class MemoryStore(BlobStore):
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get_bytes(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def put_bytes(self, key, data: bytes):
+        with self._lock:
+            self._data[key] = bytes(data)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def exists(self, key) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def list(self, prefix=""):
+        with self._lock:
+            return sorted(k for k in self._data if k.startswith(prefix))
+
+
+class LocalStore(BlobStore):
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def get_bytes(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_bytes(self, key, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent readers never see a partial file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key) -> bool:
+        return os.path.exists(self._path(key))
+
+    def list(self, prefix=""):
+        keys = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+
+class S3Store(BlobStore):
+    def __init__(self, bucket, prefix=""):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.s3 = boto3.client("s3")
+
+    def get_bytes(self, key):
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def put_bytes(self, key, data: bytes):
+        self.s3.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def exists(self, key) -> bool:
+        # HEAD only, so large objects aren't downloaded to check for them
+        from botocore.exceptions import ClientError
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def list(self, prefix=""):
+        keys = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            keys.extend(o["Key"][len(self.prefix):] for o in page.get("Contents", []))
+        return sorted(keys)
+
+
+_store = None
+
+
+def get_store():
+    """Process-wide store, created on first use so it survives across warm invocations."""
+    global _store
+    if _store is None:
+        if STORAGE_BACKEND == "s3":
+            _store = S3Store(S3_BUCKET_NAME, STORAGE_PREFIX)
+        elif STORAGE_BACKEND == "memory":
+            _store = MemoryStore()
+        else:
+            _store = LocalStore(LOCAL_STORAGE_DIR)
+    return _store
+
+
+def set_store(store):
+    """Swap the process-wide store (tests, benchmarks)."""
+    global _store
+    _store = store
@@ -0,0 +1,239 @@
+"""
+Weekly action plan reports, precomputed and cached by insights digest.
+
+Right after generate_insights stores a result, a rule-based report is saved
+with status "pending" and the LLM version is requested in the background.
+The WeeklyReport page then reads whatever is stored for the digest: the LLM
+report once it is "ready", the rule-based one until then. Nothing is
+regenerated unless the insights (and therefore the digest) change.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+
+from .config import BEDROCK_MODEL_FAST, WEEKLY_REPORT_PRECOMPUTE, WEEKLY_REPORT_FUNCTION_NAME
+from .bedrock_nova import nova_converse
+from .insights_index import get_index
+from .storage import get_store
+
+logger = logging.getLogger()
+
+STATUS_PENDING = "pending"    # rule-based report served while the LLM version is generated
+STATUS_READY = "ready"        # LLM report
+STATUS_FALLBACK = "fallback"  # LLM failed; rule-based report is final for this digest
+
+DISCLAIMER = "AI-generated action plan. Review with your business knowledge before implementing."
+
+LANGUAGES = ("en", "hi", "mr")
+
+
+def check_language(lang) -> str:
+    """A request's language; it becomes part of storage keys, so only known codes are accepted."""
+    if lang not in LANGUAGES:
+        raise ValueError(f"language must be one of: {', '.join(LANGUAGES)}")
+    return lang
+
+
+def report_key(merchant_id: str, digest: str, lang: str) -> str:
+    return f"reports/{merchant_id}/{digest}/{check_language(lang)}.json"
+
+
+def _pending_key(merchant_id: str, digest: str, lang: str) -> str:
+    # One small marker per pending report, so the schedule lists only what is waiting
+    return f"reports-pending/{merchant_id}/{digest}/{check_language(lang)}"
+
+
+def report_context(index) -> dict:
+    high_urgency = index.high_urgency
+    anomalies = index.anomalies
+    price_opportunities = index.price_opportunities
+    return {
+        "total_products": len(index.products),
+        "high_urgency_reorders": len(high_urgency),
+        "anomaly_products": len(anomalies),
+        "low_confidence_products": len(index.low_confidence),
+        "price_optimization_opportunities": len(price_opportunities),
+        "top_reorders": [{"name": p["product_name"], "qty": p["reorder"]["quantity"]} for p in high_urgency[:5]],
+        "top_anomalies": [{"name": p["product_name"], "anomalies": p["anomalies"]} for p in anomalies[:5]],
+        "price_actions": [{"name": p["product_name"], "action": p["price_hint"]["action"], "reason": p["price_hint"]["reason"]} for p in price_opportunities[:3]]
+    }
+
+
+def rule_based_report(index) -> dict:
+    """Deterministic report built from the index alone; available instantly."""
+    high_urgency = index.high_urgency
+    anomalies = index.anomalies
+    low_confidence = index.low_confidence
+    price_opportunities = index.price_opportunities
+    report_data = {
+        "priorities": [
+            {
+                "title": "High Priority Reorders",
+                "description": f"{len(high_urgency)} products need urgent reordering: {', '.join([p['product_name'] for p in high_urgency[:3]])}",
+                "impact": "Prevent stockouts and maintain sales"
+            },
+            {
+                "title": "Address Demand Anomalies",
+                "description": f"{len(anomalies)} products showing unusual patterns: {', '.join([p['product_name'] for p in anomalies[:3]])}",
+                "impact": "Adjust inventory and pricing strategy"
+            },
+            {
+                "title": "Price Optimization",
+                "description": f"{len(price_opportunities)} products have pricing opportunities",
+                "impact": "Increase revenue through strategic pricing"
+            }
+        ],
+        "risks": [
+            f"{len(high_urgency)} products at risk of stockout" if len(high_urgency) > 3 else None,
+            f"{len(anomalies)} products with unusual demand patterns" if len(anomalies) > 2 else None,
+            f"{len(low_confidence)} products with low forecast confidence" if len(low_confidence) > 0 else None
+        ],
+        "quick_wins": [
+            f"Order {high_urgency[0]['product_name']} immediately" if high_urgency else None,
+            f"Adjust price for {price_opportunities[0]['product_name']}" if price_opportunities else None,
+            "Review low confidence items for data quality"
+        ]
+    }
+    # Remove None values
+    report_data["risks"] = [r for r in report_data["risks"] if r]
+    report_data["quick_wins"] = [q for q in report_data["quick_wins"] if q]
+    return report_data
+
+
+def llm_report_text(context: dict, lang: str) -> str:
+    """Raw Nova reply for the weekly plan prompt (expected to be JSON)."""
+    system = f"""You are a business advisor for Indian MSME merchants. Generate a weekly action plan in {lang}.
+Be specific, actionable, and prioritize by business impact. Use simple language."""
+
+    user = f"""Generate a weekly action plan based on these insights:
+
+Context:
+- Total products analyzed: {context['total_products']}
+- High urgency reorders needed: {context['high_urgency_reorders']}
+- Products with anomalies: {context['anomaly_products']}
+- Low confidence forecasts: {context['low_confidence_products']}
+- Price optimization opportunities: {context['price_optimization_opportunities']}
+
+Top Reorder Priorities:
+{json.dumps(context['top_reorders'], indent=2)}
+
+Anomalies Detected:
+{json.dumps(context['top_anomalies'], indent=2)}
+
+Price Optimization:
+{json.dumps(context['price_actions'], indent=2)}
+
+Generate a structured report with:
+1. Top 3 Priorities (specific products and actions)
+2. Expected business impact for each priority
+3. Risks and alerts to watch
+4. Quick wins for this week
+
+Format as JSON with keys: priorities (array of {{title, description, impact}}), risks (array of strings), quick_wins (array of strings)"""
+
+    return nova_converse(BEDROCK_MODEL_FAST, system, user)
+
+
+def _envelope(report_data, context, lang, digest, status, summary_text=None):
+    # Add metadata
+    report_data["generated_at"] = datetime.utcnow().isoformat()
+    report_data["language"] = lang
+    report_data["summary_text"] = summary_text
+    return {
+        "report": report_data,
+        "context": context,
+        "digest": digest,
+        "status": status,
+        "updated_at": time.time(),
+        "disclaimer": DISCLAIMER
+    }
+
+
+def load_report(merchant_id: str, digest: str, lang: str):
+    return get_store().get_json(report_key(merchant_id, digest, lang))
+
+
+def save_pending_report(merchant_id: str, insights: dict, digest: str, lang: str) -> dict:
+    """Store the rule-based report for a digest unless something is already stored."""
+    existing = load_report(merchant_id, digest, lang)
+    if existing:
+        return existing
+    index = get_index(insights)
+    entry = _envelope(rule_based_report(index), report_context(index), lang, digest, STATUS_PENDING)
+    store = get_store()
+    store.put_json(_pending_key(merchant_id, digest, lang), {"updated_at": entry["updated_at"]})
+    store.put_json(report_key(merchant_id, digest, lang), entry)
+    return entry
+
+
+def generate_report(merchant_id: str, insights: dict, digest: str, lang: str) -> dict:
+    """Produce the LLM report for a digest (falling back to rules) and store it."""
+    index = get_index(insights)
+    context = report_context(index)
+    raw = None
+    try:
+        raw = llm_report_text(context, lang)
+        entry = _envelope(json.loads(raw), context, lang, digest, STATUS_READY, raw)
+    except Exception as e:
+        # Bedrock failed or the reply wasn't valid JSON: keep the rule-based plan
+        logger.warning(f"LLM weekly report failed for {digest[:12]}, using rule-based report: {str(e)}")
+        entry = _envelope(rule_based_report(index), context, lang, digest, STATUS_FALLBACK, raw)
+    store = get_store()
+    store.put_json(report_key(merchant_id, digest, lang), entry)
+    store.delete(_pending_key(merchant_id, digest, lang))
+    return entry
+
+
+def request_precompute(merchant_id: str, insights: dict, digest: str, lang: str):
+    """
+    Save the pending rule-based report and kick off the LLM version according
+    to WEEKLY_REPORT_PRECOMPUTE: "async" invokes the WeeklyReport Lambda with
+    InvocationType=Event, "thread" runs it in a background thread (local
+    servers), "off" leaves it to the schedule or the first page load.
+    """
+    entry = save_pending_report(merchant_id, insights, digest, lang)
+    if entry["status"] != STATUS_PENDING or WEEKLY_REPORT_PRECOMPUTE == "off":
+        return entry
+
+    try:
+        if WEEKLY_REPORT_PRECOMPUTE == "async" and WEEKLY_REPORT_FUNCTION_NAME:
+            import boto3
+            boto3.client("lambda").invoke(
+                FunctionName=WEEKLY_REPORT_FUNCTION_NAME,
+                InvocationType="Event",
+                Payload=json.dumps({"action": "precompute", "merchant_id": merchant_id, "digest": digest, "language": lang})
+            )
+        elif WEEKLY_REPORT_PRECOMPUTE == "thread":
+            import contextvars
+            import threading
+            threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(generate_report, merchant_id, insights, digest, lang),
+                daemon=True
+            ).start()
+    except Exception as e:
+        logger.warning(f"Could not start weekly report precompute: {str(e)}")
+    return entry
+
+
+def pending_reports(limit: int = 50) -> list:
+    """(merchant_id, digest, lang) for stored reports still waiting on the LLM, from their pending markers."""
+    found = []
+    store = get_store()
+    for key in store.list("reports-pending/"):
+        parts = key.split("/")
+        if len(parts) != 4 or parts[3] not in LANGUAGES:
+            logger.warning(f"Removing malformed pending report marker: {key}")
+            store.delete(key)
+            continue
+        _, merchant_id, digest, lang = parts
+        entry = load_report(merchant_id, digest, lang)
+        if not entry or entry.get("status") != STATUS_PENDING:
+            store.delete(key)  # finished (or removed) without clearing its marker
+            continue
+        found.append((merchant_id, digest, lang))
+        if len(found) >= limit:
+            break
+    return found
@@ -0,0 +1,267 @@
+"""
+Nightly batch: recompute insights and weekly reports for every merchant
+with stored sales history, so the first requests of the day read stored
+results instead of fitting models.
+
+Each merchant goes through generate_insights with "source": "history" (the
+result is stored and becomes the merchant's latest, as for an upload), then
+the weekly report for each of BATCH_LANGUAGES is generated unless a finished
+one is already stored for that digest. A merchant whose history generation
+and latest digest haven't changed since their last batch is skipped
+("unchanged"); pass force to recompute anyway.
+
+BATCH_CONCURRENCY merchants run at once. Under Lambda, no merchant is
+started within BATCH_TIME_MARGIN_SEC of the timeout; the function then
+invokes itself (BATCH_FUNCTION_NAME) to continue after the last merchant it
+started, so a run of any size finishes in parts. Every part's report (counts
+per status, throughput, per-merchant seconds and the projected time for the
+whole run) is stored under batch/runs/<run_id>/ and as batch/latest.json.
+
+Local runner:
+
+    python -m handlers.batch_precompute --concurrency 8
+    python -m handlers.batch_precompute --merchants demo,shop-2 --force --json batch-report.json
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from common.config import BATCH_CONCURRENCY, BATCH_LANGUAGES, BATCH_TIME_MARGIN_SEC, BATCH_FUNCTION_NAME
+from common.admission import as_tenant
+from common.history_store import open_history, merchants
+from common.insights_store import load_insights, latest_digest
+from common.request_context import safe_id
+from common.storage import get_store
+from common.instrumentation import instrumented
+from common import weekly_reports
+from handlers import generate_insights
+
+logger = logging.getLogger()
+
+STATUS_COMPUTED = "computed"
+STATUS_UNCHANGED = "unchanged"
+STATUS_EMPTY = "empty"  # listed, but the history has no rows
+STATUS_FAILED = "failed"
+
+MAX_REPORTED_FAILURES = 20
+
+
+class BatchError(Exception):
+    """A merchant's insights could not be recomputed."""
+
+
+def _state_key(merchant: str) -> str:
+    return f"batch/merchants/{merchant}.json"
+
+
+def _insights_event(merchant: str, lang: str) -> dict:
+    # "batch" can't come from API Gateway; generate_insights then leaves the weekly reports to us
+    return {"headers": {"X-Merchant-Id": merchant},
+            "body": json.dumps({"source": "history", "language": lang}),
+            "batch": True}
+
+
+def precompute_merchant(merchant: str, languages: list = BATCH_LANGUAGES, force: bool = False) -> dict:
+    """Recompute one merchant; returns its record for the run report (never raises)."""
+    started = time.perf_counter()
+    record = {"merchant": merchant}
+    store = get_store()
+    try:
+        with as_tenant(merchant):
+            history = open_history(merchant)
+            if history is None:
+                record["status"] = STATUS_EMPTY
+                return record
+            generation = history.manifest["generation"]
+            state = store.get_json(_state_key(merchant))
+            digest = latest_digest(merchant)
+
+            if not force and state and state["generation"] == generation and state["digest"] == digest:
+                record["status"] = STATUS_UNCHANGED
+            else:
+                response = generate_insights.lambda_handler(_insights_event(merchant, languages[0]), None)
+                body = json.loads(response["body"])
+                if response["statusCode"] != 200:
+                    raise BatchError(body.get("message") or f"generate_insights returned {response['statusCode']}")
+                digest = body["report_digest"]
+                if not digest:
+                    raise BatchError("insights could not be stored")
+                forecasting = body["quality_report"]["forecasting"]
+                record.update(status=STATUS_COMPUTED, products=body["quality_report"]["total_products"],
+                              rows=body["quality_report"]["total_records"], model_fits=forecasting["model_fits"])
+
+            insights, reports = None, 0
+            for lang in languages:
+                entry = weekly_reports.load_report(merchant, digest, lang)
+                if entry is None or entry["status"] == weekly_reports.STATUS_PENDING:
+                    insights = insights or load_insights(merchant, digest)
+                    weekly_reports.generate_report(merchant, insights, digest, lang)
+                    reports += 1
+            record["reports"] = reports
+            store.put_json(_state_key(merchant), {"generation": generation, "digest": digest, "updated_at": time.time()})
+    except Exception as e:
+        logger.warning(f"Batch precompute failed for {merchant}: {str(e)}")
+        record.update(status=STATUS_FAILED, error=str(e))
+    finally:
+        record["seconds"] = round(time.perf_counter() - started, 2)
+    return record
+
+
+class Progress:
+    """Collects merchant records, logs each one with rate and ETA, and builds the run report."""
+
+    def __init__(self, total: int, concurrency: int, on_record=None):
+        self.total = total
+        self.concurrency = concurrency
+        self.records = []
+        self.started = time.perf_counter()
+        self.on_record = on_record
+
+    def add(self, record: dict):
+        self.records.append(record)
+        done, elapsed = len(self.records), time.perf_counter() - self.started
+        eta = elapsed / done * (self.total - done)
+        logger.info(f"batch {done}/{self.total} {record['merchant']}: {record['status']} in {record['seconds']:.1f}s "
+                    f"({done / elapsed * 60:.1f} merchants/min, eta {eta:.0f}s)")
+        if self.on_record:
+            self.on_record(record, self)
+
+    def report(self) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        done = len(self.records)
+        statuses = Counter(r["status"] for r in self.records)
+        totals = {k: sum(r.get(k, 0) for r in self.records) for k in ("products", "rows", "model_fits", "reports")}
+        seconds = sorted(r["seconds"] for r in self.records)
+        return {
+            "merchants": self.total,
+            "processed": done,
+            "remaining": self.total - done,
+            "concurrency": self.concurrency,
+            "elapsed_sec": round(elapsed, 2),
+            "statuses": dict(statuses),
+            **totals,
+            "throughput": {
+                "merchants_per_min": round(done / elapsed * 60, 2),
+                "products_per_sec": round(totals["products"] / elapsed, 2),
+                "rows_per_sec": round(totals["rows"] / elapsed, 1),
+            },
+            "merchant_seconds": {
+                "p50": statistics.median(seconds) if seconds else 0,
+                "p95": seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))] if seconds else 0,
+                "max": seconds[-1] if seconds else 0,
+            },
+            # What this part's rate means for all the merchants it was given
+            "projected_sec": round(elapsed / done * self.total, 1) if done else None,
+            "failures": [{"merchant": r["merchant"], "error": r["error"]}
+                         for r in self.records if r["status"] == STATUS_FAILED][:MAX_REPORTED_FAILURES],
+        }
+
+
+def run(merchant_ids: list = None, concurrency: int = BATCH_CONCURRENCY, languages: list = BATCH_LANGUAGES,
+        force: bool = False, start_after: str = None, time_left=None, on_record=None) -> dict:
+    """
+    Precompute merchant_ids (default: every merchant with stored history) in
+    name order, after start_after. time_left() returns the seconds left;
+    no merchant is started once it is under BATCH_TIME_MARGIN_SEC and
+    next_start_after in the report is then where to continue.
+    """
+    todo = sorted(merchant_ids) if merchant_ids is not None else merchants()
+    if start_after:
+        todo = [m for m in todo if m > start_after]
+    concurrency = max(1, int(concurrency))
+    progress = Progress(len(todo), concurrency, on_record)
+    started = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        running = set()
+        for merchant in todo:
+            if len(running) >= concurrency:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    progress.add(f.result())
+            if time_left is not None and time_left() < BATCH_TIME_MARGIN_SEC:
+                break
+            running.add(pool.submit(precompute_merchant, merchant, languages, force))
+            started.append(merchant)
+        for f in wait(running).done:
+            progress.add(f.result())
+
+    report = progress.report()
+    report["languages"] = list(languages)
+    report["next_start_after"] = started[-1] if len(started) < len(todo) else None
+    report["results"] = progress.records
+    return report
+
+
+def _save_report(report: dict, run_id: str, part: int):
+    store = get_store()
+    summary = {k: v for k, v in report.items() if k != "results"}
+    store.put_json(f"batch/runs/{run_id}/{part:03d}.json", report)
+    store.put_json("batch/latest.json", {"run_id": run_id, "part": part, "finished_at": time.time(), **summary})
+
+
+def _continue(run_id: str, part: int, start_after: str, force: bool):
+    import boto3
+    boto3.client("lambda").invoke(
+        FunctionName=BATCH_FUNCTION_NAME,
+        InvocationType="Event",
+        Payload=json.dumps({"action": "continue", "run_id": run_id, "part": part,
+                            "start_after": start_after, "force": force})
+    )
+
+
+@instrumented("batch_precompute")
+def lambda_handler(event, context):
+    """
+    Scheduled (EventBridge) runs start at the first merchant; {"action":
+    "continue", "run_id", "part", "start_after"} events are this function
+    continuing its own run. {"force": true} recomputes unchanged merchants.
+    """
+    run_id = safe_id(event.get("run_id") or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()))
+    part = int(event.get("part", 0))
+    force = bool(event.get("force"))
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    time_left = (lambda: get_remaining() / 1000.0) if get_remaining else None
+
+    report = run(force=force, start_after=event.get("start_after"), time_left=time_left)
+    _save_report(report, run_id, part)
+    if report["next_start_after"]:
+        if BATCH_FUNCTION_NAME:
+            _continue(run_id, part + 1, report["next_start_after"], force)
+        else:
+            logger.warning(f"Batch {run_id} stopped after {report['next_start_after']}; no BATCH_FUNCTION_NAME to continue")
+    return {"run_id": run_id, "part": part,
+            **{k: report[k] for k in ("merchants", "processed", "statuses", "elapsed_sec", "next_start_after")}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--merchants", help="comma-separated merchant IDs (default: all with stored history)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--languages", default=",".join(BATCH_LANGUAGES))
+    parser.add_argument("--force", action="store_true", help="recompute merchants whose history hasn't changed")
+    parser.add_argument("--json", help="write the full report (with per-merchant records) to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    report = run(merchant_ids=args.merchants.split(",") if args.merchants else None,
+                 concurrency=args.concurrency, languages=args.languages.split(","), force=args.force)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    rate, secs = report["throughput"], report["merchant_seconds"]
+    print(f"\n{report['processed']} merchants in {report['elapsed_sec']:.1f}s at concurrency {report['concurrency']}: "
+          + ", ".join(f"{n} {s}" for s, n in sorted(report["statuses"].items())))
+    print(f"{rate['merchants_per_min']:.1f} merchants/min, {rate['products_per_sec']:.1f} products/s, "
+          f"{rate['rows_per_sec']:.0f} rows/s; per merchant p50 {secs['p50']:.1f}s, p95 {secs['p95']:.1f}s, max {secs['max']:.1f}s")
+    for failure in report["failures"]:
+        print(f"failed {failure['merchant']}: {failure['error']}")
+
+
+if __name__ == "__main__":
+    main()
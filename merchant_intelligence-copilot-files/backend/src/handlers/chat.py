@@ -6,15 +6,27 @@ Uses Bedrock Nova for intelligent responses based on insights data
 import json
 import logging
 from typing import Dict, Any
-from common.responses import ok, bad
-from common.config import BEDROCK_MODEL_FAST
+from common.responses import ok, bad, content_encoding
+from common.config import BEDROCK_MODEL_FAST, CHAT_SALES_TOOL
 from common.bedrock_nova import nova_converse
 from common.validators import validate_prompt_injection
+from common.request_context import merchant_id
+from common.insights_index import get_index, InsightsIndex
+from common import sessions
+from common.insights_store import save_insights, resolve_insights
+from common.sales_query import sales_engine, format_result, TOOL_SPEC
+from common.admission import admit
+from common.instrumentation import instrumented, span
+from common.profiling import profiled, annotate
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+@content_encoding
+@profiled("chat")
+@instrumented("chat")
+@admit(cost=1)
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Handle chat requests with LLM-powered responses.
@@ -23,8 +35,14 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     {
         "message": "Which products should I order?",
         "language": "en",  # Optional: "en", "hi", "mr"
-        "insights": {...}  # Optional: current insights data for context
+        "insights": {...},  # Optional: current insights data for context
+        "session_id": "..."  # Optional: continue a server-side session (null starts one)
     }
+    
+    With a session, insights only need to be sent once; later turns reuse the
+    stored copy and the conversation history kept on the server. Questions
+    about past sales are answered with exact figures from the merchant's
+    stored sales history (uploads sent with save_history).
     """
     try:
         # Parse request body
@@ -42,6 +60,24 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         logger.info(f"Chat request - Message: {message[:100]}, Language: {language}")
         
+        if insights:
+            # A projected/paged generate_insights response stands for its stored result
+            insights = resolve_insights(merchant_id(event, body), insights)
+        
+        # Server-side session (opt-in by sending session_id, even as null)
+        session = None
+        if 'session_id' in body:
+            with span("session_load"):
+                session = sessions.load_session(merchant_id(event, body), body.get('session_id'))
+            if insights:
+                session['insights_digest'] = save_insights(session['merchant_id'], insights)
+            elif session.get('is_new') and body.get('session_id'):
+                # Unknown/expired session: ask the client to resend its insights instead of answering blind
+                return ok({'session_id': session['session_id'], 'session_created': True, 'insights_required': True})
+            else:
+                with span("session_insights"):
+                    insights = sessions.session_insights(session)
+        
         # Log insights data structure for debugging
         if insights:
             if 'insights' in insights and isinstance(insights['insights'], dict):
@@ -56,52 +92,64 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             logger.info("No insights data provided")
         
         # Generate LLM response with context
-        response_text = generate_llm_response(message, language, insights)
+        with span("respond"):
+            response_text = generate_llm_response(message, language, insights, session, merchant_id(event, body))
         
-        return ok({
+        result = {
             'response': response_text,
             'language': language,
             'disclaimer': 'AI-assisted insights. Review with your business knowledge.'
-        })
+        }
+        if session is not None:
+            result['session_id'] = session['session_id']
+            result['session_created'] = session.get('is_new', False)
+            with span("session_save"):
+                sessions.add_turn(session, message, response_text)
+                sessions.save_session(session)
+        
+        return ok(result)
         
     except Exception as e:
         logger.error(f"Error in chat handler: {str(e)}", exc_info=True)
         return bad(f"Error processing chat request: {str(e)}")
 
 
-def generate_llm_response(message: str, language: str, insights: Dict = None) -> str:
+def generate_llm_response(message: str, language: str, insights: Dict = None, session: Dict = None,
+                          merchant: str = None) -> str:
     """
     Generate LLM-powered responses with business context.
     """
-    import time
-    start_time = time.time()
-    
     message_lower = message.lower()
     logger.info(f"Processing message: '{message_lower}'")
     
-    # Check if insights data is available and extract products
-    products = []
-    if insights:
-        # Handle nested structure: insights.insights.products or insights.products
-        if 'insights' in insights and isinstance(insights['insights'], dict):
-            products = insights['insights'].get('products', [])
-        elif 'products' in insights:
-            products = insights.get('products', [])
+    # Handles both nested (insights.insights.products) and flat (insights.products) payloads,
+    # reusing the index emitted by generate_insights when present
+    with span("index"):
+        index = get_index(insights)
+    annotate(products=len(index.products), history_turns=len((session or {}).get("history", [])))
     
-    if not products:
-        logger.info(f"No products found, using LLM for general business advice (took {time.time() - start_time:.3f}s)")
-        return get_no_data_response(language, message)
+    # Query engine over the stored sales history, when the merchant has one
+    engine = None
+    if merchant:
+        with span("sales_history"):
+            engine = sales_engine(merchant)
     
-    logger.info(f"Found {len(products)} products")
+    if not index.products and engine is None:
+        logger.info("No products found, using LLM for general business advice")
+        return get_no_data_response(language, message, session)
     
-    high_urgency = [p for p in products if p.get('reorder', {}).get('urgency') == 'high']
-    medium_urgency = [p for p in products if p.get('reorder', {}).get('urgency') == 'medium']
-    anomalies = [p for p in products if p.get('anomalies') and len(p['anomalies']) > 0]
-    low_confidence = [p for p in products if p.get('confidence_score', 100) < 60]
+    logger.info(f"Found {len(index.products)} products")
     
     # Use LLM for all queries with business context
-    logger.info(f"Using LLM for response (took {time.time() - start_time:.3f}s so far)")
-    return generate_llm_complex_response(message, language, products, high_urgency, anomalies)
+    logger.info("Using LLM for response")
+    return generate_llm_complex_response(message, language, index, session, engine)
+
+
+def conversation_context(session: Dict = None) -> str:
+    """System prompt addition carrying the rolling summary of older turns."""
+    if not session or not session.get('summary'):
+        return ""
+    return f"\n\nEarlier in this conversation (summary):\n{session['summary']}"
 
 
 def generate_reorder_response(high_urgency: list, medium_urgency: list, language: str) -> str:
@@ -152,30 +200,27 @@ def generate_reorder_response(high_urgency: list, medium_urgency: list, language
         return response
 
 
-def generate_top_products_response(products: list, language: str) -> str:
+def generate_top_products_response(index: InsightsIndex, language: str) -> str:
     """Fast response for top products questions"""
-    sorted_products = sorted(products, key=lambda p: sum([f.get('yhat', 0) for f in p.get('forecast', [])]), reverse=True)[:5]
+    top_products = index.top_by_forecast(5)
     
     if language == 'en':
         response = "🔝 Top Selling Products:\n\n"
-        for i, p in enumerate(sorted_products, 1):
-            forecast_sum = sum([f.get('yhat', 0) for f in p.get('forecast', [])])
+        for i, (p, forecast_sum) in enumerate(top_products, 1):
             response += f"{i}. {p['product_name']} - {forecast_sum:.0f} units (7-day forecast)\n"
         response += "\n💡 Tip: Keep higher stock levels for these products to avoid stockouts."
         return response
     
     elif language == 'hi':
         response = "🔝 सबसे ज़्यादा बिकने वाले उत्पाद:\n\n"
-        for i, p in enumerate(sorted_products, 1):
-            forecast_sum = sum([f.get('yhat', 0) for f in p.get('forecast', [])])
+        for i, (p, forecast_sum) in enumerate(top_products, 1):
             response += f"{i}. {p['product_name']} - {forecast_sum:.0f} यूनिट (7-दिन का पूर्वानुमान)\n"
         response += "\n💡 सुझाव: स्टॉकआउट से बचने के लिए इन उत्पादों का अधिक स्टॉक रखें।"
         return response
     
     else:  # Marathi
         response = "🔝 सर्वाधिक विक्री होणारी उत्पादने:\n\n"
-        for i, p in enumerate(sorted_products, 1):
-            forecast_sum = sum([f.get('yhat', 0) for f in p.get('forecast', [])])
+        for i, (p, forecast_sum) in enumerate(top_products, 1):
             response += f"{i}. {p['product_name']} - {forecast_sum:.0f} युनिट (7-दिवसांचा अंदाज)\n"
         response += "\n💡 टीप: स्टॉकआउट टाळण्यासाठी या उत्पादनांचा जास्त स्टॉक ठेवा."
         return response
@@ -220,10 +265,12 @@ def generate_alerts_response(anomalies: list, language: str) -> str:
         return response
 
 
-def generate_forecast_response(products: list, language: str) -> str:
+def generate_forecast_response(index: InsightsIndex, language: str) -> str:
     """Fast response for forecast questions"""
-    total_forecast = sum([sum([f.get('yhat', 0) for f in p.get('forecast', [])]) for p in products])
-    avg_confidence = sum([p.get('confidence_score', 0) for p in products]) / len(products) if products else 0
+    products = index.products
+    total_forecast = index.totals['forecast_units']
+    avg_confidence = index.totals['avg_confidence']
+    top_products = index.top_by_forecast(3)
     
     if language == 'en':
         response = f"📊 7-Day Forecast Summary:\n\n"
@@ -231,9 +278,7 @@ def generate_forecast_response(products: list, language: str) -> str:
         response += f"• Average confidence: {avg_confidence:.0f}%\n"
         response += f"• Products analyzed: {len(products)}\n\n"
         response += "Top 3 products by forecast:\n"
-        sorted_products = sorted(products, key=lambda p: sum([f.get('yhat', 0) for f in p.get('forecast', [])]), reverse=True)[:3]
-        for i, p in enumerate(sorted_products, 1):
-            forecast_sum = sum([f.get('yhat', 0) for f in p.get('forecast', [])])
+        for i, (p, forecast_sum) in enumerate(top_products, 1):
             response += f"{i}. {p['product_name']} - {forecast_sum:.0f} units\n"
         return response
     
@@ -243,9 +288,7 @@ def generate_forecast_response(products: list, language: str) -> str:
         response += f"• औसत विश्वास: {avg_confidence:.0f}%\n"
         response += f"• विश्लेषित उत्पाद: {len(products)}\n\n"
         response += "पूर्वानुमान के अनुसार शीर्ष 3 उत्पाद:\n"
-        sorted_products = sorted(products, key=lambda p: sum([f.get('yhat', 0) for f in p.get('forecast', [])]), reverse=True)[:3]
-        for i, p in enumerate(sorted_products, 1):
-            forecast_sum = sum([f.get('yhat', 0) for f in p.get('forecast', [])])
+        for i, (p, forecast_sum) in enumerate(top_products, 1):
             response += f"{i}. {p['product_name']} - {forecast_sum:.0f} यूनिट\n"
         return response
     
@@ -255,16 +298,16 @@ def generate_forecast_response(products: list, language: str) -> str:
         response += f"• सरासरी आत्मविश्वास: {avg_confidence:.0f}%\n"
         response += f"• विश्लेषित उत्पादने: {len(products)}\n\n"
         response += "अंदाजानुसार शीर्ष 3 उत्पादने:\n"
-        sorted_products = sorted(products, key=lambda p: sum([f.get('yhat', 0) for f in p.get('forecast', [])]), reverse=True)[:3]
-        for i, p in enumerate(sorted_products, 1):
-            forecast_sum = sum([f.get('yhat', 0) for f in p.get('forecast', [])])
+        for i, (p, forecast_sum) in enumerate(top_products, 1):
             response += f"{i}. {p['product_name']} - {forecast_sum:.0f} युनिट\n"
         return response
 
 
-def generate_confidence_response(low_confidence: list, all_products: list, language: str) -> str:
+def generate_confidence_response(index: InsightsIndex, language: str) -> str:
     """Fast response for confidence/accuracy questions"""
-    avg_confidence = sum([p.get('confidence_score', 0) for p in all_products]) / len(all_products) if all_products else 0
+    low_confidence = index.low_confidence
+    all_products = index.products
+    avg_confidence = index.totals['avg_confidence']
     
     if language == 'en':
         response = f"📈 Forecast Confidence Report:\n\n"
@@ -312,10 +355,14 @@ def generate_confidence_response(low_confidence: list, all_products: list, langu
         return response
 
 
-def generate_llm_complex_response(message: str, language: str, products: list, high_urgency: list, anomalies: list) -> str:
+def generate_llm_complex_response(message: str, language: str, index: InsightsIndex, session: Dict = None,
+                                   engine=None) -> str:
     """Use LLM with rich business context for intelligent responses"""
     
     logger.info("Generating LLM response with business context")
+    products = index.products
+    high_urgency = index.high_urgency
+    anomalies = index.anomalies
     
     lang_instruction = {
         'en': 'Respond in English',
@@ -324,7 +371,7 @@ def generate_llm_complex_response(message: str, language: str, products: list, h
     }.get(language, 'Respond in English')
     
     # Build rich context with product details
-    top_products = sorted(products, key=lambda p: sum([f.get('yhat', 0) for f in p.get('forecast', [])]), reverse=True)[:5]
+    top_products = index.top_by_forecast(3)
     
     context_parts = [
         f"Total products analyzed: {len(products)}",
@@ -338,7 +385,21 @@ def generate_llm_complex_response(message: str, language: str, products: list, h
     if anomalies:
         context_parts.append(f"\nProducts with alerts: {', '.join([p['product_name'] for p in anomalies[:3]])}")
     
-    context_parts.append(f"\nTop selling products (7-day forecast): {', '.join([p['product_name'] + f' ({sum([f.get('yhat', 0) for f in p.get('forecast', [])]):.0f} units)' for p in top_products[:3]])}")
+    context_parts.append(f"\nTop selling products (7-day forecast): {', '.join([p['product_name'] + f' ({units:.0f} units)' for p, units in top_products])}")
+    
+    # Past-sales questions get exact figures: from the router when it recognises the
+    # question, otherwise the model may ask for them with the sales_query tool
+    figures, tools, tool_handler, tool_guideline = None, None, None, ""
+    if engine is not None:
+        query = engine.parse_question(message)
+        if query is not None:
+            with span("sales_query"):
+                figures = engine.run(query)
+            context_parts.append(f"\nExact figures from sales history (quote these, do not estimate):\n{format_result(figures)}")
+        elif CHAT_SALES_TOOL:
+            tools, tool_handler = [TOOL_SPEC], engine.run_tool
+            tool_guideline = ("\n- For questions about past sales (units, revenue, which day or product sold most), "
+                              "call the sales_query tool and quote its exact figures instead of estimating")
     
     context = "\n".join(context_parts)
     
@@ -351,7 +412,7 @@ Guidelines:
 - Use emojis appropriately (📦 for orders, 🔝 for top products, ⚠️ for alerts, 📊 for forecasts)
 - Keep responses concise but informative (3-5 sentences)
 - Focus on business impact and next steps
-- Use simple language suitable for small business owners"""
+- Use simple language suitable for small business owners{tool_guideline}{conversation_context(session)}"""
     
     user = f"""Business Context:
 {context}
@@ -361,10 +422,14 @@ Merchant Question: {message}
 Provide a helpful, actionable response based on the data."""
     
     try:
-        response = nova_converse(BEDROCK_MODEL_FAST, system, user)
+        response = nova_converse(BEDROCK_MODEL_FAST, system, user, history=sessions.prompt_history(session),
+                                 tools=tools, tool_handler=tool_handler)
         return response
     except Exception as e:
         logger.error(f"LLM generation failed: {str(e)}")
+        if figures is not None:
+            # The exact figures are the answer; the LLM would only have phrased them
+            return f"📊 {format_result(figures)}"
         # Fallback to helpful menu
         if language == 'en':
             return f"""I can help you with:
@@ -397,7 +462,7 @@ You have {len(products)} products analyzed with {len(high_urgency)} high priorit
 तुमच्याकडे {len(products)} उत्पादने विश्लेषित आहेत ज्यात {len(high_urgency)} उच्च प्राधान्य पुन्हा ऑर्डर आणि {len(anomalies)} अलर्ट आहेत।"""
 
 
-def get_no_data_response(language: str, message: str) -> str:
+def get_no_data_response(language: str, message: str, session: Dict = None) -> str:
     """
     Response when no insights data is available.
     Uses LLM to answer general business questions.
@@ -429,7 +494,7 @@ Topics you can help with:
 - Business growth tips
 - Marketing for small businesses
 - Cash flow management
-- Seasonal planning"""
+- Seasonal planning{conversation_context(session)}"""
     
     user = f"""The merchant hasn't uploaded their sales data yet, so I don't have specific product information.
 
@@ -438,7 +503,7 @@ Merchant Question: {message}
 Provide helpful general business advice. If the question requires specific data analysis, politely suggest they upload their sales data."""
     
     try:
-        response = nova_converse(BEDROCK_MODEL_FAST, system, user)
+        response = nova_converse(BEDROCK_MODEL_FAST, system, user, history=sessions.prompt_history(session))
         
         # Add a gentle reminder about uploading data for personalized insights
         if language == 'en':
@@ -1,15 +1,35 @@
 import json, io
 import pandas as pd
-import numpy as np
-from common.responses import ok, bad
+from common.responses import ok, bad, resp, content_encoding
 from common.validators import validate_csv_columns
-from common.forecasting import prophet_forecast
+from common.inventory import parse_inventory, inventory_from_frame, simulate, reorder_logic, InventoryError
+from common.history_store import open_history, append as append_history
+from common.data_quality import parse_frame, validate_rows, robust_outliers, NUMERIC_COLUMNS
+from common.forecasting import fit_forecaster, check_horizon, check_samples
+from common.forecast_inputs import save_inputs
+from common.hierarchy import split_catalog, top_down_forecasts, check_mode
+from common.forecast_format import head, convert, yhat_values, check_format
 from common.insights import detect_anomalies, reorder_recommendation, simple_price_hint, generate_demand_reasoning
-from common.config import BEDROCK_MODEL_FAST
+from common.config import BEDROCK_MODEL_FAST, EXPLANATIONS_ENABLED, EXPLAIN_BATCH_SIZE, FORECAST_FORMAT, FORECAST_MODE, FORECAST_HORIZON, INVENTORY_LEAD_TIME_DAYS, RATE_LIMIT_BURST
 from common.bedrock_nova import nova_converse
+from common.explanations import explain_products, remaining_seconds
+from common.insights_index import build_insights_index, InsightsIndex
+from common.admission import admit, take_budget
+from common.request_context import merchant_id, is_anonymous
+from common.insights_store import save_insights
+from common.insights_view import view_options, page, ViewError
+from common.weekly_reports import request_precompute, check_language
+from common.instrumentation import instrumented, span
+from common.profiling import profiled, annotate
 
 DISCLAIMER = "AI‑assisted insights to support smarter business decisions."
+STOCK_HORIZON = 30  # days of demand the inventory simulation gets, whatever the response horizon
 
+# Forecasting is not rate limited; opt-in explanations are charged below, per LLM call
+@content_encoding
+@profiled("generate_insights")
+@instrumented("generate_insights")
+@admit(cost=0)
 def lambda_handler(event, context):
     try:
         payload = json.loads(event.get("body") or "{}")
@@ -17,96 +37,204 @@ def lambda_handler(event, context):
         return bad("Invalid JSON body")
 
     csv_text = payload.get("csv_text")
-    if not csv_text:
-        return bad("Provide csv_text in request body for prototype demo")
+    use_history = payload.get("source") == "history"
+    if not csv_text and not use_history:
+        return bad("Provide csv_text in request body for prototype demo, or \"source\": \"history\" to use stored sales history")
+    merchant = merchant_id(event, payload)
+    # History is per merchant: without an ID, every client's uploads would land in one shared history
+    if (use_history or payload.get("save_history")) and is_anonymous(merchant):
+        return bad("save_history and \"source\": \"history\" need a merchant ID (X-Merchant-Id header or merchant_id)")
 
-    # Parse and validate CSV
+    # Optional field projection / pagination of the returned products
     try:
-        df = pd.read_csv(io.StringIO(csv_text))
-    except Exception as e:
-        return bad(f"Failed to parse CSV: {str(e)}")
-    
-    # Normalize column names to lowercase
-    df.columns = df.columns.str.strip().str.lower()
-    
-    missing = validate_csv_columns(df.columns)
-    if missing:
-        return bad("Missing required columns", {"missing_columns": missing})
-
-    # Data cleaning and preprocessing
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.dropna(subset=["date", "product_name"])
-    df["product_name"] = df["product_name"].astype(str).str.strip().str.title()
-    
-    for c in ["quantity_sold", "price", "revenue"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
+        view = view_options(payload)
+    except ViewError as e:
+        return bad(str(e))
+    if view and view["digest"]:
+        return bad("cursor is for GET /insights/products; generate_insights returns the first page")
+    try:
+        forecast_format = check_format(payload.get("forecast_format", FORECAST_FORMAT))
+        lang = check_language(payload.get("language", "en"))
+        forecast_mode = check_mode(payload.get("forecast_mode", FORECAST_MODE))
+        horizon = check_horizon(payload.get("horizon", FORECAST_HORIZON))
+        samples = check_samples(payload.get("uncertainty_samples"))
+        inventory = parse_inventory(payload.get("inventory"))
+    except ValueError as e:
+        return bad(str(e))
+
+    if use_history:
+        # Stored history is already cleaned and one row per product per day
+        with span("history"):
+            history = open_history(merchant)
+            if history is None:
+                return resp(404, {"error": "NotFound", "message": "No stored sales history. Upload csv_text with \"save_history\": true first."})
+            df = history.frame(payload.get("history_days"))
+        data_quality = {"source": "history", "rows_checked": len(df)}
+    else:
+        # Parse and validate CSV
+        try:
+            with span("parse"):
+                df = pd.read_csv(io.StringIO(csv_text))
+        except Exception as e:
+            return bad(f"Failed to parse CSV: {str(e)}")
+        
+        # Normalize column names to lowercase
+        df.columns = df.columns.str.strip().str.lower()
+        
+        missing = validate_csv_columns(df.columns)
+        if missing:
+            return bad("Missing required columns", {"missing_columns": missing})
+
+        # Data cleaning and preprocessing
+        with span("clean"):
+            parsed = parse_frame(df)
+        
+        # Report what cleaning drops or zero-fills before doing it
+        with span("validate"):
+            data_quality = validate_rows(df, parsed)
+        
+        with span("clean"):
+            df = parsed.dropna(subset=["date", "product_name"])
+            df = df.fillna({c: 0 for c in NUMERIC_COLUMNS})
+        
+        # Keep the cleaned rows server-side so later runs can use "source": "history"
+        if payload.get("save_history"):
+            with span("history"):
+                data_quality["history_rows"] = append_history(merchant, df)["rows"]
+    annotate(rows=len(df), products=int(df["product_name"].nunique()), days=int(df["date"].nunique()))
     
-    # Remove extreme outliers using Z-score (threshold > 4) - more lenient
-    # Only remove outliers if we have enough data
-    if len(df) > 50:
-        from scipy import stats
-        for col in ["quantity_sold", "price"]:
-            if df[col].std() > 0:  # Only if there's variation
-                z_scores = np.abs(stats.zscore(df[col]))
-                df = df[z_scores < 4]  # Changed from 3 to 4 for more lenient filtering
+    # Remove extreme outliers per product (median/MAD), so each product is judged against its own history
+    with span("outliers"):
+        keep, outliers = robust_outliers(df)
+        df = df[keep]
+    data_quality["outliers_removed"] = outliers
 
     results = {"products": [], "disclaimer": DISCLAIMER}
-    lang = payload.get("language", "en")
+    forecasts = {}  # product -> horizon-day columnar forecast, for the inventory simulation
+    models = {}  # product -> fitted model; its inputs are stored for longer forecasts on demand (see forecast_inputs.py)
+    fit = lambda frame: fit_forecaster(frame, samples)
+    try:
+        # Stock from the request wins over current_stock / lead_time_days columns in the CSV
+        inventory = {**inventory_from_frame(df), **inventory}
+    except InventoryError as e:
+        return bad(str(e))
+
+    # Hierarchical mode: models for the best sellers and per-category totals only, the long tail forecast top-down
+    top_down, group_models = {}, {}
+    if forecast_mode == "hierarchical":
+        with span("hierarchy"):
+            head_products, daily_matrix = split_catalog(df)
+            top_down, group_models = top_down_forecasts(df, fit, days=horizon,
+                                                        head=head_products, daily=daily_matrix)
+    model_fits = len(group_models)
 
     # Process each product - OPTIMIZED for speed
-    for product in sorted(df["product_name"].unique()):
-        p = df[df["product_name"] == product].copy()
+    for product, p in df.groupby("product_name", sort=True):
         daily = p.groupby("date", as_index=False)["quantity_sold"].sum()
+        planned = top_down.get(product)
         
-        # Skip products with insufficient data (need at least 7 days)
-        if len(daily) < 7:
+        # Skip products with insufficient data (need at least 7 days) unless forecast top-down
+        if planned is None and len(daily) < 7:
             continue
         
         try:
-            # Generate forecast using Prophet (with moving average fallback)
-            forecast30, conf = prophet_forecast(
-                daily.rename(columns={"date": "date", "quantity_sold": "quantity_sold"}),
-                days=30
-            )
-            forecast7 = forecast30[:7]
+            if planned is not None:
+                forecast_h, conf = planned["forecast"], planned["confidence"]
+                models[product] = planned["model"]
+            else:
+                # Generate forecast using Prophet (with moving average fallback)
+                with span("forecast", product=product):
+                    models[product] = fit(daily)
+                    forecast_h, conf = models[product].predict(horizon)
+                model_fits += 1
+            forecast7 = head(forecast_h, 7)
+            forecasts[product] = forecast_h
             
             # Detect anomalies
-            anomalies = detect_anomalies(p)
-            
-            # Generate reorder recommendation
-            reorder_qty, urgency = reorder_recommendation(forecast7)
+            with span("anomalies", product=product):
+                anomalies = detect_anomalies(p)
             
-            # Price optimization hint
-            price_hint = simple_price_hint(p)
+            with span("rules", product=product):
+                # Generate reorder recommendation (replaced by the stock-aware one below when stock is known)
+                reorder_qty, urgency = reorder_recommendation(forecast7)
+                
+                # Price optimization hint
+                price_hint = simple_price_hint(p)
+                
+                # Generate demand reasoning (rule-based baseline)
+                demand_reasoning = generate_demand_reasoning(p, forecast7, anomalies)
             
-            # Generate demand reasoning (rule-based baseline)
-            demand_reasoning = generate_demand_reasoning(p, forecast7, anomalies)
-            
-            # Skip LLM explanation for speed - use rule-based reasoning instead
+            # LLM explanations are filled in afterwards in batches (opt-in)
             llm_explanation = None
             
+            if planned is not None:
+                confidence_explanation = (f"Confidence score of {conf}% from the '{planned['group']}' group forecast, "
+                                          f"of which this product is {planned['share'] * 100:.1f}% of recent sales "
+                                          f"({len(daily)} days of history).")
+            else:
+                confidence_explanation = f"Confidence score of {conf}% based on forecast accuracy, data quality ({len(daily)} days of history), and prediction interval width."
+            
             results["products"].append({
                 "product_name": product,
-                "forecast": forecast7,
-                "forecast_30d": forecast30,
+                "revenue_total": round(float(p["revenue"].sum()), 2),
+                "forecast": convert(forecast7, forecast_format),
+                # The full horizon (name kept from the fixed 30 days); longer ones via GET /insights/forecast
+                **({"forecast_30d": convert(forecast_h, forecast_format)} if horizon > 7 else {}),
                 "confidence_score": conf,
                 "anomalies": anomalies,
                 "reorder": {"quantity": reorder_qty, "urgency": urgency},
                 "price_hint": price_hint,
                 "demand_reasoning": demand_reasoning,
                 "llm_explanation": llm_explanation,
-                "reorder_logic": f"Recommended quantity: {reorder_qty} units. Based on 7-day forecast ({sum([f['yhat'] for f in forecast7]):.1f} units) plus 20% safety stock.",
-                "confidence_explanation": f"Confidence score of {conf}% based on forecast accuracy, data quality ({len(daily)} days of history), and prediction interval width."
+                "reorder_logic": f"Recommended quantity: {reorder_qty} units. Based on 7-day forecast ({sum(yhat_values(forecast7)):.1f} units) plus 20% safety stock.",
+                "confidence_explanation": confidence_explanation,
+                **({"forecast_group": planned["group"], "forecast_share": planned["share"]} if planned is not None else {})
             })
         except Exception as e:
             # Log error but continue processing other products
             print(f"Error processing product {product}: {str(e)}")
             continue
 
+    # Stock-aware reorder quantities and urgency, one vectorized simulation for every stocked product
+    stocked = [p for p in results["products"] if p["product_name"] in inventory]
+    if stocked:
+        with span("inventory"):
+            # Short response horizons are extended from the fitted models, for stocked products only,
+            # and kept with them so what-if sweeps over the stored result see the same 30 days
+            for p in stocked:
+                if horizon < STOCK_HORIZON:
+                    forecasts[p["product_name"]] = models[p["product_name"]].predict(STOCK_HORIZON)[0]
+                    p["forecast_30d"] = convert(forecasts[p["product_name"]], forecast_format)
+            simulated = simulate(
+                [forecasts[p["product_name"]] for p in stocked],
+                [inventory[p["product_name"]]["current_stock"] for p in stocked],
+                [inventory[p["product_name"]].get("lead_time_days", INVENTORY_LEAD_TIME_DAYS) for p in stocked]
+            )
+            for p, reorder in zip(stocked, simulated):
+                p["reorder"] = reorder
+                p["reorder_logic"] = reorder_logic(reorder)
+
+    # Optional LLM explanation stage: a few batched, concurrent prompts for the whole catalog
+    explanation_stage = None
+    if payload.get("explain", EXPLANATIONS_ENABLED) and results["products"]:
+        # One unit of the merchant's budget per batch prompt, capped so any catalog fits a full bucket
+        calls = -(-len(results["products"]) // EXPLAIN_BATCH_SIZE)
+        allowed, retry_after = take_budget(min(calls, RATE_LIMIT_BURST))
+        if not allowed:
+            explanation_stage = {"rate_limited": True, "retry_after": round(retry_after, 1)}
+        else:
+            with span("explanations"):
+                explanation_stage = explain_products(results["products"], lang, remaining_seconds(context))
+
+    # Index built once here so chat and weekly_report never rescan the products
+    with span("index"):
+        results["index"] = build_insights_index(results["products"])
+        index = InsightsIndex(results["products"], results["index"])
+
     # Skip LLM summary for speed - generate rule-based summary
-    high_urgency = [p for p in results["products"] if p["reorder"]["urgency"] == "high"]
-    anomaly_products = [p for p in results["products"] if p["anomalies"]]
-    low_conf = [p for p in results["products"] if p["confidence_score"] < 60]
+    high_urgency = index.high_urgency
+    anomaly_products = index.anomalies
+    low_conf = index.low_confidence
     
     if lang == 'en':
         summary = f"Analysis complete: {len(results['products'])} products analyzed. "
@@ -134,14 +262,47 @@ def lambda_handler(event, context):
         "total_products": len(results["products"]),
         "date_range": f"{df['date'].min().date()} to {df['date'].max().date()}",
         "total_records": len(df),
-        "avg_confidence": round(sum([p["confidence_score"] for p in results["products"]]) / len(results["products"]), 2) if results["products"] else 0,
-        "high_urgency_count": len([p for p in results["products"] if p["reorder"]["urgency"] == "high"]),
-        "anomaly_count": len([p for p in results["products"] if p["anomalies"]])
+        "avg_confidence": index.totals["avg_confidence"],
+        "high_urgency_count": len(high_urgency),
+        "anomaly_count": len(anomaly_products),
+        "stock_aware_products": len(stocked),
+        "forecasting": {
+            "mode": forecast_mode,
+            "horizon": horizon,
+            "model_fits": model_fits,
+            "top_down_products": len(top_down),
+            "groups": sorted(group_models)
+        },
+        "data_quality": data_quality
     }
+    if explanation_stage:
+        quality_report["llm_explanations"] = explanation_stage
+
+    # Store the result and precompute its weekly report (rule-based now, LLM in the background)
+    report_digest = None
+    try:
+        with span("store"):
+            report_digest = save_insights(merchant, results)
+            # The nightly batch writes its weekly reports itself (see handlers/batch_precompute.py)
+            if not event.get("batch"):
+                request_precompute(merchant, results, report_digest, lang)
+            save_inputs(merchant, report_digest, models, samples)
+    except Exception as e:
+        # Storage problems must not cost the merchant their insights
+        print(f"Could not store insights/weekly report: {str(e)}")
+
+    # The full result is stored; the response may carry only a projection / first page of it
+    if view:
+        products, page_info = page(results["products"], report_digest, view["sort"], view["order"],
+                                   0, view["limit"], view["fields"], view["exclude"])
+        # Index positions refer to the full product list, so it stays with the stored result
+        results = {"products": products, "page": page_info, "disclaimer": DISCLAIMER}
 
-    return ok({
-        "insights": results,
-        "summary": summary,
-        "quality_report": quality_report,
-        "disclaimer": DISCLAIMER
-    })
+    with span("serialize"):
+        return ok({
+            "report_digest": report_digest,
+            "insights": results,
+            "summary": summary,
+            "quality_report": quality_report,
+            "disclaimer": DISCLAIMER
+        })
@@ -1,3 +1,5 @@
-from common.responses import ok
+from common.responses import ok, content_encoding
+
+@content_encoding
 def lambda_handler(event, context):
     return ok({"status":"ok","service":"merchant-copilot"})
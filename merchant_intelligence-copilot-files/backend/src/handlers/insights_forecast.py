@@ -0,0 +1,106 @@
+"""
+A longer forecast for one product of a stored insights result.
+
+GET /insights/forecast?product=Atta%201kg&days=30&digest=...&forecast_format=rows
+
+digest defaults to the merchant's latest result (X-Merchant-Id header) and
+days to 30 (7..FORECAST_HORIZON_MAX). In order of preference the forecast
+comes from:
+
+- "stored": the stored product's own forecast, if it is already long enough
+- "refit": the product's model fitted again from the inputs stored with the
+  result (see common/forecast_inputs.py)
+- "history": a new fit of the product's stored sales history, for results
+  stored without inputs
+
+source in the response says which one was used.
+"""
+
+import numpy as np
+import pandas as pd
+
+from common.responses import ok, bad, resp, content_encoding
+from common.config import FORECAST_FORMAT
+from common.forecast_inputs import load_model
+from common.forecasting import fit_forecaster, check_horizon
+from common.forecast_format import head, convert, check_format, yhat_values
+from common.history_store import open_history
+from common.insights_index import extract_products
+from common.insights_store import load_insights, latest_digest
+from common.request_context import merchant_id, safe_id
+from common.admission import admit
+from common.instrumentation import instrumented, span
+
+
+def _stored_product(merchant: str, digest: str, name: str):
+    insights = load_insights(merchant, digest)
+    if not insights:
+        return None
+    products, _ = extract_products(insights)
+    name = name.lower()
+    return next((p for p in products if p.get("product_name", "").lower() == name), None)
+
+
+def _refit(merchant: str, name: str, days: int):
+    """(forecast, confidence) from the merchant's stored history, or None without any for the product."""
+    history = open_history(merchant)
+    if history is None:
+        return None
+    product = next((p for p in history.products if p.lower() == name.lower()), None)
+    if product is None:
+        return None
+    series = history.series(product)
+    if not len(series["day"]):
+        return None
+    daily = pd.DataFrame({"date": pd.to_datetime(np.asarray(series["day"]).astype("datetime64[D]")),
+                          "quantity_sold": np.asarray(series["quantity_sold"])})
+    return fit_forecaster(daily).predict(days)
+
+
+@content_encoding
+@instrumented("insights_forecast")
+@admit(cost=0)
+def lambda_handler(event, context):
+    params = event.get("queryStringParameters") or {}
+    merchant = merchant_id(event)
+    name = (params.get("product") or "").strip()
+    if not name:
+        return bad("Provide product in the query string")
+    try:
+        days = check_horizon(params.get("days", 30), "days")
+        forecast_format = check_format(params.get("forecast_format", FORECAST_FORMAT))
+    except ValueError as e:
+        return bad(str(e))
+
+    digest = safe_id(params["digest"], default="") if params.get("digest") else latest_digest(merchant)
+    if not digest:
+        return resp(404, {"error": "NotFound", "message": "No stored insights for this merchant. Generate insights first."})
+
+    with span("load"):
+        stored = _stored_product(merchant, digest, name)
+    if stored is None:
+        return resp(404, {"error": "NotFound", "message": f"Unknown product: {name}"})
+    name = stored["product_name"]
+    longest = stored.get("forecast_30d") or stored.get("forecast")
+    if longest and len(yhat_values(longest)) >= days:
+        result, source = (head(longest, days), stored.get("confidence_score")), "stored"
+    else:
+        with span("predict", source="refit"):
+            model = load_model(merchant, digest, name)
+            result, source = (model.predict(days) if model is not None else None), "refit"
+        if result is None:
+            with span("predict", source="history"):
+                result, source = _refit(merchant, name, days), "history"
+    if result is None:
+        return resp(404, {"error": "NotFound",
+                          "message": f"No {days}-day forecast for {name}: nothing stored to fit it from. Generate insights again."})
+
+    forecast, confidence = result
+    return ok({
+        "digest": digest,
+        "product_name": name,
+        "days": days,
+        "forecast": convert(forecast, forecast_format),
+        "confidence_score": confidence,
+        "source": source
+    })
@@ -0,0 +1,105 @@
+"""
+Products of a stored insights result, one page at a time.
+
+GET /insights/products?digest=...&sort=urgency&page_size=50&exclude_fields=forecast_30d
+GET /insights/products?cursor=...            (next_cursor from a previous page)
+GET /insights/products?product=Atta%201kg    (a single product)
+
+digest defaults to the merchant's latest result (X-Merchant-Id header).
+sort is one of name (default), urgency, revenue, forecast or confidence;
+fields / exclude_fields are comma-separated product field names;
+forecast_format=rows|columnar converts forecasts from the stored shape.
+"""
+
+import threading
+from collections import OrderedDict
+
+from common.responses import ok, bad, resp, content_encoding
+from common.config import PAGE_CACHE_SIZE
+from common.insights_index import extract_products
+from common.insights_store import load_insights, latest_digest
+from common.forecast_format import format_product, check_format
+from common.insights_view import view_options, page, project, sorted_positions, ViewError
+from common.request_context import merchant_id, safe_id
+from common.admission import admit
+from common.instrumentation import instrumented, span
+
+# (merchant, digest) -> {"products": [...], "orders": {(sort, order): positions}}
+# Stored results never change under a digest, so entries are only evicted, never invalidated.
+_results = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def _cached_result(merchant: str, digest: str):
+    key = (merchant, digest)
+    with _results_lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    insights = load_insights(merchant, digest)
+    if not insights:
+        return None
+    products, _ = extract_products(insights)
+    entry = {"products": products, "orders": {}}
+    with _results_lock:
+        _results[key] = entry
+        while len(_results) > PAGE_CACHE_SIZE:
+            _results.popitem(last=False)
+    return entry
+
+
+def _positions(entry: dict, sort: str, order: str) -> list:
+    key = (sort, order)
+    if key not in entry["orders"]:
+        entry["orders"][key] = sorted_positions(entry["products"], sort, order)
+    return entry["orders"][key]
+
+
+@content_encoding
+@instrumented("insights_products")
+@admit(cost=0)
+def lambda_handler(event, context):
+    params = event.get("queryStringParameters") or {}
+    merchant = merchant_id(event)
+
+    try:
+        view = view_options(params, paged=True)
+    except ViewError as e:
+        return bad(str(e))
+    fields, exclude = view["fields"], view["exclude"]
+    try:
+        forecast_format = params.get("forecast_format") and check_format(params["forecast_format"])
+    except ValueError as e:
+        return bad(str(e))
+
+    # A cursor carries its digest; otherwise ?digest=, otherwise the latest result
+    digest = view["digest"] or params.get("digest")
+    digest = safe_id(digest, default="") if digest else latest_digest(merchant)
+    if not digest:
+        return resp(404, {"error": "NotFound", "message": "No stored insights for this merchant. Generate insights first."})
+
+    with span("load"):
+        entry = _cached_result(merchant, digest)
+    if entry is None:
+        return resp(404, {"error": "NotFound", "message": "No stored insights for this digest."})
+
+    if params.get("product"):
+        name = params["product"].strip().lower()
+        match = next((p for p in entry["products"] if p.get("product_name", "").lower() == name), None)
+        if match is None:
+            return resp(404, {"error": "NotFound", "message": f"Unknown product: {params['product']}"})
+        product = project(match, fields, exclude)
+        return ok({"digest": digest, "product": format_product(product, forecast_format) if forecast_format else product})
+
+    try:
+        with span("page"):
+            positions = _positions(entry, view["sort"], view["order"])
+            products, page_info = page(entry["products"], digest, view["sort"], view["order"], view["offset"],
+                                       view["limit"], fields, exclude, positions=positions)
+    except ViewError as e:
+        return bad(str(e))
+
+    if forecast_format:
+        products = [format_product(p, forecast_format) for p in products]
+    return ok({"digest": digest, "products": products, "page": page_info})
+
@@ -0,0 +1,102 @@
+"""
+What-if reorder analysis over a stored insights result.
+
+POST /inventory/what-if
+{
+    "digest": "...",                     # optional, defaults to the merchant's latest result
+    "inventory": {"Atta 1kg": {"current_stock": 40, "lead_time_days": 5}},
+    "products": ["Atta 1kg"],            # optional, defaults to every product with stock
+    "service_levels": [0.9, 0.95, 0.99],
+    "safety_factors": [0, 0.2, 0.5],
+    "lead_time_days": 4,                 # optional, overrides every product's lead time
+    "review_days": 7
+}
+
+Reuses the stored forecasts, so sweeps never refit a model. Stock and lead
+times default to what generate_insights was given for the same result.
+"""
+
+import json
+
+from common.responses import ok, bad, resp, content_encoding
+from common.config import INVENTORY_LEAD_TIME_DAYS, INVENTORY_REVIEW_DAYS, INVENTORY_SERVICE_LEVEL
+from common.insights_index import extract_products
+from common.insights_store import load_insights, latest_digest
+from common.inventory import parse_inventory, simulate, check_days, InventoryError
+from common.request_context import merchant_id, safe_id
+from common.admission import admit
+from common.instrumentation import instrumented, span
+
+MAX_SWEEP = 20
+
+
+def _levels(values, name, low, high):
+    if values is None:
+        return []
+    if not isinstance(values, list) or len(values) > MAX_SWEEP:
+        raise InventoryError(f"{name} must be a list of at most {MAX_SWEEP} numbers")
+    try:
+        values = [float(v) for v in values]
+    except (TypeError, ValueError):
+        raise InventoryError(f"{name} must be numbers")
+    if any(not low <= v <= high for v in values):
+        raise InventoryError(f"{name} must be between {low} and {high}")
+    return values
+
+
+@content_encoding
+@instrumented("inventory_whatif")
+@admit(cost=0)
+def lambda_handler(event, context):
+    try:
+        payload = json.loads(event.get("body") or "{}")
+    except Exception:
+        return bad("Invalid JSON body")
+
+    try:
+        inventory = parse_inventory(payload.get("inventory"))
+        service_levels = _levels(payload.get("service_levels"), "service_levels", 0.5, 0.999)
+        safety_factors = _levels(payload.get("safety_factors"), "safety_factors", 0, 5)
+        service_level = _levels([payload.get("service_level", INVENTORY_SERVICE_LEVEL)], "service_level", 0.5, 0.999)[0]
+        review_days = check_days(payload.get("review_days", INVENTORY_REVIEW_DAYS), "review_days")
+        lead_override = payload.get("lead_time_days")
+        lead_override = check_days(lead_override, "lead_time_days") if lead_override is not None else None
+    except (InventoryError, TypeError, ValueError) as e:
+        return bad(str(e))
+
+    merchant = merchant_id(event, payload)
+    digest = safe_id(payload["digest"], default="") if payload.get("digest") else latest_digest(merchant)
+    with span("load"):
+        insights = load_insights(merchant, digest) if digest else None
+    if not insights:
+        return resp(404, {"error": "NotFound", "message": "No stored insights. Generate insights first."})
+    products, _ = extract_products(insights)
+
+    # Stock sent now wins over stock stored with the result
+    stock = {}
+    for p in products:
+        reorder = p.get("reorder") or {}
+        if p["product_name"] in inventory:
+            stock[p["product_name"]] = inventory[p["product_name"]]
+        elif "current_stock" in reorder:
+            stock[p["product_name"]] = {k: reorder[k] for k in ("current_stock", "lead_time_days") if k in reorder}
+
+    wanted = {str(n).strip().title() for n in payload.get("products") or []}
+    selected = [p for p in products if p["product_name"] in stock and (not wanted or p["product_name"] in wanted)]
+    if not selected:
+        return bad("No products with current_stock. Send inventory: {product_name: {current_stock, lead_time_days}}.")
+
+    with span("simulate", products=len(selected)):
+        simulated = simulate(
+            [p.get("forecast_30d") or p.get("forecast") for p in selected],
+            [stock[p["product_name"]]["current_stock"] for p in selected],
+            [lead_override if lead_override is not None
+             else stock[p["product_name"]].get("lead_time_days", INVENTORY_LEAD_TIME_DAYS) for p in selected],
+            service_level=service_level, review_days=review_days,
+            service_levels=service_levels, safety_factors=safety_factors
+        )
+
+    return ok({
+        "digest": digest,
+        "products": [{"product_name": p["product_name"], **result} for p, result in zip(selected, simulated)]
+    })
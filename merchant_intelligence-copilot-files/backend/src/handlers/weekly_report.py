@@ -1,127 +1,109 @@
 import json
-from datetime import datetime
-from common.responses import ok, bad
-from common.config import BEDROCK_MODEL_FAST
-from common.bedrock_nova import nova_converse
+import time
+from common.responses import ok, bad, resp, content_encoding
+from common.config import WEEKLY_REPORT_PENDING_TIMEOUT_SEC, WEEKLY_REPORT_TIME_MARGIN_SEC
+from common.insights_index import get_index
+from common.insights_store import save_insights, load_insights, resolve_insights
+from common.request_context import merchant_id, safe_id
+from common.admission import admit
+from common.instrumentation import instrumented
+from common import weekly_reports
 
+
+@content_encoding
+@instrumented("weekly_report")
 def lambda_handler(event, context):
     """
-    Generate weekly action plan report using LLM.
-    Expects insights data in request body or retrieves from storage.
+    Entry point for API requests, async precompute invocations and the schedule.
+    - {"action": "precompute", ...} is sent by generate_insights via Lambda Invoke
+    - Scheduled (EventBridge) events finish any reports still pending
+    """
+    if event.get("action") == "precompute":
+        return precompute(event)
+    if event.get("source") == "aws.events":
+        return process_pending(context=context)
+    return api_handler(event, context)
+
+
+def precompute(event):
+    merchant = safe_id(event.get("merchant_id"))
+    digest = safe_id(event.get("digest"), default="")
+    try:
+        lang = weekly_reports.check_language(event.get("language", "en"))
+    except ValueError:
+        return {"status": "invalid", "digest": digest}
+    insights = load_insights(merchant, digest)
+    if not insights:
+        return {"status": "missing", "digest": digest}
+    entry = weekly_reports.generate_report(merchant, insights, digest, lang)
+    return {"status": entry["status"], "digest": digest}
+
+
+def process_pending(limit: int = 20, context=None):
+    """
+    Generate up to limit pending reports. Each one is an LLM call, so no new
+    one is started within WEEKLY_REPORT_TIME_MARGIN_SEC of the Lambda
+    timeout; the rest wait for the next scheduled run.
+    """
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    done = 0
+    for merchant, digest, lang in weekly_reports.pending_reports(limit):
+        if get_remaining and get_remaining() / 1000.0 < WEEKLY_REPORT_TIME_MARGIN_SEC:
+            break
+        insights = load_insights(merchant, digest)
+        if insights:
+            weekly_reports.generate_report(merchant, insights, digest, lang)
+            done += 1
+    return {"processed": done}
+
+
+@admit(cost=2)
+def api_handler(event, context):
+    """
+    Serve the weekly action plan for an insights result.
+    Request body: {"digest": "...", "language": "en"} for a stored result
+    (report_digest from generate-insights), or {"insights": {...}} to have
+    it stored and digested here. Stored reports are returned as-is; a
+    pending one is returned immediately as the rule-based plan.
     """
     try:
         payload = json.loads(event.get("body") or "{}")
     except Exception:
         return bad("Invalid JSON body")
     
-    # Get insights data (from request or storage)
     insights_data = payload.get("insights")
-    lang = payload.get("language", "en")
+    try:
+        lang = weekly_reports.check_language(payload.get("language", "en"))
+    except ValueError as e:
+        return bad(str(e))
+    merchant = merchant_id(event, payload)
     
-    if not insights_data or not insights_data.get("products"):
+    if insights_data:
+        # Accepts the full generate_insights response or just its "insights" part
+        insights_data = resolve_insights(merchant, insights_data)
+        if not get_index(insights_data).products:
+            return bad("No insights data available. Please generate insights first.")
+        digest = save_insights(merchant, insights_data)
+    elif payload.get("digest"):
+        digest = safe_id(payload["digest"], default="")
+    else:
         return bad("No insights data available. Please generate insights first.")
     
-    products = insights_data.get("products", [])
-    
-    # Analyze products for report generation
-    high_urgency = [p for p in products if p.get("reorder", {}).get("urgency") == "high"]
-    anomalies = [p for p in products if p.get("anomalies") and len(p["anomalies"]) > 0]
-    low_confidence = [p for p in products if p.get("confidence_score", 100) < 60]
-    price_opportunities = [p for p in products if p.get("price_hint", {}).get("action") in ["increase", "discount"]]
-    
-    # Prepare context for LLM
-    context = {
-        "total_products": len(products),
-        "high_urgency_reorders": len(high_urgency),
-        "anomaly_products": len(anomalies),
-        "low_confidence_products": len(low_confidence),
-        "price_optimization_opportunities": len(price_opportunities),
-        "top_reorders": [{"name": p["product_name"], "qty": p["reorder"]["quantity"]} for p in high_urgency[:5]],
-        "top_anomalies": [{"name": p["product_name"], "anomalies": p["anomalies"]} for p in anomalies[:5]],
-        "price_actions": [{"name": p["product_name"], "action": p["price_hint"]["action"], "reason": p["price_hint"]["reason"]} for p in price_opportunities[:3]]
-    }
+    entry = weekly_reports.load_report(merchant, digest, lang)
+    stale = entry and entry["status"] == weekly_reports.STATUS_PENDING and \
+        time.time() - entry.get("updated_at", 0) > WEEKLY_REPORT_PENDING_TIMEOUT_SEC
     
-    # Generate weekly report with LLM
-    system = f"""You are a business advisor for Indian MSME merchants. Generate a weekly action plan in {lang}.
-Be specific, actionable, and prioritize by business impact. Use simple language."""
+    if entry is None or stale:
+        insights_data = insights_data or load_insights(merchant, digest)
+        if not insights_data:
+            return resp(404, {"error": "NotFound", "message": "No stored insights for this digest. Send insights instead."})
+        # Nothing precomputed (or the precompute was lost): generate now, as before
+        entry = weekly_reports.generate_report(merchant, insights_data, digest, lang)
     
-    user = f"""Generate a weekly action plan based on these insights:
-
-Context:
-- Total products analyzed: {context['total_products']}
-- High urgency reorders needed: {context['high_urgency_reorders']}
-- Products with anomalies: {context['anomaly_products']}
-- Low confidence forecasts: {context['low_confidence_products']}
-- Price optimization opportunities: {context['price_optimization_opportunities']}
-
-Top Reorder Priorities:
-{json.dumps(context['top_reorders'], indent=2)}
-
-Anomalies Detected:
-{json.dumps(context['top_anomalies'], indent=2)}
-
-Price Optimization:
-{json.dumps(context['price_actions'], indent=2)}
-
-Generate a structured report with:
-1. Top 3 Priorities (specific products and actions)
-2. Expected business impact for each priority
-3. Risks and alerts to watch
-4. Quick wins for this week
-
-Format as JSON with keys: priorities (array of {{title, description, impact}}), risks (array of strings), quick_wins (array of strings)"""
-    
-    try:
-        llm_response = nova_converse(BEDROCK_MODEL_FAST, system, user)
-        
-        # Try to parse as JSON, fallback to structured text
-        try:
-            report_data = json.loads(llm_response)
-        except:
-            # If LLM doesn't return valid JSON, create structured report
-            report_data = {
-                "priorities": [
-                    {
-                        "title": "High Priority Reorders",
-                        "description": f"{len(high_urgency)} products need urgent reordering: {', '.join([p['product_name'] for p in high_urgency[:3]])}",
-                        "impact": "Prevent stockouts and maintain sales"
-                    },
-                    {
-                        "title": "Address Demand Anomalies",
-                        "description": f"{len(anomalies)} products showing unusual patterns: {', '.join([p['product_name'] for p in anomalies[:3]])}",
-                        "impact": "Adjust inventory and pricing strategy"
-                    },
-                    {
-                        "title": "Price Optimization",
-                        "description": f"{len(price_opportunities)} products have pricing opportunities",
-                        "impact": "Increase revenue through strategic pricing"
-                    }
-                ],
-                "risks": [
-                    f"{len(high_urgency)} products at risk of stockout" if len(high_urgency) > 3 else None,
-                    f"{len(anomalies)} products with unusual demand patterns" if len(anomalies) > 2 else None,
-                    f"{len(low_confidence)} products with low forecast confidence" if len(low_confidence) > 0 else None
-                ],
-                "quick_wins": [
-                    f"Order {high_urgency[0]['product_name']} immediately" if high_urgency else None,
-                    f"Adjust price for {price_opportunities[0]['product_name']}" if price_opportunities else None,
-                    "Review low confidence items for data quality"
-                ]
-            }
-            # Remove None values
-            report_data["risks"] = [r for r in report_data["risks"] if r]
-            report_data["quick_wins"] = [q for q in report_data["quick_wins"] if q]
-        
-        # Add metadata
-        report_data["generated_at"] = datetime.utcnow().isoformat()
-        report_data["language"] = lang
-        report_data["summary_text"] = llm_response if isinstance(llm_response, str) else None
-        
-        return ok({
-            "report": report_data,
-            "context": context,
-            "disclaimer": "AI-generated action plan. Review with your business knowledge before implementing."
-        })
-        
-    except Exception as e:
-        return bad(f"Failed to generate report: {str(e)}")
+    return ok({
+        "report": entry["report"],
+        "context": entry["context"],
+        "digest": digest,
+        "status": entry["status"],
+        "disclaimer": entry["disclaimer"]
+    })
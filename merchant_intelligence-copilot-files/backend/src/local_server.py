@@ -0,0 +1,434 @@
+"""
+Local HTTP runtime for the Lambda handlers, without SAM or Docker.
+
+Routes, handlers and timeouts are read from ../template.yaml, so the server
+exposes the same API as the deployed stack (/health, /generate-insights,
+/chat, /weekly-report). Each HTTP request is translated into an API Gateway
+proxy event and a Lambda-style context, and the handler's response is
+written back as-is.
+
+Worker model: --workers pre-forked processes share one listening socket and
+each serves requests on a pool of --threads threads. Handler modules are
+imported once (before forking with --preload), so module-level state stays
+warm across requests: the Bedrock client, the storage and admission
+singletons and anything handlers cache. That state is per process, so with
+several workers use STORAGE_BACKEND=local or s3 for sessions and reports,
+and note the in-memory rate limiter applies per worker.
+
+    python local_server.py --port 3000 --workers 4 --threads 8 --preload
+    python local_server.py --schedules      # also fire Schedule events (pending weekly reports)
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import re
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from importlib import import_module
+from urllib.parse import urlsplit, parse_qsl
+
+# Precompute weekly reports in-process; there is no Lambda to invoke asynchronously
+os.environ.setdefault("WEEKLY_REPORT_PRECOMPUTE", "thread")
+# "debug": true returns per-stage timings locally; off by default when deployed
+os.environ.setdefault("TIMINGS_DEBUG_ENABLED", "true")
+
+logger = logging.getLogger("local_server")
+
+DEFAULT_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "template.yaml")
+MAX_BODY_BYTES = 10 * 1024 * 1024  # API Gateway payload limit
+KEEPALIVE_TIMEOUT = 5
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Merchant-Id",
+    "Access-Control-Allow-Methods": "GET,POST,OPTIONS"
+}
+
+
+# ---- template.yaml ------------------------------------------------------------
+
+class Function:
+    """One AWS::Serverless::Function from the template."""
+
+    def __init__(self, name):
+        self.name = name
+        self.handler = None
+        self.timeout = None
+        self.memory = None
+        self.events = []
+        self._callable = None
+
+    def resolve(self):
+        """Import the handler module once per process and return the callable."""
+        if self._callable is None:
+            module, _, attr = self.handler.rpartition(".")
+            self._callable = getattr(import_module(module), attr)
+        return self._callable
+
+
+def load_template(path: str) -> list:
+    """
+    Functions with their handler, timeout, memory and events. A small
+    indentation-based reader for the subset of SAM syntax this template uses,
+    so the server needs nothing beyond the standard library.
+    """
+    functions = []
+    defaults = {"timeout": 3, "memory": 128}
+    section = current = block = event = None
+    with open(path) as f:
+        for raw in f:
+            line = raw.split(" #")[0].rstrip()
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            indent = len(line) - len(line.lstrip())
+            key, _, value = line.strip().partition(":")
+            value = value.strip().strip("\"'")
+            if indent == 0:
+                section = key
+            elif section == "Globals" and indent == 4 and key in ("Timeout", "MemorySize"):
+                defaults["timeout" if key == "Timeout" else "memory"] = int(value)
+            elif section == "Resources" and indent == 2:
+                current = Function(key)
+                functions.append(current)
+                block = event = None
+            elif current is None or section != "Resources":
+                continue
+            elif indent == 6:
+                block = key
+                if key == "Handler":
+                    current.handler = value
+                elif key == "Timeout":
+                    current.timeout = int(value)
+                elif key == "MemorySize":
+                    current.memory = int(value)
+            elif block != "Events":
+                continue
+            elif indent == 10 and key == "Type":
+                event = {"type": value}
+                current.events.append(event)
+            elif indent == 12 and event is not None and key in ("Path", "Method", "Schedule"):
+                event[key.lower()] = value
+
+    functions = [fn for fn in functions if fn.handler]
+    for fn in functions:
+        fn.timeout = fn.timeout or defaults["timeout"]
+        fn.memory = fn.memory or defaults["memory"]
+    return functions
+
+
+def api_routes(functions: list) -> dict:
+    """(METHOD, path) -> Function for every Api event."""
+    return {
+        (e["method"].upper(), e["path"]): fn
+        for fn in functions for e in fn.events
+        if e.get("type") == "Api" and "path" in e and "method" in e
+    }
+
+
+def schedule_seconds(expression: str):
+    """Seconds between runs for a rate() expression; None for cron() and anything else."""
+    match = re.match(r"rate\((\d+)\s+(minute|minutes|hour|hours|day|days)\)", expression or "")
+    if not match:
+        return None
+    unit = {"minute": 60, "hour": 3600, "day": 86400}[match.group(2).rstrip("s")]
+    return int(match.group(1)) * unit
+
+
+# ---- Lambda emulation ---------------------------------------------------------
+
+class LambdaContext:
+    """The parts of the Lambda context object the handlers use."""
+
+    def __init__(self, fn: Function, request_id: str):
+        self.function_name = fn.name
+        self.function_version = "$LATEST"
+        self.invoked_function_arn = f"arn:aws:lambda:local:000000000000:function:{fn.name}"
+        self.memory_limit_in_mb = fn.memory
+        self.aws_request_id = request_id
+        self.log_group_name = f"/aws/lambda/{fn.name}"
+        self.log_stream_name = "local"
+        self._deadline = time.time() + fn.timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.time()) * 1000))
+
+
+def proxy_event(method, path, resource, headers, query, body: bytes, source_ip, request_id) -> dict:
+    """API Gateway REST (v1) proxy integration event."""
+    multi_headers, multi_query = {}, {}
+    for k, v in headers:
+        multi_headers.setdefault(k, []).append(v)
+    for k, v in query:
+        multi_query.setdefault(k, []).append(v)
+
+    is_base64 = False
+    if body:
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            text, is_base64 = base64.b64encode(body).decode("ascii"), True
+    else:
+        text = None
+
+    return {
+        "resource": resource,
+        "path": path,
+        "httpMethod": method,
+        "headers": {k: v[-1] for k, v in multi_headers.items()},
+        "multiValueHeaders": multi_headers,
+        "queryStringParameters": {k: v[-1] for k, v in multi_query.items()} or None,
+        "multiValueQueryStringParameters": multi_query or None,
+        "pathParameters": None,
+        "stageVariables": None,
+        "requestContext": {
+            "resourcePath": resource,
+            "httpMethod": method,
+            "path": f"/prod{path}",
+            "stage": "prod",
+            "requestId": request_id,
+            "requestTimeEpoch": int(time.time() * 1000),
+            "identity": {"sourceIp": source_ip}
+        },
+        "body": text,
+        "isBase64Encoded": is_base64
+    }
+
+
+def schedule_event(fn: Function) -> dict:
+    return {
+        "version": "0",
+        "id": str(uuid.uuid4()),
+        "detail-type": "Scheduled Event",
+        "source": "aws.events",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "resources": [f"arn:aws:events:local:000000000000:rule/{fn.name}"],
+        "detail": {}
+    }
+
+
+# ---- HTTP server ----------------------------------------------------------------
+
+class LambdaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MerchantCopilotLocal/1.0"
+    timeout = KEEPALIVE_TIMEOUT  # idle keep-alive connections give their pool thread back
+
+    def do_OPTIONS(self):
+        # CORS preflight, answered by API Gateway itself in the deployed stack
+        self._send(200, CORS_HEADERS, b"")
+
+    def do_GET(self):
+        self._invoke()
+
+    do_POST = do_PUT = do_PATCH = do_DELETE = do_GET
+
+    def _invoke(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        fn = self.server.routes.get((self.command, path))
+        if fn is None:
+            self._send_json(403, {"message": "Missing Authentication Token"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"message": "Request Too Long"})
+            self.close_connection = True
+            return
+        body = self.rfile.read(length) if length else b""
+
+        request_id = str(uuid.uuid4())
+        event = proxy_event(self.command, path, path, self.headers.items(), parse_qsl(url.query),
+                            body, self.client_address[0], request_id)
+        context = LambdaContext(fn, request_id)
+        try:
+            response = fn.resolve()(event, context)
+        except Exception:
+            logger.exception(f"{fn.name} raised")
+            self._send_json(502, {"message": "Internal server error"})
+            return
+
+        elapsed = time.perf_counter() - start
+        if elapsed > fn.timeout:
+            logger.warning(f"{fn.name} took {elapsed:.1f}s, over its {fn.timeout}s Lambda timeout")
+        self._send_lambda_response(response)
+        logger.info(f"{self.command} {path} {response.get('statusCode', 200)} {elapsed * 1000:.1f}ms [{os.getpid()}]")
+
+    def _send_lambda_response(self, response: dict):
+        if not isinstance(response, dict) or "statusCode" not in response:
+            self._send_json(502, {"message": "Internal server error"})
+            return
+        headers = dict(response.get("headers") or {})
+        for k, values in (response.get("multiValueHeaders") or {}).items():
+            headers[k] = ", ".join(str(v) for v in values)
+        body = response.get("body") or ""
+        data = base64.b64decode(body) if response.get("isBase64Encoded") else body.encode("utf-8")
+        self._send(int(response["statusCode"]), headers, data)
+
+    def _send_json(self, status, payload):
+        self._send(status, {"Content-Type": "application/json", **CORS_HEADERS}, json.dumps(payload).encode("utf-8"))
+
+    def _send(self, status, headers, data: bytes):
+        self.send_response(status)
+        for k, v in headers.items():
+            if k.lower() != "content-length":
+                self.send_header(k, str(v))
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # one line per request is logged in _invoke
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands connections to a fixed-size thread pool."""
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, address, routes: dict, threads: int):
+        super().__init__(address, LambdaRequestHandler)
+        self.routes = routes
+        self.threads = threads
+        self.pool = None
+
+    def process_request(self, request, client_address):
+        if self.pool is None:
+            # Created lazily so no threads exist in the parent before forking
+            self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="request")
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def start_schedules(functions: list):
+    """Background threads invoking handlers for their Schedule (rate) events."""
+    for fn in functions:
+        for e in fn.events:
+            interval = schedule_seconds(e.get("schedule")) if e.get("type") == "Schedule" else None
+            if not interval:
+                continue
+
+            def run(fn=fn, interval=interval):
+                while True:
+                    time.sleep(interval)
+                    request_id = str(uuid.uuid4())
+                    try:
+                        result = fn.resolve()(schedule_event(fn), LambdaContext(fn, request_id))
+                        logger.info(f"Schedule {fn.name}: {result}")
+                    except Exception:
+                        logger.exception(f"Scheduled {fn.name} failed")
+
+            threading.Thread(target=run, daemon=True, name=f"schedule-{fn.name}").start()
+            logger.info(f"Scheduled {fn.name} every {interval}s")
+
+
+def _serve_worker(server, functions, schedules: bool):
+    def stop(*_):
+        # shutdown() waits for serve_forever to return, so it can't run on the serving thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if schedules:
+        start_schedules(functions)
+    server.serve_forever()
+    server.server_close()
+    if server.pool is not None:
+        server.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def serve(host="127.0.0.1", port=3000, workers=1, threads=8, preload=False, schedules=False,
+          template=DEFAULT_TEMPLATE):
+    functions = load_template(template)
+    routes = api_routes(functions)
+    if preload:
+        # Import handlers (pandas, Prophet, boto3 clients) once; forked workers share the pages
+        for fn in functions:
+            fn.resolve()
+
+    server = PooledHTTPServer((host, port), routes, threads)
+    for (method, path), fn in sorted(routes.items(), key=lambda r: r[0][1]):
+        logger.info(f"{method:5} {path:20} -> {fn.handler} (timeout {fn.timeout}s)")
+    logger.info(f"Listening on http://{host}:{port} with {workers} worker(s) x {threads} thread(s)")
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        _serve_worker(server, functions, schedules)
+        return
+
+    children = {}
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            # Only the first worker runs schedules, as a single EventBridge rule would
+            _serve_worker(server, functions, schedules and index == 0)
+            os._exit(0)
+        children[pid] = index
+
+    for i in range(workers):
+        spawn(i)
+
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if not stopping and index is not None:
+            logger.warning(f"Worker {pid} exited with status {status}; restarting")
+            spawn(index)
+    server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Lambda handlers over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("LOCAL_SERVER_WORKERS", "1")),
+                        help="pre-forked processes")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("LOCAL_SERVER_THREADS", "8")),
+                        help="request threads per process")
+    parser.add_argument("--preload", action="store_true", help="import all handlers before forking")
+    parser.add_argument("--schedules", action="store_true", help="fire Schedule events from the template")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE)
+    parser.add_argument("--quiet", action="store_true", help="no per-request log lines")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    serve(args.host, args.port, args.workers, args.threads, args.preload, args.schedules, args.template)
+
+
+if __name__ == "__main__":
+    main()
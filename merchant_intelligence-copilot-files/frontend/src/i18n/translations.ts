@@ -55,6 +55,8 @@ export const translations = {
     avgConfidence: 'Avg Confidence',
     topReorderItem: 'Top Reorder',
     forecast7Day: '7-Day Forecast',
+    forecast30Day: '30 days',
+    errorForecast30Day: 'Could not load the 30-day forecast',
     selectProduct: 'Select a product',
     productInsights: 'Product Insights',
     confidence: 'Confidence',
@@ -155,6 +157,8 @@ export const translations = {
     avgConfidence: 'औसत विश्वास',
     topReorderItem: 'शीर्ष पुनः ऑर्डर',
     forecast7Day: '7-दिन का पूर्वानुमान',
+    forecast30Day: '30 दिन',
+    errorForecast30Day: '30-दिन का पूर्वानुमान लोड नहीं हो सका',
     selectProduct: 'एक उत्पाद चुनें',
     productInsights: 'उत्पाद अंतर्दृष्टि',
     confidence: 'विश्वास',
@@ -255,6 +259,8 @@ export const translations = {
     avgConfidence: 'सरासरी आत्मविश्वास',
     topReorderItem: 'शीर्ष पुन्हा ऑर्डर',
     forecast7Day: '7-दिवसांचा अंदाज',
+    forecast30Day: '30 दिवस',
+    errorForecast30Day: '30-दिवसांचा अंदाज लोड करता आला नाही',
     selectProduct: 'उत्पादन निवडा',
     productInsights: 'उत्पादन अंतर्दृष्टी',
     confidence: 'आत्मविश्वास',
@@ -3,3 +3,19 @@ export const api = axios.create({
   baseURL: import.meta.env.VITE_API_BASE_URL,
   headers: { "Content-Type":"application/json" }
 });
+
+// Tenant ID for rate limits, stored results and sales history. There is no
+// login yet, so each browser gets its own random ID, kept in localStorage.
+export function merchantId(): string {
+  let id = localStorage.getItem("merchantId");
+  if (!id) {
+    id = crypto.randomUUID();
+    localStorage.setItem("merchantId", id);
+  }
+  return id;
+}
+
+api.interceptors.request.use(config => {
+  config.headers["X-Merchant-Id"] = merchantId();
+  return config;
+});
@@ -9,6 +9,8 @@ export function Chat() {
   const [loading, setLoading] = useState(false);
   const [apiAvailable, setApiAvailable] = useState(true);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Server-side chat session: insights are uploaded once per session, not with every message
+  const sessionRef = useRef<{ id: string | null; insights: string | null }>({ id: null, insights: null });
   const { language, t } = useLanguage();
 
   useEffect(() => {
@@ -55,16 +57,23 @@ export function Chat() {
     setLoading(true);
 
     try {
-      // Get insights from localStorage for context
+      // Get insights from localStorage for context; only send them when the session doesn't have them yet
       const storedInsights = localStorage.getItem('lastInsights');
-      const insights = storedInsights ? JSON.parse(storedInsights) : null;
-      
-      const response = await api.post('/chat', {
+      const send = (withInsights: boolean) => api.post('/chat', {
         message: input,
         language,
-        insights: insights
+        session_id: sessionRef.current.id,
+        insights: withInsights && storedInsights ? JSON.parse(storedInsights) : undefined
       });
 
+      let response = await send(storedInsights !== sessionRef.current.insights);
+      // Session expired on the server: retry once in a fresh session with insights
+      if (response.data.insights_required) {
+        sessionRef.current.id = null;
+        response = await send(true);
+      }
+      sessionRef.current = { id: response.data.session_id ?? null, insights: storedInsights };
+
       const assistantMessage: ChatMessage = {
         role: 'assistant',
         content: response.data.response || response.data.message,
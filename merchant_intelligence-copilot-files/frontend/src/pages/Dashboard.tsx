@@ -1,13 +1,17 @@
 import React, { useState, useMemo, useEffect } from 'react';
 import { Link, useLocation } from 'react-router-dom';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, Area, AreaChart } from 'recharts';
-import { InsightsData, Product } from '../types';
+import { InsightsData, Product, ColumnarForecast, forecastPoints } from '../types';
+import { api } from '../lib/api';
 import { useLanguage } from '../hooks/useLanguage';
 
 export function Dashboard() {
   const [selectedProduct, setSelectedProduct] = useState<string>('');
   const [explainProduct, setExplainProduct] = useState<Product | null>(null);
   const [refreshKey, setRefreshKey] = useState(0);
+  const [longForecast, setLongForecast] = useState<ColumnarForecast | null>(null);
+  const [loadingForecast, setLoadingForecast] = useState(false);
+  const [forecastError, setForecastError] = useState('');
   const { t } = useLanguage();
   const location = useLocation();
 
@@ -52,15 +56,42 @@ export function Dashboard() {
     return products.find(p => p.product_name === selectedProduct);
   }, [selectedProduct, products]);
 
+  // The 30-day forecast is predicted on demand from the inputs stored with the result
+  useEffect(() => {
+    setLongForecast(null);
+    setForecastError('');
+  }, [selectedProduct, refreshKey]);
+
+  const toggleLongForecast = async () => {
+    if (longForecast) {
+      setLongForecast(null);
+      return;
+    }
+    setLoadingForecast(true);
+    setForecastError('');
+    try {
+      const response = await api.get('/insights/forecast', {
+        params: { product: selectedProduct, days: 30, digest: insights?.report_digest, forecast_format: 'columnar' }
+      });
+      setLongForecast(response.data.forecast);
+    } catch (err: any) {
+      console.error('Could not load the 30-day forecast', err);
+      setForecastError(err?.response?.data?.message || t('errorForecast30Day'));
+    } finally {
+      setLoadingForecast(false);
+    }
+  };
+
   const chartData = useMemo(() => {
-    if (!selectedProductData?.forecast) return [];
-    return selectedProductData.forecast.map(f => ({
+    const forecast = longForecast || selectedProductData?.forecast;
+    if (!forecast) return [];
+    return forecastPoints(forecast).map(f => ({
       date: new Date(f.ds).toLocaleDateString('en-US', { month: 'short', day: 'numeric' }),
       forecast: Math.round(f.yhat),
       lower: f.yhat_lower ? Math.round(f.yhat_lower) : undefined,
       upper: f.yhat_upper ? Math.round(f.yhat_upper) : undefined,
     }));
-  }, [selectedProductData]);
+  }, [selectedProductData, longForecast]);
 
   const getConfidenceBadge = (score: number) => {
     if (score > 80) return { color: 'bg-green-100 text-green-800 dark:bg-green-900/30 dark:text-green-400', label: 'High' };
@@ -139,20 +170,35 @@ export function Dashboard() {
       <div className="bg-white dark:bg-gray-800 rounded-xl p-6 border border-gray-200 dark:border-gray-700 shadow-lg">
         <div className="flex flex-col sm:flex-row justify-between items-start sm:items-center gap-4 mb-6">
           <h2 className="text-xl font-bold text-gray-900 dark:text-white">{t('forecast7Day')}</h2>
-          <select
-            value={selectedProduct}
-            onChange={e => setSelectedProduct(e.target.value)}
-            className="px-4 py-2 rounded-lg border border-gray-300 dark:border-gray-600 bg-white dark:bg-gray-700 text-gray-900 dark:text-white focus:ring-2 focus:ring-indigo-500 transition-all"
-          >
-            <option value="">{t('selectProduct')}</option>
-            {products.map(p => (
-              <option key={p.product_name} value={p.product_name}>
-                {p.product_name}
-              </option>
-            ))}
-          </select>
+          <div className="flex items-center gap-2">
+            {selectedProduct && (
+              <button
+                onClick={toggleLongForecast}
+                disabled={loadingForecast}
+                className={`px-3 py-2 rounded-lg border text-sm transition-all ${longForecast ? 'bg-indigo-600 text-white border-indigo-600' : 'border-gray-300 dark:border-gray-600 text-gray-700 dark:text-gray-300'} disabled:opacity-50`}
+              >
+                {loadingForecast ? '…' : t('forecast30Day')}
+              </button>
+            )}
+            <select
+              value={selectedProduct}
+              onChange={e => setSelectedProduct(e.target.value)}
+              className="px-4 py-2 rounded-lg border border-gray-300 dark:border-gray-600 bg-white dark:bg-gray-700 text-gray-900 dark:text-white focus:ring-2 focus:ring-indigo-500 transition-all"
+            >
+              <option value="">{t('selectProduct')}</option>
+              {products.map(p => (
+                <option key={p.product_name} value={p.product_name}>
+                  {p.product_name}
+                </option>
+              ))}
+            </select>
+          </div>
         </div>
 
+        {forecastError && (
+          <p className="mb-4 text-sm text-red-800 dark:text-red-200">⚠️ {forecastError}</p>
+        )}
+
         {selectedProduct && chartData.length > 0 ? (
           <ResponsiveContainer width="100%" height={300}>
             <AreaChart data={chartData}>
@@ -98,7 +98,12 @@ export function UploadData() {
         try {
           const response = await api.post('/generate-insights', {
             csv_text: csvText,
-            language
+            language,
+            // The dashboard charts 7 days; 30 are predicted per product when asked for (GET /insights/forecast)
+            horizon: 7,
+            // Stocked products still carry a 30-day forecast for the inventory simulation; it stays on the server
+            exclude_fields: ['forecast_30d'],
+            forecast_format: 'columnar'
           });
 
           localStorage.setItem('lastInsights', JSON.stringify(response.data));
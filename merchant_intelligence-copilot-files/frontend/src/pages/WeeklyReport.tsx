@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { api } from '../lib/api';
 import { InsightsData } from '../types';
 import { useLanguage } from '../hooks/useLanguage';
@@ -20,8 +20,10 @@ export function WeeklyReport() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const { t, language } = useLanguage();
+  const pendingRetries = useRef(0);
 
   useEffect(() => {
+    pendingRetries.current = 0;
     fetchReport();
   }, [language]);
 
@@ -40,13 +42,24 @@ export function WeeklyReport() {
 
       const insights: InsightsData = JSON.parse(storedData);
 
-      // Call backend to generate report
-      const response = await api.post('/weekly-report', {
-        insights: insights,
-        language: language
+      // Reports are precomputed per insights digest; only fall back to posting the full insights
+      // when the backend has no stored copy for this digest
+      const response = await api.post('/weekly-report',
+        insights.report_digest
+          ? { digest: insights.report_digest, language: language }
+          : { insights: insights, language: language }
+      ).catch(err => {
+        if (err?.response?.status !== 404) throw err;
+        return api.post('/weekly-report', { insights: insights, language: language });
       });
 
       setReport(response.data.report);
+
+      // Rule-based plan shown while the AI version is still being generated
+      if (response.data.status === 'pending' && pendingRetries.current < 3) {
+        pendingRetries.current += 1;
+        setTimeout(fetchReport, 5000);
+      }
     } catch (err: any) {
       console.error('Report generation error:', err);
       // Fallback to client-side report
@@ -1,29 +1,58 @@
+export interface ForecastPoint {
+  ds: string;
+  yhat: number;
+  yhat_lower?: number;
+  yhat_upper?: number;
+}
+
+// forecast_format: 'columnar' - consecutive days from start
+export interface ColumnarForecast {
+  start: string;
+  yhat: number[];
+  yhat_lower: number[];
+  yhat_upper: number[];
+}
+
 export interface Product {
   product_name: string;
   confidence_score: number;
+  revenue_total?: number;
   reorder?: {
     quantity: number;
     urgency: string;
+    // Present when current stock was sent with the upload
+    current_stock?: number;
+    lead_time_days?: number;
+    stockout_probability?: number;
+    days_of_cover?: number;
   };
   anomalies?: Array<{
     type: string;
     severity: string;
   }>;
-  forecast?: Array<{
-    ds: string;
-    yhat: number;
-    yhat_lower?: number;
-    yhat_upper?: number;
-  }>;
+  forecast?: ForecastPoint[] | ColumnarForecast;
   demand_reasoning?: string;
   reorder_logic?: string;
   confidence_explanation?: string;
 }
 
+export interface ProductPage {
+  total: number;
+  offset: number;
+  page_size: number;
+  sort: 'name' | 'urgency' | 'revenue' | 'forecast' | 'confidence';
+  order: 'asc' | 'desc';
+  next_cursor: string | null;
+  fields?: string[];
+  exclude_fields?: string[];
+}
+
 export interface InsightsData {
   summary: string;
+  report_digest?: string;
   insights?: {
     products: Product[];
+    page?: ProductPage;
   };
   products?: Product[];
   forecast?: Array<{
@@ -40,3 +69,15 @@ export interface ChatMessage {
   confidence?: number;
   timestamp: number;
 }
+
+export function forecastPoints(forecast?: ForecastPoint[] | ColumnarForecast): ForecastPoint[] {
+  if (!forecast) return [];
+  if (Array.isArray(forecast)) return forecast;
+  const start = new Date(forecast.start + 'T00:00:00Z').getTime();
+  return forecast.yhat.map((yhat, i) => ({
+    ds: new Date(start + i * 86400000).toISOString().slice(0, 10),
+    yhat,
+    yhat_lower: forecast.yhat_lower[i],
+    yhat_upper: forecast.yhat_upper[i],
+  }));
+}